@@ -0,0 +1,143 @@
+"""
+Streaming Anomaly Scoring
+
+Baseline math for the anomaly detector (app/workers/anomaly_detector.py). Each
+series (one app's count of one event name per minute) keeps a fixed-size state,
+an `anomaly_baselines` row:
+
+- `mean` / `variance`: exponentially weighted (EWMA, ANOMALY_EWMA_ALPHA) mean
+  and variance of the per-minute count (the recent level)
+- `seasonal[h]`: slower EWMA (ANOMALY_SEASONAL_ALPHA) of the count during UTC
+  hour h, used as the expectation once that hour has enough history, so daily
+  traffic cycles don't look like spikes
+- `observations`, `seasonal_counts[h]`: how many minutes went into each
+
+Minutes without events have no counter row; they are folded in as zeros when
+the series is next seen (at most one day's worth, older gaps have decayed away).
+Only spikes are scored: a series that stops entirely produces no rows to score.
+
+Like the rest of app/analytics, this is deterministic and touches no database.
+"""
+
+import math
+from typing import Tuple
+
+from app.core.config import (
+    ANOMALY_EWMA_ALPHA,
+    ANOMALY_MIN_COUNT,
+    ANOMALY_SEASONAL_ALPHA,
+    ANOMALY_WARMUP_MINUTES,
+    ANOMALY_Z_THRESHOLD,
+)
+
+MINUTE_MS = 60_000
+HOURS = 24
+
+# Zero-minutes replayed at most when a series reappears after a gap
+MAX_GAP_MINUTES = 24 * 60
+
+# Minutes of one hour-of-day slot needed before the seasonal mean is trusted
+# (two days' worth)
+SEASONAL_WARMUP = 2 * 60
+
+SEVERITY_WARNING = "warning"
+SEVERITY_CRITICAL = "critical"
+
+
+def minute_of(ts_ms: int) -> int:
+    """Start of the minute containing `ts_ms`."""
+    return ts_ms - ts_ms % MINUTE_MS
+
+
+def hour_of(minute_ms: int) -> int:
+    return (minute_ms // 3_600_000) % HOURS
+
+
+def init_state(state, minute_ms: int) -> None:
+    """Reset a baseline row to "no history", as if last seen just before `minute_ms`."""
+    state.last_minute_ms = minute_ms - MINUTE_MS
+    state.observations = 0
+    state.mean = 0.0
+    state.variance = 0.0
+    state.seasonal = [0.0] * HOURS
+    state.seasonal_counts = [0] * HOURS
+
+
+def expectation(state, minute_ms: int) -> Tuple[float, float]:
+    """(expected count, standard deviation) for `minute_ms`."""
+    hour = hour_of(minute_ms)
+    if state.seasonal_counts[hour] >= SEASONAL_WARMUP:
+        expected = state.seasonal[hour]
+    else:
+        expected = state.mean
+    # Counts are at least Poisson-noisy: never trust a spread below sqrt(expected) (or 1).
+    sigma = max(math.sqrt(max(state.variance, 0.0)), math.sqrt(max(expected, 1.0)))
+    return expected, sigma
+
+
+def score(state, minute_ms: int, count: int, is_error: bool = False) -> Tuple[float, float, bool]:
+    """
+    Score one closed minute (after `catch_up`).
+
+    Returns:
+        (expected, z-score, anomalous). Error series are scored from the first
+        minute (a new error appearing in bulk is itself news); others need
+        ANOMALY_WARMUP_MINUTES of history.
+    """
+    expected, sigma = expectation(state, minute_ms)
+    z = (count - expected) / sigma
+    warm = is_error or state.observations >= ANOMALY_WARMUP_MINUTES
+    return expected, z, warm and count >= ANOMALY_MIN_COUNT and z >= ANOMALY_Z_THRESHOLD
+
+
+def severity(z: float) -> str:
+    return SEVERITY_CRITICAL if z >= 2 * ANOMALY_Z_THRESHOLD else SEVERITY_WARNING
+
+
+def catch_up(state, minute_ms: int) -> None:
+    """Fold the minutes between the last observation and `minute_ms` in as zeros."""
+    gap = (minute_ms - state.last_minute_ms) // MINUTE_MS - 1
+    if gap <= 0:
+        return
+    start = minute_ms - min(gap, MAX_GAP_MINUTES) * MINUTE_MS
+    seasonal, seasonal_counts = list(state.seasonal), list(state.seasonal_counts)
+    for m in range(start, minute_ms, MINUTE_MS):
+        _update(state, seasonal, seasonal_counts, m, 0.0)
+    state.seasonal, state.seasonal_counts = seasonal, seasonal_counts
+
+
+def observe(state, minute_ms: int, count: float) -> None:
+    """Fold one minute's count into the baseline."""
+    seasonal, seasonal_counts = list(state.seasonal), list(state.seasonal_counts)
+    _update(state, seasonal, seasonal_counts, minute_ms, count)
+    # New lists, so the ORM notices the JSON columns changed
+    state.seasonal, state.seasonal_counts = seasonal, seasonal_counts
+    state.last_minute_ms = minute_ms
+
+
+def clamp(state, minute_ms: int, count: int) -> float:
+    """
+    Value to learn from an anomalous minute: capped at the threshold, so a
+    spike doesn't immediately become the new normal.
+    """
+    expected, sigma = expectation(state, minute_ms)
+    return min(float(count), expected + ANOMALY_Z_THRESHOLD * sigma)
+
+
+def _update(state, seasonal: list, seasonal_counts: list, minute_ms: int, value: float) -> None:
+    if state.observations == 0:
+        state.mean, state.variance = value, 0.0
+    else:
+        # Incremental EWMA mean and variance
+        diff = value - state.mean
+        incr = ANOMALY_EWMA_ALPHA * diff
+        state.mean += incr
+        state.variance = (1 - ANOMALY_EWMA_ALPHA) * (state.variance + diff * incr)
+    state.observations += 1
+
+    hour = hour_of(minute_ms)
+    if seasonal_counts[hour] == 0:
+        seasonal[hour] = value
+    else:
+        seasonal[hour] += ANOMALY_SEASONAL_ALPHA * (value - seasonal[hour])
+    seasonal_counts[hour] += 1
@@ -4,18 +4,23 @@ Funnel Drop-off Calculation
 This module computes where users drop off within a funnel: for each session, we track
 the last successfully matched step (in order) and increment that step's drop-off count.
 
-The implementation streams events ordered by session + time for performance.
+The implementation streams sessions (events ordered by session + time) for performance.
 """
 
 from typing import List, Dict, Optional
 from sqlalchemy.orm import Session
-from app.db.models import EventDB
+from app.analytics.sampling import sample_threshold, scale_count
+from app.analytics.scan import iter_sessions
+from app.core.deadline import Deadline
+from app.core.metrics import track_scan
 
 
 def calculate_dropoff(
     steps: List[str],
     db: Session,
-    api_key: Optional[str] = None
+    api_key: Optional[str] = None,
+    sample: Optional[float] = None,
+    deadline: Optional[Deadline] = None,
 ) -> Dict:
     """
     Count drop-offs per funnel step for an ordered list of steps.
@@ -24,41 +29,34 @@ def calculate_dropoff(
         steps: Ordered list of funnel step event names.
         db: SQLAlchemy session.
         api_key: If provided, restrict computation to a single app/api_key.
+        sample: Fraction of sessions to scan; counts are scaled back up.
+        deadline: Request deadline, checked between chunks.
 
     Returns:
-        Dict with "steps" and "dropoffs" (mapping step -> number of sessions dropping there).
+        Dict with "steps" and "dropoffs" (mapping step -> number of sessions dropping there),
+        plus a "partial" block when the deadline cut the scan short.
     """
 
     dropoffs = {step: 0 for step in steps}
     if not steps:
         return {"steps": steps, "dropoffs": dropoffs}
 
-    q = db.query(EventDB.session_id, EventDB.event_name, EventDB.timestamp_ms)
-    if api_key is not None:
-        q = q.filter(EventDB.api_key == api_key)
-    q = q.filter(EventDB.event_name.in_(steps))
-    q = q.order_by(EventDB.session_id, EventDB.timestamp_ms)
-
-    current_session_id = None
-    step_index = 0
-
-    for (session_id, event_name, _ts) in q.yield_per(5000):
-        if current_session_id is None:
-            current_session_id = session_id
+    with track_scan("dropoff") as scan:
+        for _session_id, events in iter_sessions(db, api_key, event_names=steps, sample=sample, deadline=deadline):
+            scan.rows += len(events)
+            scan.sessions += 1
             step_index = 0
-        elif session_id != current_session_id:
+            for (event_name, _ts) in events:
+                if step_index < len(steps) and event_name == steps[step_index]:
+                    step_index += 1
             if step_index > 0:
                 dropoffs[steps[step_index - 1]] += 1
-            current_session_id = session_id
-            step_index = 0
-
-        if step_index < len(steps) and event_name == steps[step_index]:
-            step_index += 1
-
-    if current_session_id is not None and step_index > 0:
-        dropoffs[steps[step_index - 1]] += 1
 
-    return {
+    threshold = sample_threshold(sample)
+    result = {
         "steps": steps,
-        "dropoffs": dropoffs
+        "dropoffs": {step: scale_count(count, threshold) for step, count in dropoffs.items()}
     }
+    if deadline is not None and deadline.cut_short:
+        result["partial"] = {"reason": "deadline", "sessions_scanned": scan.sessions}
+    return result
@@ -0,0 +1,181 @@
+"""
+Raw Event Export
+
+Streams one app's events for a time range, oldest first, for
+`GET /analytics/export`, as NDJSON, CSV or Arrow IPC (stream format):
+
+- hot rows come through a server-side cursor; cold rows (app/storage/cold.py)
+  one day file at a time; both are merged on (timestamp_ms, id)
+- output is encoded EXPORT_CHUNK_ROWS rows at a time, so memory stays flat no
+  matter how large the export is
+- resumable: every row carries its `timestamp_ms` and `id`, and
+  `cursor=<timestamp_ms>_<id>` (of the last row received) continues right after
+  it; keyset order is stable while new events keep arriving
+- optionally gzip-compressed on the fly
+
+Columns: id, timestamp_ms, event_name, session_id, platform, properties
+(a JSON object in NDJSON, a JSON-encoded string in CSV and Arrow).
+"""
+
+import csv
+import heapq
+import importlib.util
+import io
+import itertools
+import json
+import zlib
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.storage import cold
+from app.storage.dictionary import get_event_name_map, get_session_id_map
+from app.storage.events import iter_event_rows
+
+COLUMNS = ["id", "timestamp_ms", "event_name", "session_id", "platform", "properties"]
+
+# format -> (media type, file extension)
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+# Rows encoded (and fetched) per chunk
+EXPORT_CHUNK_ROWS = 5000
+
+
+def parse_cursor(cursor: str) -> Tuple[int, int]:
+    """`<timestamp_ms>_<id>` -> (timestamp_ms, id)."""
+    try:
+        timestamp_ms, row_id = cursor.split("_", 1)
+        return int(timestamp_ms), int(row_id)
+    except ValueError as exc:
+        raise ValueError("Invalid cursor (expected <timestamp_ms>_<id> of the last row received)") from exc
+
+
+def arrow_available() -> bool:
+    """Whether pyarrow is installed (checked without importing it)."""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def iter_export_rows(
+    db: Session,
+    app_key_id: int,
+    start_ms: Optional[int] = None,
+    end_ms: Optional[int] = None,
+    after: Optional[Tuple[int, int]] = None,
+    limit: Optional[int] = None,
+) -> Iterator[tuple]:
+    """Hot and cold rows of one app in (timestamp_ms, id) order, shaped like COLUMNS."""
+    rows: Iterable[tuple] = iter_event_rows(db, app_key_id, start_ms, end_ms, after, EXPORT_CHUNK_ROWS)
+    if cold.cold_enabled() and (start_ms is None or start_ms < cold.cold_cutoff_ms()):
+        cold_rows = _decode_cold(db, app_key_id, cold.iter_rows_by_time(app_key_id, start_ms, end_ms, after))
+        rows = heapq.merge(cold_rows, rows, key=lambda row: (row[1], row[0]))
+    if limit is not None:
+        rows = itertools.islice(rows, limit)
+    return iter(rows)
+
+
+def _decode_cold(db: Session, app_key_id: int, rows: Iterator[tuple]) -> Iterator[tuple]:
+    names = get_event_name_map(db, app_key_id)
+    for chunk in _chunks(rows, EXPORT_CHUNK_ROWS):
+        session_ids = get_session_id_map(db, (row[3] for row in chunk))
+        for row_id, timestamp_ms, event_name_id, session_key_id, platform, properties in chunk:
+            yield (
+                row_id,
+                timestamp_ms,
+                names.get(event_name_id, ""),
+                session_ids.get(session_key_id, ""),
+                platform,
+                json.loads(properties) if properties is not None else None,
+            )
+
+
+def encode(rows: Iterator[tuple], fmt: str) -> Iterator[bytes]:
+    """Encode rows as `fmt`, one bytes chunk per EXPORT_CHUNK_ROWS rows."""
+    if fmt == "csv":
+        return _encode_csv(rows)
+    if fmt == "arrow":
+        return _encode_arrow(rows)
+    return _encode_ndjson(rows)
+
+
+def gzip_chunks(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _encode_ndjson(rows: Iterator[tuple]) -> Iterator[bytes]:
+    for chunk in _chunks(rows, EXPORT_CHUNK_ROWS):
+        yield "".join(
+            json.dumps(dict(zip(COLUMNS, row)), separators=(",", ":")) + "\n" for row in chunk
+        ).encode()
+
+
+def _encode_csv(rows: Iterator[tuple]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for chunk in _chunks(rows, EXPORT_CHUNK_ROWS):
+        writer.writerows(
+            (row_id, timestamp_ms, name, session_id, platform, _json_or_none(properties))
+            for row_id, timestamp_ms, name, session_id, platform, properties in chunk
+        )
+        yield _drain_text(buffer)
+    tail = _drain_text(buffer)
+    if tail:
+        yield tail
+
+
+def _encode_arrow(rows: Iterator[tuple]) -> Iterator[bytes]:
+    import pyarrow as pa
+
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("timestamp_ms", pa.int64()),
+        ("event_name", pa.string()),
+        ("session_id", pa.string()),
+        ("platform", pa.string()),
+        ("properties", pa.string()),
+    ])
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for chunk in _chunks(rows, EXPORT_CHUNK_ROWS):
+            columns = list(zip(*chunk))
+            columns[5] = [_json_or_none(p) for p in columns[5]]
+            writer.write_batch(pa.record_batch([pa.array(c, f.type) for c, f in zip(columns, schema)], schema=schema))
+            yield _drain_bytes(sink)
+    # Schema alone (empty export) and the end-of-stream marker
+    yield _drain_bytes(sink)
+
+
+def _chunks(rows: Iterator[tuple], size: int) -> Iterator[List[tuple]]:
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _json_or_none(value) -> Optional[str]:
+    return json.dumps(value, separators=(",", ":")) if value is not None else None
+
+
+def _drain_text(buffer: io.StringIO) -> bytes:
+    data = buffer.getvalue().encode()
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+
+def _drain_bytes(buffer: io.BytesIO) -> bytes:
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data
@@ -1,18 +1,38 @@
 """
 Funnel Analysis (Server-Side)
 
-This module computes funnel conversion metrics from raw event rows in the database.
-It is implemented as a streaming scan (ordered by session + time) to keep memory usage
-low and avoid Python-side sorting on large datasets.
+This module computes funnel conversion metrics from the events of each session.
+It is implemented as a streaming scan (ordered by session + time, see scan.py) to keep
+memory usage low and avoid Python-side sorting on large datasets.
+
+With `sample`, only a fraction of sessions is scanned (see sampling.py); counts
+are scaled back up and reported with 95% confidence intervals.
 """
 
-from typing import List
+from typing import List, Optional
 from sqlalchemy.orm import Session
 
-from app.db.models import EventDB
-
-
-def run_funnel_for_steps(steps: List[str], db: Session, api_key: str | None = None):
+from app.analytics.sampling import (
+    count_interval,
+    sample_info,
+    sample_threshold,
+    scale_count,
+    wilson_interval,
+)
+from app.analytics.scan import iter_sessions
+from app.analytics.segments import Segment
+from app.core.deadline import Deadline
+from app.core.metrics import track_scan
+
+
+def run_funnel_for_steps(
+    steps: List[str],
+    db: Session,
+    api_key: str | None = None,
+    sample: Optional[float] = None,
+    deadline: Optional[Deadline] = None,
+    segment: Optional[Segment] = None,
+):
     """
     Compute basic funnel metrics for an ordered list of step event names.
 
@@ -24,72 +44,67 @@ def run_funnel_for_steps(steps: List[str], db: Session, api_key: str | None = No
         steps: Ordered list of event names representing the funnel.
         db: SQLAlchemy session.
         api_key: If provided, restrict computation to a single app/api_key.
+        sample: Fraction of sessions to scan (0 < sample <= 1); None or 1 is exact.
+        deadline: Request deadline, checked between chunks (app/core/deadline.py).
+        segment: Only sessions with an event matching these platform/property
+            filters (app/analytics/segments.py).
 
     Returns:
         Dict with steps, sessions_entered, sessions_completed, and conversion_rate.
+        Sampled results also carry a "sample" block with the rate, the raw
+        sampled counts and confidence intervals. A scan cut short by the
+        deadline (with allow_partial) carries a "partial" block, a segmented
+        one the "segment" it covers.
     """
 
-    query = db.query(EventDB.session_id, EventDB.event_name, EventDB.timestamp_ms)
-    if api_key is not None:
-        query = query.filter(EventDB.api_key == api_key)
-    query = query.filter(EventDB.event_name.in_(steps))
-    query = query.order_by(EventDB.session_id, EventDB.timestamp_ms)
-
     sessions_entered = 0
     sessions_completed = 0
 
-    events_processed = 0
-    sessions_seen = 0
-
-    current_session_id = None
-    step_index = 0
-
-    started_at = None
-    try:
-        import time as _time
-        started_at = _time.time()
-    except Exception:
-        started_at = None
-
-    # Stream rows in session+time order to avoid per-session sorting and high memory usage.
-    for (session_id, event_name, _ts) in query.yield_per(5000):
-        events_processed += 1
-        if current_session_id is None:
-            current_session_id = session_id
-            sessions_seen = 1
+    # Sessions arrive one at a time with their events already in time order,
+    # so no per-session sorting or buffering of the whole result is needed.
+    with track_scan("funnel") as scan:
+        for _session_id, events in iter_sessions(
+            db, api_key, event_names=steps, sample=sample, deadline=deadline, segment=segment
+        ):
+            scan.rows += len(events)
+            scan.sessions += 1
+
             step_index = 0
-        elif session_id != current_session_id:
-            # finalize previous session
+            for (event_name, _ts) in events:
+                if step_index < len(steps) and event_name == steps[step_index]:
+                    step_index += 1
+
             if step_index > 0:
                 sessions_entered += 1
             if step_index == len(steps):
                 sessions_completed += 1
 
-            # start new session
-            current_session_id = session_id
-            sessions_seen += 1
-            step_index = 0
-
-        if step_index < len(steps) and event_name == steps[step_index]:
-            step_index += 1
-          
-
-    # finalize last session
-    if current_session_id is not None:
-        if step_index > 0:
-            sessions_entered += 1
-        if step_index == len(steps):
-            sessions_completed += 1
-
     conversion_rate = (
         sessions_completed / sessions_entered
         if sessions_entered > 0 else 0
     )
 
-    return {
+    threshold = sample_threshold(sample)
+    result = {
         "steps": steps,
-        "sessions_entered": sessions_entered,
-        "sessions_completed": sessions_completed,
+        "sessions_entered": scale_count(sessions_entered, threshold),
+        "sessions_completed": scale_count(sessions_completed, threshold),
         "conversion_rate": conversion_rate
     }
+    if threshold is not None:
+        result["sample"] = {
+            **sample_info(
+                threshold,
+                sessions_entered=sessions_entered,
+                sessions_completed=sessions_completed,
+            ),
+            "sessions_entered_ci": count_interval(sessions_entered, threshold),
+            "sessions_completed_ci": count_interval(sessions_completed, threshold),
+            "conversion_rate_ci": wilson_interval(sessions_completed, sessions_entered),
+        }
+    if segment:
+        result["segment"] = segment.describe()
+    if deadline is not None and deadline.cut_short:
+        result["partial"] = {"reason": "deadline", "sessions_scanned": scan.sessions}
+    return result
 
@@ -10,6 +10,24 @@ Key principle: Analytics are deterministic and testable.
 
 from typing import Dict, List, Any, Optional
 
+# Snapshot fields read by compare_snapshots (the snapshot store keeps these
+# alongside each snapshot so comparisons never decode full snapshots).
+COMPARED_FIELDS = (
+    "conversion_rate",
+    "dropoff_rates",
+    "avg_time_to_complete_ms",
+    "unique_paths",
+    "error_count",
+)
+
+# Significance thresholds (shared with insight_timeline.py)
+CONVERSION_RATE_THRESHOLD = 0.05      # absolute change in conversion rate
+DROPOFF_RECORD_THRESHOLD = 0.03       # drop-off changes below this are not reported
+DROPOFF_THRESHOLD = 0.05              # drop-off change that counts as issue/improvement
+TIME_TO_COMPLETE_THRESHOLD_MS = 5000  # change in avg time-to-complete
+PATHS_FRAGMENTED_RATIO = 1.5          # unique paths grew by this factor
+PATHS_FOCUSED_RATIO = 0.7             # unique paths shrank to this factor
+
 
 def compare_snapshots(prev_snapshot: dict, curr_snapshot: dict) -> dict:
     """
@@ -75,9 +93,9 @@ def _compare_conversion_rate(
     }
     
     # Threshold: 5% change is significant
-    if delta < -0.05:
+    if delta < -CONVERSION_RATE_THRESHOLD:
         issues.append(f"Conversion rate dropped by {abs(delta):.1%}")
-    elif delta > 0.05:
+    elif delta > CONVERSION_RATE_THRESHOLD:
         improvements.append(f"Conversion rate improved by {delta:.1%}")
 
 
@@ -105,7 +123,7 @@ def _compare_dropoff_rates(
         delta = curr_rate - prev_rate
         
         # Only record if change is significant (> 3%)
-        if abs(delta) > 0.03:
+        if abs(delta) > DROPOFF_RECORD_THRESHOLD:
             dropoff_changes[step] = {
                 "previous": round(prev_rate, 4),
                 "current": round(curr_rate, 4),
@@ -113,9 +131,9 @@ def _compare_dropoff_rates(
             }
             
             # Threshold: 5% change triggers issue/improvement
-            if delta > 0.05:
+            if delta > DROPOFF_THRESHOLD:
                 issues.append(f"Drop-off at '{step}' increased by {delta:.1%}")
-            elif delta < -0.05:
+            elif delta < -DROPOFF_THRESHOLD:
                 improvements.append(f"Drop-off at '{step}' decreased by {abs(delta):.1%}")
     
     if dropoff_changes:
@@ -144,9 +162,9 @@ def _compare_time_to_complete(
     }
     
     # Threshold: 5 seconds (5000ms) change is significant
-    if delta_ms > 5000:
+    if delta_ms > TIME_TO_COMPLETE_THRESHOLD_MS:
         issues.append(f"Time-to-complete increased by {delta_ms/1000:.1f}s")
-    elif delta_ms < -5000:
+    elif delta_ms < -TIME_TO_COMPLETE_THRESHOLD_MS:
         improvements.append(f"Time-to-complete decreased by {abs(delta_ms)/1000:.1f}s")
 
 
@@ -169,9 +187,9 @@ def _compare_path_diversity(
     # More paths = more fragmented user behavior (usually bad)
     # Fewer paths = more focused user behavior (usually good)
     if prev_paths > 0:
-        if curr_paths > prev_paths * 1.5:
+        if curr_paths > prev_paths * PATHS_FRAGMENTED_RATIO:
             issues.append("User paths becoming more fragmented")
-        elif curr_paths < prev_paths * 0.7:
+        elif curr_paths < prev_paths * PATHS_FOCUSED_RATIO:
             improvements.append("User paths becoming more focused")
 
 
@@ -0,0 +1,224 @@
+"""
+Insight Timeline (batch comparison over insight history)
+
+`compare_snapshots` (insight_diff.py) compares two snapshots. This module does
+the same rule-based comparison across N stored snapshots at once, for trend
+views that shouldn't need an LLM call (or a request) per pair:
+
+1. The headline metrics of each snapshot are pulled into one column per metric
+   (conversion rate, time to complete, unique paths, error count, and one per
+   funnel-step drop-off), oldest first; missing values are None.
+2. Each column is walked once to get consecutive deltas, a trailing rolling
+   baseline (mean of the previous `window` values) and threshold crossings,
+   using the same thresholds as `compare_snapshots`.
+
+Like insight_diff.py, this is deterministic and makes no LLM calls.
+"""
+
+from typing import Callable, Dict, List, Optional
+
+from app.analytics.insight_diff import (
+    CONVERSION_RATE_THRESHOLD,
+    DROPOFF_THRESHOLD,
+    PATHS_FOCUSED_RATIO,
+    PATHS_FRAGMENTED_RATIO,
+    TIME_TO_COMPLETE_THRESHOLD_MS,
+    _determine_trend,
+)
+
+ISSUE = "issue"
+IMPROVEMENT = "improvement"
+
+# A rule maps (previous, current) to ISSUE, IMPROVEMENT or None
+Rule = Callable[[float, float], Optional[str]]
+
+
+def _conversion_rule(prev: float, curr: float) -> Optional[str]:
+    delta = curr - prev
+    if delta < -CONVERSION_RATE_THRESHOLD:
+        return ISSUE
+    if delta > CONVERSION_RATE_THRESHOLD:
+        return IMPROVEMENT
+    return None
+
+
+def _dropoff_rule(prev: float, curr: float) -> Optional[str]:
+    delta = curr - prev
+    if delta > DROPOFF_THRESHOLD:
+        return ISSUE
+    if delta < -DROPOFF_THRESHOLD:
+        return IMPROVEMENT
+    return None
+
+
+def _time_rule(prev: float, curr: float) -> Optional[str]:
+    delta = curr - prev
+    if delta > TIME_TO_COMPLETE_THRESHOLD_MS:
+        return ISSUE
+    if delta < -TIME_TO_COMPLETE_THRESHOLD_MS:
+        return IMPROVEMENT
+    return None
+
+
+def _paths_rule(prev: float, curr: float) -> Optional[str]:
+    if prev <= 0:
+        return None
+    if curr > prev * PATHS_FRAGMENTED_RATIO:
+        return ISSUE
+    if curr < prev * PATHS_FOCUSED_RATIO:
+        return IMPROVEMENT
+    return None
+
+
+def _errors_rule(prev: float, curr: float) -> Optional[str]:
+    if curr > prev:
+        return ISSUE
+    if curr < prev and prev > 0:
+        return IMPROVEMENT
+    return None
+
+
+# (metric, rule, missing-value default) - compare_snapshots treats missing
+# path/error counts as 0 and skips the other metrics when missing.
+_SCALAR_METRICS = [
+    ("conversion_rate", _conversion_rule, None),
+    ("avg_time_to_complete_ms", _time_rule, None),
+    ("unique_paths", _paths_rule, 0),
+    ("error_count", _errors_rule, 0),
+]
+
+
+def build_timeline(points: List[dict], window: int = 3) -> dict:
+    """
+    Compare consecutive snapshots across a whole insight history.
+
+    Args:
+        points: Oldest first; each {"insight_id", "created_at", "metrics"} where
+            `metrics` holds snapshot fields (see insight_diff.COMPARED_FIELDS)
+        window: How many previous points the rolling baseline averages
+
+    Returns:
+        A dict containing:
+        - points: [{"insight_id", "created_at", "overall_trend"}] (trend vs the previous point)
+        - series: {metric: {"values", "deltas", "baseline"}}; drop-offs as
+          series["dropoff_rates"][step]
+        - crossings: [{"index", "insight_id", "metric", "step", "kind", "previous", "current", "delta"}]
+        - summary: issue/improvement counts and the overall trend (first vs last point)
+    """
+    window = max(1, window)
+    snapshots = [p.get("metrics") or {} for p in points]
+
+    series: Dict[str, dict] = {}
+    crossings: List[dict] = []
+    for metric, rule, default in _SCALAR_METRICS:
+        column = [_number(s.get(metric), default) for s in snapshots]
+        series[metric] = _analyze(column, rule, window, metric, None, points, crossings)
+
+    steps = list(dict.fromkeys(step for s in snapshots for step in (s.get("dropoff_rates") or {})))
+    series["dropoff_rates"] = {}
+    for step in steps:
+        column = [_number((s.get("dropoff_rates") or {}).get(step), None) for s in snapshots]
+        series["dropoff_rates"][step] = _analyze(column, _dropoff_rule, window, "dropoff_rates", step, points, crossings)
+
+    crossings.sort(key=lambda c: c["index"])
+    per_point: List[Dict[str, int]] = [{ISSUE: 0, IMPROVEMENT: 0} for _ in points]
+    for crossing in crossings:
+        per_point[crossing["index"]][crossing["kind"]] += 1
+
+    issues = sum(c[ISSUE] for c in per_point)
+    improvements = sum(c[IMPROVEMENT] for c in per_point)
+    return {
+        "points": [
+            {
+                "insight_id": p.get("insight_id"),
+                "created_at": p.get("created_at"),
+                "overall_trend": _trend(counts) if i > 0 else None,
+            }
+            for i, (p, counts) in enumerate(zip(points, per_point))
+        ],
+        "series": series,
+        "crossings": crossings,
+        "summary": {
+            "points": len(points),
+            "window": window,
+            "issues": issues,
+            "improvements": improvements,
+            "overall_trend": _overall_trend(snapshots),
+        },
+    }
+
+
+def _analyze(
+    column: List[Optional[float]],
+    rule: Rule,
+    window: int,
+    metric: str,
+    step: Optional[str],
+    points: List[dict],
+    crossings: List[dict],
+) -> dict:
+    """One pass over a metric column: deltas, trailing baseline, crossings."""
+    deltas: List[Optional[float]] = [None] * len(column)
+    baseline: List[Optional[float]] = [None] * len(column)
+    recent: List[float] = []   # last `window` non-missing values
+    total = 0.0
+    prev = None
+    for i, value in enumerate(column):
+        if recent:
+            baseline[i] = _round(total / len(recent))
+        if value is None:
+            continue
+        if prev is not None:
+            deltas[i] = _round(value - prev)
+            kind = rule(prev, value)
+            if kind is not None:
+                crossings.append({
+                    "index": i,
+                    "insight_id": points[i].get("insight_id"),
+                    "metric": metric,
+                    "step": step,
+                    "kind": kind,
+                    "previous": _round(prev),
+                    "current": _round(value),
+                    "delta": deltas[i],
+                })
+        recent.append(value)
+        total += value
+        if len(recent) > window:
+            total -= recent.pop(0)
+        prev = value
+    return {"values": [_round(v) for v in column], "deltas": deltas, "baseline": baseline}
+
+
+def _overall_trend(snapshots: List[dict]) -> Optional[str]:
+    """Trend between the oldest and newest snapshot (same rules as compare_snapshots)."""
+    if len(snapshots) < 2:
+        return None
+    first, last = snapshots[0], snapshots[-1]
+    counts = {ISSUE: 0, IMPROVEMENT: 0}
+    for metric, rule, default in _SCALAR_METRICS:
+        prev, curr = _number(first.get(metric), default), _number(last.get(metric), default)
+        if prev is not None and curr is not None:
+            kind = rule(prev, curr)
+            if kind is not None:
+                counts[kind] += 1
+    first_dropoff = first.get("dropoff_rates") or {}
+    for step, curr in (last.get("dropoff_rates") or {}).items():
+        prev = first_dropoff.get(step)
+        if prev is not None and curr is not None:
+            kind = _dropoff_rule(prev, curr)
+            if kind is not None:
+                counts[kind] += 1
+    return _trend(counts)
+
+
+def _trend(counts: Dict[str, int]) -> str:
+    return _determine_trend([None] * counts[ISSUE], [None] * counts[IMPROVEMENT])
+
+
+def _number(value, default) -> Optional[float]:
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else default
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 4) if isinstance(value, float) else value
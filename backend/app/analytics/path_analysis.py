@@ -5,11 +5,22 @@ This module summarizes common navigation/behavior paths by session by turning ea
 session's first N events into a single "A → B → C" path string and counting frequency.
 """
 
-from typing import Dict, Optional, List
+from typing import Dict, Optional
 from sqlalchemy.orm import Session
-from app.db.models import EventDB
-
-def analyze_paths(db: Session, max_depth: int = 10, api_key: Optional[str] = None) -> Dict[str, int]:
+from app.analytics.sampling import sample_threshold, scale_count
+from app.analytics.scan import iter_sessions
+from app.analytics.segments import Segment
+from app.core.deadline import Deadline
+from app.core.metrics import track_scan
+
+def analyze_paths(
+    db: Session,
+    max_depth: int = 10,
+    api_key: Optional[str] = None,
+    sample: Optional[float] = None,
+    deadline: Optional[Deadline] = None,
+    segment: Optional[Segment] = None,
+) -> Dict[str, int]:
     """
     Aggregate the most common event-name paths across sessions.
 
@@ -17,45 +28,31 @@ def analyze_paths(db: Session, max_depth: int = 10, api_key: Optional[str] = Non
         db: SQLAlchemy session.
         max_depth: Max number of events to include per session in the path.
         api_key: If provided, restrict computation to a single app/api_key.
+        sample: Fraction of sessions to scan; counts are scaled back up.
+        deadline: Request deadline, checked between chunks; if it cut the scan
+            short, `deadline.cut_short` is set (the mapping has no room for a flag).
+        segment: Only sessions with an event matching these platform/property filters.
 
     Returns:
         Mapping of "event → event → ..." path string to occurrence count, sorted desc.
     """
    
-    q = db.query(EventDB.session_id, EventDB.event_name, EventDB.timestamp_ms)
-    if api_key is not None:
-        q = q.filter(EventDB.api_key == api_key)
-    q = q.order_by(EventDB.session_id, EventDB.timestamp_ms)
-
     path_counts: Dict[str, int] = {}
-    current_session_id = None
-    names: List[str] = []
-
-    def flush():
-        if len(names) < 2:
-            return
-        path = " → ".join(names[:max_depth])
-        path_counts[path] = path_counts.get(path, 0) + 1
-
-    for (session_id, event_name, _ts) in q.yield_per(5000):
-        if current_session_id is None:
-            current_session_id = session_id
-            names = [event_name]
-            continue
-        if session_id != current_session_id:
-            flush()
-            current_session_id = session_id
-            names = [event_name]
-            continue
-        if len(names) < max_depth:
-            names.append(event_name)
-
-    if current_session_id is not None:
-        flush()
 
+    with track_scan("paths") as scan:
+        for _session_id, events in iter_sessions(db, api_key, sample=sample, deadline=deadline, segment=segment):
+            scan.rows += len(events)
+            scan.sessions += 1
+            names = [event_name for (event_name, _ts) in events[:max_depth]]
+            if len(names) < 2:
+                continue
+            path = " → ".join(names)
+            path_counts[path] = path_counts.get(path, 0) + 1
+
+    threshold = sample_threshold(sample)
     return dict(
         sorted(
-            path_counts.items(),
+            ((path, scale_count(count, threshold)) for path, count in path_counts.items()),
             key=lambda item: item[1],
             reverse=True
         )
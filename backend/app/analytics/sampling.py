@@ -0,0 +1,86 @@
+"""
+Session Sampling
+
+Deterministic, session-level sampling for interactive analytics on large apps.
+
+A session is in a sample of rate `r` when its hash bucket (a multiplicative
+hash of `session_key_id`, the integer id of the client `session_id`, see
+`sample_bucket` in app/db/models.py) is below `r * SAMPLE_BUCKETS`. So:
+- a session is either fully in or fully out (funnels stay consistent),
+- the same session is picked by every query and every backend (events table,
+  sessions table, cold files), and a smaller rate's sample is a subset of a
+  larger one's.
+
+Counts measured on the sample are scaled back up by `1 / r`, and results carry
+confidence intervals so the dashboard can show how precise they are.
+"""
+
+import math
+from typing import Dict, List, Optional
+
+from app.db.models import SAMPLE_BUCKETS, SAMPLE_HASH_MULTIPLIER, sample_bucket
+
+# z for a two-sided 95% interval
+Z_95 = 1.96
+
+
+def sample_threshold(sample: Optional[float]) -> Optional[int]:
+    """Bucket threshold for a sample rate, or None when the query is exact."""
+    if sample is None or sample >= 1:
+        return None
+    return max(1, round(sample * SAMPLE_BUCKETS))
+
+
+def effective_rate(threshold: int) -> float:
+    """The rate actually sampled (threshold is rounded to whole buckets)."""
+    return threshold / SAMPLE_BUCKETS
+
+
+def in_sample(column, threshold: int):
+    """SQL filter keeping only sampled sessions (`column` holds session_key_id)."""
+    return sample_bucket(column) < threshold
+
+
+def bucket_of(session_key_id: int) -> int:
+    """Python twin of `sample_bucket`, for rows that don't come from SQL."""
+    return (session_key_id * SAMPLE_HASH_MULTIPLIER) % SAMPLE_BUCKETS
+
+
+def scale_count(count: int, threshold: Optional[int]) -> int:
+    """Scale a count measured on the sample up to the full population."""
+    if threshold is None:
+        return count
+    return int(round(count / effective_rate(threshold)))
+
+
+def count_interval(count: int, threshold: int, z: float = Z_95) -> List[int]:
+    """
+    Confidence interval for a scaled-up count.
+
+    Each session is included independently with probability r, so the sampled
+    count is ~Binomial(N, r) and Var(count / r) ≈ count * (1 - r) / r².
+    """
+    rate = effective_rate(threshold)
+    estimate = count / rate
+    margin = z * math.sqrt(count * (1 - rate)) / rate
+    return [max(count, int(math.floor(estimate - margin))), int(math.ceil(estimate + margin))]
+
+
+def wilson_interval(successes: int, trials: int, z: float = Z_95) -> Optional[List[float]]:
+    """Wilson score interval for a proportion (None when there are no trials)."""
+    if trials <= 0:
+        return None
+    p = successes / trials
+    denom = 1 + z * z / trials
+    center = (p + z * z / (2 * trials)) / denom
+    margin = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denom
+    return [round(max(0.0, center - margin), 4), round(min(1.0, center + margin), 4)]
+
+
+def sample_info(threshold: int, **sampled_counts: int) -> Dict:
+    """The `sample` block attached to sampled results."""
+    return {
+        "rate": round(effective_rate(threshold), 6),
+        **{f"{name}_sampled": count for name, count in sampled_counts.items()},
+    }
+
@@ -0,0 +1,245 @@
+"""
+Session Scan
+
+Shared data source for the analytics engines. Every engine (funnel, drop-off,
+paths, time-to-complete) works on the ordered events of one session at a time,
+so this module hands them exactly that:
+
+    for session_id, events in iter_sessions(db, api_key, event_names=steps):
+        ...  # events is [(event_name, timestamp_ms), ...] in time order
+
+Two backends are supported (selected by ANALYTICS_SOURCE):
+- "events": stream raw event rows ordered by session + time
+- "sessions": read the pre-aggregated sessions table (one row per session),
+  maintained by the background sessionizer
+
+When the cold storage tier is enabled, older events live in per-day Arrow files
+(app/storage/cold.py); the "events" backend merges them with the hot table so
+engines see one ordered stream.
+
+With `sample`, only a deterministic subset of sessions is read (see
+sampling.py); every backend picks the same sessions.
+
+With a `segment` (see segments.py), only sessions with an event matching its
+platform/property filters are read, counting hot and cold events alike;
+segments need the raw events, so they always use the "events" backend.
+
+With a `deadline` (app/core/deadline.py), the scan checks it every CHUNK_SIZE
+rows and stops early (raising, or ending the stream when partial results are
+accepted; a session cut off mid-way is not yielded).
+
+Events are stored dictionary-encoded, so all filtering and sorting in SQL is on
+integer ids; names are decoded in Python from the (small) per-app dictionary.
+Sessions are identified by their integer `session_key_id`.
+"""
+
+import heapq
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from sqlalchemy.orm import Session, aliased
+
+from app.analytics.sampling import in_sample, sample_threshold
+from app.analytics.segments import Segment
+from app.core.config import ANALYTICS_SOURCE
+from app.core.deadline import Deadline
+from app.db.models import EventDB, SessionDB
+from app.storage import cold
+from app.storage.dictionary import get_app_key_id, get_event_name_map
+
+logger = logging.getLogger(__name__)
+
+SessionEvents = List[Tuple[str, int]]
+
+# Rows fetched per round trip when streaming.
+CHUNK_SIZE = 5000
+
+# Session ids per `IN (...)` list when fetching hot rows by id.
+IN_CHUNK = 1000
+
+
+def iter_sessions(
+    db: Session,
+    api_key: Optional[str] = None,
+    event_names: Optional[Iterable[str]] = None,
+    *,
+    source: Optional[str] = None,
+    sample: Optional[float] = None,
+    deadline: Optional[Deadline] = None,
+    segment: Optional[Segment] = None,
+) -> Iterator[Tuple[int, SessionEvents]]:
+    """
+    Yield `(session_key_id, [(event_name, timestamp_ms), ...])` for each session.
+
+    Args:
+        db: SQLAlchemy session.
+        api_key: If provided, restrict the scan to a single app/api_key.
+        event_names: If provided, only these events are returned; sessions with
+            no matching event are skipped.
+        source: Override ANALYTICS_SOURCE ("events" or "sessions").
+        sample: If provided (0 < sample < 1), only that fraction of sessions is
+            returned, chosen deterministically per session.
+        deadline: If provided, checked between chunks (see module docstring).
+        segment: If provided, only sessions with an event matching it.
+    """
+    if deadline is not None:
+        if not deadline.check():
+            return iter(())
+        deadline.apply_statement_timeout(db)
+
+    app_key_id = None
+    if api_key is not None:
+        app_key_id = get_app_key_id(db, api_key)
+        if app_key_id is None:
+            return iter(())
+
+    if event_names is not None:
+        wanted = set(event_names)
+        decode = {
+            code: name
+            for code, name in get_event_name_map(db, app_key_id).items()
+            if name in wanted
+        }
+        if not decode:
+            return iter(())
+        codes = list(decode)
+    else:
+        decode = _NameDecoder(db, app_key_id)
+        codes = None
+
+    threshold = sample_threshold(sample)
+    if (source or ANALYTICS_SOURCE) == "sessions" and not segment:
+        return _iter_from_sessions(db, app_key_id, codes, decode, threshold, deadline)
+    return _iter_from_events(db, app_key_id, codes, decode, threshold, deadline, segment or None)
+
+
+def _iter_from_events(
+    db: Session,
+    app_key_id: Optional[int],
+    codes: Optional[List[int]],
+    decode: Dict[int, str],
+    threshold: Optional[int],
+    deadline: Optional[Deadline],
+    segment: Optional[Segment] = None,
+) -> Iterator[Tuple[int, SessionEvents]]:
+    """Stream raw (hot + cold) events in session+time order and group them per session."""
+    q = db.query(EventDB.session_key_id, EventDB.event_name_id, EventDB.timestamp_ms)
+    if app_key_id is not None:
+        q = q.filter(EventDB.app_key_id == app_key_id)
+    if codes is not None:
+        q = q.filter(EventDB.event_name_id.in_(codes))
+    if threshold is not None:
+        q = q.filter(in_sample(EventDB.session_key_id, threshold))
+    cold_sessions = None
+    cold_only_rows: Iterable[Tuple[int, int, int]] = ()
+    if segment is not None:
+        matching = segment.session_ids(aliased(EventDB), app_key_id, db.get_bind().dialect.name)
+        if cold.cold_enabled():
+            # A session matches when any of its events does, hot or cold, so
+            # both streams are filtered by the union of the two match sets: a
+            # session straddling the cutoff is read whole whichever side matched.
+            hot_matches = {session_key_id for (session_key_id,) in db.execute(matching.distinct())}
+            cold_matches = cold.matching_sessions(app_key_id, segment.arrow_mask)
+            cold_sessions = hot_matches | cold_matches
+            cold_only_rows = _iter_rows_of_sessions(q, sorted(cold_matches - hot_matches))
+        q = q.filter(EventDB.session_key_id.in_(matching))
+    q = q.order_by(EventDB.session_key_id, EventDB.timestamp_ms)
+
+    rows = q.yield_per(CHUNK_SIZE)
+    if cold.cold_enabled():
+        # Sessions can straddle the cold cutoff; merge the sorted streams on
+        # (session, time) so each session is still yielded whole.
+        rows = heapq.merge(
+            rows,
+            cold_only_rows,
+            cold.iter_session_rows(app_key_id, codes, threshold, cold_sessions),
+            key=lambda r: (r[0], r[2]),
+        )
+
+    current_session = None
+    events: SessionEvents = []
+
+    for row_number, (session_key_id, event_name_id, ts_ms) in enumerate(rows, 1):
+        if deadline is not None and row_number % CHUNK_SIZE == 0 and not deadline.check():
+            return
+        if session_key_id != current_session:
+            if current_session is not None:
+                yield current_session, events
+            current_session = session_key_id
+            events = []
+        events.append((decode[event_name_id], ts_ms))
+
+    if current_session is not None:
+        yield current_session, events
+
+
+def _iter_rows_of_sessions(q, session_key_ids: List[int]) -> Iterator[Tuple[int, int, int]]:
+    """Hot rows of `q` for the given (sorted) sessions, in session+time order, IN_CHUNK ids per query."""
+    for start in range(0, len(session_key_ids), IN_CHUNK):
+        chunk = session_key_ids[start:start + IN_CHUNK]
+        yield from (
+            q.filter(EventDB.session_key_id.in_(chunk))
+            .order_by(EventDB.session_key_id, EventDB.timestamp_ms)
+            .yield_per(CHUNK_SIZE)
+        )
+
+
+def _iter_from_sessions(
+    db: Session,
+    app_key_id: Optional[int],
+    codes: Optional[List[int]],
+    decode: Dict[int, str],
+    threshold: Optional[int],
+    deadline: Optional[Deadline],
+) -> Iterator[Tuple[int, SessionEvents]]:
+    """Read pre-aggregated session rows and expand their encoded sequences."""
+    q = db.query(
+        SessionDB.session_key_id,
+        SessionDB.first_ts_ms,
+        SessionDB.event_name_ids,
+        SessionDB.event_offsets_ms,
+    )
+    if app_key_id is not None:
+        q = q.filter(SessionDB.app_key_id == app_key_id)
+    if threshold is not None:
+        q = q.filter(in_sample(SessionDB.session_key_id, threshold))
+    q = q.order_by(SessionDB.session_key_id)
+
+    for row_number, (session_key_id, first_ts_ms, seq_codes, seq_offsets) in enumerate(q.yield_per(CHUNK_SIZE), 1):
+        if deadline is not None and row_number % CHUNK_SIZE == 0 and not deadline.check():
+            return
+        if codes is None:
+            events = [
+                (decode[code], first_ts_ms + offset)
+                for code, offset in zip(seq_codes, seq_offsets)
+            ]
+        else:
+            events = [
+                (decode[code], first_ts_ms + offset)
+                for code, offset in zip(seq_codes, seq_offsets)
+                if code in decode
+            ]
+        if events:
+            yield session_key_id, events
+
+
+class _NameDecoder(dict):
+    """
+    {event_name_id: name} map that reloads the dictionary on a miss, so names
+    registered by ingestion while a scan is running still decode.
+
+    A code that is still unknown after the reload (a dictionary row missing
+    for stored events) is logged once and decodes to a visible placeholder,
+    so its events stay apart instead of merging under an empty name.
+    """
+
+    def __init__(self, db: Session, app_key_id: Optional[int]):
+        super().__init__(get_event_name_map(db, app_key_id))
+        self._db = db
+        self._app_key_id = app_key_id
+
+    def __missing__(self, code: int) -> str:
+        self.update(get_event_name_map(self._db, self._app_key_id))
+        if code not in self:
+            logger.error("Unknown event_name_id %s for app_key_id=%s", code, self._app_key_id)
+            self[code] = f"<unknown event {code}>"
+        return self[code]
@@ -0,0 +1,142 @@
+"""
+Segments
+
+Platform and event-property filters for the analytics engines, pushed into SQL:
+
+    segment = Segment(platform="ios", properties={"plan": "pro"})
+
+- funnels and paths keep sessions with at least one event matching every
+  filter (`session_key_id IN (SELECT ... FROM events WHERE ...)`)
+- event volume counts only matching events
+
+Property values compare as text, like Postgres `properties ->> 'key'`:
+`"plan": "pro"`, `"trial": true` and `"trial": "true"`, `"seats": 3` and
+`"seats": "3"` all work the same way. Query strings spell filters as
+`property=plan:pro`.
+
+The lookups stay index-driven:
+- platform: `ix_events_app_platform_session`
+- keys in HOT_PROPERTY_KEYS: their expression index on (app, value, session)
+- other keys on Postgres: the JSONB GIN index, through a containment test
+  (`properties::jsonb @> '{"plan": "pro"}'`, plus the number/boolean spelling
+  of the value) that the text comparison then confirms
+- other keys on SQLite (local development) scan the app's events
+
+Cold events (app/storage/cold.py) are matched in Arrow instead; the scan
+(scan.py) keeps a session when either side matched, and reads it whole.
+"""
+
+import json
+from typing import Dict, List, Optional
+
+from sqlalchemy import cast, literal, or_, select
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.core.config import HOT_PROPERTY_KEYS
+from app.db.models import PROPERTY_KEY_PATTERN, property_text
+
+# Property filters per segment
+MAX_PROPERTY_FILTERS = 10
+
+
+class Segment:
+    """A platform and/or property filter for one analytics request."""
+
+    def __init__(self, platform: Optional[str] = None, properties: Optional[Dict[str, object]] = None):
+        properties = properties or {}
+        if len(properties) > MAX_PROPERTY_FILTERS:
+            raise ValueError(f"At most {MAX_PROPERTY_FILTERS} property filters")
+        for key, value in properties.items():
+            if not PROPERTY_KEY_PATTERN.match(key):
+                raise ValueError(f"Invalid property key: {key!r}")
+            if value is None:
+                raise ValueError(f"Property filter {key!r} needs a value")
+        self.platform = platform or None
+        self.properties: Dict[str, str] = {key: property_value_text(value) for key, value in properties.items()}
+
+    @classmethod
+    def from_query(cls, platform: Optional[str], filters: Optional[List[str]]) -> Optional["Segment"]:
+        """Build from query parameters (`property=key:value`, repeatable); None when empty."""
+        properties = {}
+        for item in filters or []:
+            key, sep, value = item.partition(":")
+            if not sep or not key:
+                raise ValueError(f"Invalid property filter {item!r} (expected key:value)")
+            properties[key] = value
+        segment = cls(platform, properties)
+        return segment if segment else None
+
+    def __bool__(self) -> bool:
+        return self.platform is not None or bool(self.properties)
+
+    def describe(self) -> dict:
+        """Echoed in results, so a cached response says which segment it covers."""
+        return {"platform": self.platform, "properties": dict(self.properties)}
+
+    def conditions(self, events, dialect: str) -> list:
+        """WHERE conditions on an `events` entity (EventDB or an alias of it)."""
+        conds = []
+        if self.platform is not None:
+            conds.append(events.platform == self.platform)
+        for key, value in self.properties.items():
+            text_match = property_text(events.properties, key) == value
+            if dialect == "postgresql" and key not in HOT_PROPERTY_KEYS:
+                as_jsonb = cast(events.properties, JSONB)
+                contains = [
+                    as_jsonb.op("@>")(cast(literal(json.dumps({key: candidate})), JSONB))
+                    for candidate in _json_candidates(value)
+                ]
+                conds.append(or_(*contains) if len(contains) > 1 else contains[0])
+            conds.append(text_match)
+        return conds
+
+    def session_ids(self, events, app_key_id: Optional[int], dialect: str):
+        """Subquery of the (app's) sessions with a matching event."""
+        q = select(events.session_key_id).where(*self.conditions(events, dialect))
+        return q.where(events.app_key_id == app_key_id) if app_key_id is not None else q
+
+    def arrow_mask(self, table):
+        """Boolean mask over a cold table with `platform` and `properties` (JSON text) columns."""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        mask = pa.array([True] * table.num_rows, pa.bool_())
+        if self.platform is not None:
+            mask = pc.and_(mask, pc.fill_null(pc.equal(table["platform"], self.platform), False))
+        if self.properties:
+            matches = [_row_matches(raw, self.properties) for raw in table["properties"].to_pylist()]
+            mask = pc.and_(mask, pa.array(matches, pa.bool_()))
+        return mask
+
+
+def property_value_text(value) -> str:
+    """A property value as `properties ->> 'key'` would return it."""
+    if isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+def _json_candidates(value: str) -> list:
+    """JSON values whose text form is `value`: the string, and a number/boolean spelled that way."""
+    candidates: list = [value]
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        return candidates
+    if isinstance(parsed, (bool, int, float)) and json.dumps(parsed) == value:
+        candidates.append(parsed)
+    return candidates
+
+
+def _row_matches(raw: Optional[str], properties: Dict[str, str]) -> bool:
+    if raw is None:
+        return False
+    # Cheap substring test first: most rows don't carry the keys at all
+    if not all(json.dumps(key) in raw for key in properties):
+        return False
+    props = json.loads(raw)
+    return all(
+        key in props and props[key] is not None and property_value_text(props[key]) == value
+        for key, value in properties.items()
+    )
+
@@ -0,0 +1,60 @@
+"""
+Session Statistics
+
+Summaries computed directly from the pre-aggregated `sessions` table
+(one row per session, see app/workers/sessionizer.py): session counts,
+duration stats, events per session and error sessions. These are single
+aggregate queries, no raw event scan involved.
+"""
+
+from typing import Dict, Optional
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from app.db.models import SessionDB
+from app.storage.dictionary import get_app_key_id
+
+
+def calculate_session_stats(db: Session, api_key: Optional[str] = None) -> Dict:
+    """
+    Aggregate session-level statistics.
+
+    Args:
+        db: SQLAlchemy session.
+        api_key: If provided, restrict computation to a single app/api_key.
+
+    Returns:
+        Dict with session_count, error_sessions, avg_events_per_session,
+        avg_duration_ms, max_duration_ms and a per-platform session count.
+    """
+    app_key_id = None
+    if api_key is not None:
+        # Unknown api_key: match nothing (-1 is never a valid id).
+        app_key_id = get_app_key_id(db, api_key) or -1
+
+    duration = SessionDB.last_ts_ms - SessionDB.first_ts_ms
+
+    q = db.query(
+        func.count(SessionDB.session_key_id),
+        func.sum(case((SessionDB.has_error, 1), else_=0)),
+        func.avg(SessionDB.event_count),
+        func.avg(duration),
+        func.max(duration),
+    )
+    if app_key_id is not None:
+        q = q.filter(SessionDB.app_key_id == app_key_id)
+    (session_count, error_sessions, avg_events, avg_duration, max_duration) = q.one()
+
+    platforms = db.query(SessionDB.platform, func.count(SessionDB.session_key_id)).group_by(SessionDB.platform)
+    if app_key_id is not None:
+        platforms = platforms.filter(SessionDB.app_key_id == app_key_id)
+
+    return {
+        "session_count": int(session_count or 0),
+        "error_sessions": int(error_sessions or 0),
+        "avg_events_per_session": round(float(avg_events), 2) if avg_events is not None else None,
+        "avg_duration_ms": int(avg_duration) if avg_duration is not None else None,
+        "max_duration_ms": int(max_duration) if max_duration is not None else None,
+        "platforms": {(platform or "unknown"): int(count) for (platform, count) in platforms.all()},
+    }
+
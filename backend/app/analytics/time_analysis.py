@@ -9,19 +9,26 @@ from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from statistics import mean, median
 from typing import Optional
-from app.db.models import EventDB
+from app.analytics.sampling import sample_threshold, scale_count
+from app.analytics.scan import iter_sessions
+from app.core.deadline import Deadline
+from app.core.metrics import track_scan
 
 
 def calculate_time_to_complete(
     start_event: str,
     end_event: str,
     db: Session,
-    api_key: Optional[str] = None
+    api_key: Optional[str] = None,
+    sample: Optional[float] = None,
+    deadline: Optional[Deadline] = None,
 ):
     """
     Compute duration statistics from first start_event to first end_event per session.
 
     Only one duration per session is counted (the first completion after the start).
+    With `sample`, durations come from a fraction of sessions and `count` is scaled back up.
+    A scan cut short by the `deadline` adds a "partial" block.
     """
     durations = []
     if not start_event or not end_event:
@@ -36,37 +43,22 @@ def calculate_time_to_complete(
         }
 
 
-    q = db.query(EventDB.session_id, EventDB.event_name, EventDB.timestamp_ms)
-    if api_key is not None:
-        q = q.filter(EventDB.api_key == api_key)
-    q = q.filter(EventDB.event_name.in_([start_event, end_event]))
-    q = q.order_by(EventDB.session_id, EventDB.timestamp_ms)
-
-    current_session_id = None
-    start_time = None
-    found_duration = False
-
-    for (session_id, event_name, ts_ms) in q.yield_per(5000):
-        if current_session_id is None:
-            current_session_id = session_id
-            start_time = None
-            found_duration = False
-        elif session_id != current_session_id:
-            current_session_id = session_id
+    with track_scan("time_to_complete") as scan:
+        for _session_id, events in iter_sessions(
+            db, api_key, event_names=[start_event, end_event], sample=sample, deadline=deadline
+        ):
+            scan.rows += len(events)
+            scan.sessions += 1
             start_time = None
-            found_duration = False
-
-        if found_duration:
-            continue
-
-        if event_name == start_event and start_time is None:
-            start_time = ts_ms
-        elif event_name == end_event and start_time is not None:
-            durations.append(ts_ms - start_time)
-            found_duration = True
+            for (event_name, ts_ms) in events:
+                if event_name == start_event and start_time is None:
+                    start_time = ts_ms
+                elif event_name == end_event and start_time is not None:
+                    durations.append(ts_ms - start_time)
+                    break
 
     if not durations:
-        return {
+        result = {
             "start_event": start_event,
             "end_event": end_event,
             "count": 0,
@@ -75,13 +67,16 @@ def calculate_time_to_complete(
             "min_ms": None,
             "max_ms": None,
         }
-
-    return {
-        "start_event": start_event,
-        "end_event": end_event,
-        "count": len(durations),
-        "average_ms": int(mean(durations)),
-        "median_ms": int(median(durations)),
-        "min_ms": min(durations),
-        "max_ms": max(durations),
-    }
+    else:
+        result = {
+            "start_event": start_event,
+            "end_event": end_event,
+            "count": scale_count(len(durations), sample_threshold(sample)),
+            "average_ms": int(mean(durations)),
+            "median_ms": int(median(durations)),
+            "min_ms": min(durations),
+            "max_ms": max(durations),
+        }
+    if deadline is not None and deadline.cut_short:
+        result["partial"] = {"reason": "deadline", "sessions_scanned": scan.sessions}
+    return result
@@ -0,0 +1,153 @@
+"""
+Admin API
+
+Operator-only endpoints, authenticated with `Authorization: Bearer <ADMIN_TOKEN>`
+(see `require_admin`); disabled when ADMIN_TOKEN is unset.
+"""
+
+import os
+import tempfile
+import threading
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core import slow_queries
+from app.core.auth import require_admin
+from app.core.config import BULK_IMPORT_DIR
+from app.db.deps import get_db
+from app.db.database import SessionLocal
+from app.db.models import BulkImportDB
+from app.storage.imports import create_import, get_import, list_imports
+from app.workers import bulk_import
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/slow-queries")
+def list_slow_queries(limit: int = Query(50, ge=1, le=500)):
+    """Recent slow read statements of this process, newest first, with their plans."""
+    return slow_queries.recent(limit)
+
+
+@router.delete("/slow-queries", status_code=204)
+def clear_slow_queries():
+    """Empty this process's slow-query buffer."""
+    slow_queries.clear()
+
+
+# =============================================================================
+# Bulk imports
+# =============================================================================
+
+@router.post("/imports", status_code=202)
+async def create_bulk_import(
+    request: Request,
+    api_key: str,
+    fmt: Optional[str] = Query(None, alias="format", pattern="^(ndjson|csv|parquet)$"),
+    path: Optional[str] = None,
+):
+    """
+    Start loading historical events for an api_key (see app/workers/bulk_import.py).
+
+    The file is either the request body (sent as-is; gzip files are detected,
+    don't set Content-Encoding) or, with `path`, a file under BULK_IMPORT_DIR on
+    the server. Runs in the background; poll `GET /admin/imports/{id}`.
+    Indexes stay in place (ingestion and analytics keep running alongside);
+    deferring them is a maintenance-window option of the command line.
+    """
+    if path is not None:
+        file_path = _resolve_import_path(path)
+        fmt = fmt or bulk_import.detect_format(file_path)
+        if fmt is None:
+            raise HTTPException(status_code=400, detail="Cannot tell the format from the file name; pass format")
+        source, uploaded = file_path, False
+    else:
+        if fmt is None:
+            raise HTTPException(status_code=400, detail="format is required for uploads")
+        file_path = await _spool_upload(request)
+        source, uploaded = "upload", True
+
+    job = await run_in_threadpool(_create_import, api_key, source, fmt)
+    threading.Thread(
+        target=bulk_import.run_import,
+        args=(job.id, file_path, fmt),
+        kwargs={"delete_after": uploaded},
+        name=f"bulk-import-{job.id[:8]}",
+        daemon=True,
+    ).start()
+    return _import_response(job)
+
+
+@router.get("/imports")
+def list_bulk_imports(limit: int = Query(50, ge=1, le=500), db: Session = Depends(get_db)):
+    """Recent bulk imports, newest first."""
+    return [_import_response(job) for job in list_imports(db, limit)]
+
+
+@router.get("/imports/{import_id}")
+def bulk_import_status(import_id: str, db: Session = Depends(get_db)):
+    """Progress of a bulk import: row counts, first validation errors, throughput."""
+    job = get_import(db, import_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return _import_response(job)
+
+
+def _create_import(api_key: str, source: str, fmt: str) -> BulkImportDB:
+    db = SessionLocal()
+    try:
+        return create_import(db, api_key, source, fmt)
+    finally:
+        db.close()
+
+
+def _resolve_import_path(path: str) -> str:
+    if not BULK_IMPORT_DIR:
+        raise HTTPException(status_code=400, detail="Path imports are disabled (BULK_IMPORT_DIR is not set)")
+    root = os.path.realpath(BULK_IMPORT_DIR)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise HTTPException(status_code=400, detail="path must be inside BULK_IMPORT_DIR")
+    if not os.path.isfile(resolved):
+        raise HTTPException(status_code=404, detail="File not found")
+    return resolved
+
+
+async def _spool_upload(request: Request) -> str:
+    """Stream the request body to a temporary file (removed after the import)."""
+    handle = tempfile.NamedTemporaryFile(prefix="bulk-import-", suffix=".upload", dir=BULK_IMPORT_DIR, delete=False)
+    size = 0
+    with handle:
+        async for chunk in request.stream():
+            handle.write(chunk)
+            size += len(chunk)
+    if size == 0:
+        os.remove(handle.name)
+        raise HTTPException(status_code=400, detail="Empty upload")
+    return handle.name
+
+
+def _import_response(job: BulkImportDB) -> dict:
+    elapsed = None
+    if job.started_at is not None:
+        elapsed = ((job.finished_at or job.updated_at) - job.started_at).total_seconds()
+    return {
+        "id": job.id,
+        "api_key": job.api_key,
+        "source": job.source,
+        "format": job.format,
+        "status": job.status,
+        "rows_read": job.rows_read,
+        "rows_inserted": job.rows_inserted,
+        "rows_duplicate": job.rows_duplicate,
+        "rows_invalid": job.rows_invalid,
+        "rows_per_second": round(job.rows_read / elapsed) if elapsed else None,
+        "errors": job.errors or [],
+        "error": job.error,
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
@@ -2,28 +2,52 @@
 Analytics API Endpoints
 
 This module provides REST endpoints for:
-- Event analytics (counts, funnels)
-- LLM-powered insights generation
+- Event analytics (counts, funnels, paths, anomalies), segmentable by platform
+  and event properties
+- The property-key catalog (segment filters the dashboard can offer)
+- Raw event export (NDJSON, CSV, Arrow)
+- LLM-powered insights generation (queued as background jobs)
 - Insight history and trend analysis
-- Insight comparison between time periods
+- Insight comparison between time periods (latest pair, or a whole timeline)
 """
 
 from datetime import datetime, timezone, timedelta
-from typing import Dict, Optional
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Dict, List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 
+from app.core.deadline import Deadline, request_deadline
+from app.core.ratelimit import COST_EXPENSIVE, analytics_rate_limit
 from app.models.pydantic_models import FunnelRequest
+from app.analytics import export
 from app.analytics.funnel import run_funnel_for_steps
-from app.db.deps import get_db
-from app.db.models import EventDB
+from app.analytics.path_analysis import analyze_paths
+from app.analytics.segments import Segment
+from app.analytics.sessions import calculate_session_stats
+from app.db.database import AnalyticsSessionLocal
+from app.db.deps import get_analytics_db, get_db
+from app.db.models import EventDB, InsightDB, InsightJobDB
 from app.analytics.insight_diff import compare_snapshots
+from app.analytics.insight_timeline import build_timeline
 from app.insights.models import InsightRequest
 from app.insights.snapshot import build_analytics_snapshot, build_insight_history_snapshot
-from app.insights.prompts import build_insight_prompt, build_trend_prompt
-from app.insights.generator import generate_insights, generate_trend_insights, explain_diff
-from app.storage.insights import save_insight, list_insights
+from app.insights.prompts import build_trend_prompt
+from app.insights.generator import generate_trend_insights, explain_diff
+from app.storage.insights import get_insight_metrics, insight_cursor, list_insights
+from app.storage.anomalies import list_anomalies
+from app.storage.insight_jobs import enqueue_insight_job, get_insight_job
+from app.storage.snapshots import get_precomputed_snapshot
+from app.workers.insight_jobs import notify_job_queued
+from app.storage import cold
+from app.core.config import HOT_PROPERTY_KEYS
+from app.storage.dictionary import (
+    get_app_key_id,
+    get_event_name_ids,
+    get_event_name_map,
+    list_property_keys,
+)
 
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
@@ -33,34 +57,53 @@ router = APIRouter(prefix="/analytics", tags=["analytics"])
 # Event Analytics Endpoints
 # =============================================================================
 
-@router.get("/event-counts")
-def event_counts(api_key: str = None, db: Session = Depends(get_db)):
+@router.get("/event-counts", dependencies=[Depends(analytics_rate_limit())])
+def event_counts(api_key: str = None, db: Session = Depends(get_analytics_db)):
     """Get count of each event type, optionally filtered by api_key."""
-    query = db.query(EventDB.event_name, func.count(EventDB.id)).group_by(EventDB.event_name)
+    query = db.query(EventDB.event_name_id, func.count(EventDB.id)).group_by(EventDB.event_name_id)
     # IMPORTANT: treat empty string as a real api_key (filter), not "no filter".
     # Only None means "no filter".
+    app_key_id = None
     if api_key is not None:
-        query = query.filter(EventDB.api_key == api_key)
-
-    rows = query.all()
-    return {name: int(count) for (name, count) in rows}
-
-
-@router.get("/event-volume")
+        app_key_id = get_app_key_id(db, api_key)
+        if app_key_id is None:
+            return {}
+        query = query.filter(EventDB.app_key_id == app_key_id)
+
+    code_counts: Dict[int, int] = {code: int(count) for (code, count) in query.all()}
+    if cold.cold_enabled():
+        for code, count in cold.event_name_counts(app_key_id).items():
+            code_counts[code] = code_counts.get(code, 0) + count
+
+    # Group on the integer code, decode names afterwards (names repeat across apps).
+    names = get_event_name_map(db, app_key_id)
+    counts: Dict[str, int] = {}
+    for event_name_id, count in code_counts.items():
+        name = names.get(event_name_id)
+        if name is not None:
+            counts[name] = counts.get(name, 0) + count
+    return counts
+
+
+@router.get("/event-volume", dependencies=[Depends(analytics_rate_limit())])
 def event_volume(
     api_key: str,
     days: int = 7,
     event_name: Optional[str] = None,
-    db: Session = Depends(get_db),
+    platform: Optional[str] = None,
+    properties: Optional[List[str]] = Query(None, alias="property"),
+    db: Session = Depends(get_analytics_db),
 ):
     """
     Daily total event volume for the last N days (UTC).
 
     - Returns zero-count days so charts are continuous.
     - If `event_name` is provided, filters to that single event.
+    - `platform` and `property=key:value` (repeatable) count only matching events.
     """
     if days < 1 or days > 90:
         raise HTTPException(status_code=400, detail="days must be between 1 and 90")
+    segment = _segment_from_query(platform, properties)
 
     now = datetime.now(timezone.utc)
     start_date = (now - timedelta(days=days - 1)).date()
@@ -77,16 +120,7 @@ def event_volume(
         d = (start_date + timedelta(days=i)).isoformat()
         counts_by_day[d] = 0
 
-    query = (
-        db.query(EventDB.timestamp_ms)
-        .filter(EventDB.api_key == api_key)
-        .filter(EventDB.timestamp_ms >= start_ms)
-        .filter(EventDB.timestamp_ms < end_ms)
-    )
-    if event_name:
-        query = query.filter(EventDB.event_name == event_name)
-
-    for (ts_ms,) in query.all():
+    for ts_ms in _event_timestamps(db, api_key, start_ms, end_ms, event_name, segment):
         day = datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc).date().isoformat()
         if day in counts_by_day:
             counts_by_day[day] += 1
@@ -94,69 +128,318 @@ def event_volume(
     return [{"date": d, "count": counts_by_day[d]} for d in sorted(counts_by_day.keys())]
 
 
-@router.post("/funnel")
-def funnel_analysis(request: FunnelRequest, db: Session = Depends(get_db)):
-    """Run funnel analysis for specified steps."""
+def _event_timestamps(
+    db: Session,
+    api_key: str,
+    start_ms: int,
+    end_ms: int,
+    event_name: Optional[str],
+    segment: Optional[Segment] = None,
+) -> List[int]:
+    """Timestamps of an api_key's events in [start_ms, end_ms), optionally for one event name / a segment."""
+    app_key_id = get_app_key_id(db, api_key)
+    if app_key_id is None:
+        return []
+
+    query = (
+        db.query(EventDB.timestamp_ms)
+        .filter(EventDB.app_key_id == app_key_id)
+        .filter(EventDB.timestamp_ms >= start_ms)
+        .filter(EventDB.timestamp_ms < end_ms)
+    )
+    codes = None
+    if event_name:
+        event_name_id = get_event_name_ids(db, app_key_id, [event_name]).get(event_name)
+        if event_name_id is None:
+            return []
+        query = query.filter(EventDB.event_name_id == event_name_id)
+        codes = [event_name_id]
+    if segment is not None:
+        query = query.filter(*segment.conditions(EventDB, db.get_bind().dialect.name))
+
+    result = [ts_ms for (ts_ms,) in query.all()]
+    if cold.cold_enabled() and start_ms < cold.cold_cutoff_ms():
+        row_mask = segment.arrow_mask if segment is not None else None
+        result.extend(cold.timestamps(app_key_id, start_ms, end_ms, codes, row_mask))
+    return result
+
+
+def _segment_from_query(platform: Optional[str], properties: Optional[List[str]]) -> Optional[Segment]:
+    try:
+        return Segment.from_query(platform, properties)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@router.post("/funnel", dependencies=[Depends(analytics_rate_limit(COST_EXPENSIVE))])
+def funnel_analysis(
+    request: FunnelRequest,
+    db: Session = Depends(get_analytics_db),
+    deadline: Deadline = Depends(request_deadline),
+):
+    """
+    Run funnel analysis for specified steps.
+
+    The scan is bounded by the request deadline (503 when it runs out, or a
+    result marked "partial" with `allow_partial`).
+    """
     # Funnel analysis can be very expensive if we scan *all* events.
     # Reject missing/blank api_key so we never accidentally do that in production.
     if request.api_key is None or not request.api_key.strip():
         raise HTTPException(status_code=400, detail="api_key is required for funnel analysis")
     if not request.steps:
         raise HTTPException(status_code=400, detail="steps must contain at least 1 event")
-    return run_funnel_for_steps(request.steps, db, api_key=request.api_key)
+    try:
+        segment = Segment(request.platform, request.properties)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    deadline.allow_partial = request.allow_partial
+    return run_funnel_for_steps(
+        request.steps, db, api_key=request.api_key, sample=request.sample, deadline=deadline, segment=segment or None
+    )
+
+
+@router.get("/paths", dependencies=[Depends(analytics_rate_limit(COST_EXPENSIVE))])
+def path_analysis(
+    api_key: str,
+    max_depth: int = Query(5, ge=2, le=20),
+    limit: int = Query(20, ge=1, le=500),
+    sample: Optional[float] = Query(None, gt=0, le=1),
+    allow_partial: bool = False,
+    platform: Optional[str] = None,
+    properties: Optional[List[str]] = Query(None, alias="property"),
+    db: Session = Depends(get_analytics_db),
+    deadline: Deadline = Depends(request_deadline),
+):
+    """
+    Most common event paths (a session's first `max_depth` events), most frequent first.
+
+    `platform` and `property=key:value` (repeatable) restrict it to sessions
+    with a matching event. Bounded by the request deadline like funnels.
+    """
+    segment = _segment_from_query(platform, properties)
+    deadline.allow_partial = allow_partial
+    paths = analyze_paths(db, max_depth=max_depth, api_key=api_key, sample=sample, deadline=deadline, segment=segment)
+    result = {"paths": [{"path": path, "count": count} for path, count in list(paths.items())[:limit]]}
+    if segment is not None:
+        result["segment"] = segment.describe()
+    if deadline.cut_short:
+        result["partial"] = {"reason": "deadline"}
+    return result
+
+
+@router.get("/session-stats", dependencies=[Depends(analytics_rate_limit())])
+def session_stats(api_key: str, db: Session = Depends(get_analytics_db)):
+    """
+    Session counts and duration stats from the pre-aggregated sessions table.
+
+    Reflects events up to the sessionizer's high-water mark (a few seconds behind ingestion).
+    """
+    return calculate_session_stats(db, api_key=api_key)
+
+
+@router.get("/anomalies", dependencies=[Depends(analytics_rate_limit())])
+def list_anomalies_endpoint(
+    api_key: str,
+    since: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_analytics_db),
+):
+    """
+    Event-count anomalies detected for an api_key, most recently updated first.
+
+    Poll with `since` set to the latest `updated_at` seen to get only new or
+    still-growing anomalies.
+    """
+    if since is not None and since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return [
+        {
+            "id": a.id,
+            "event_name": a.event_name,
+            "is_error": a.is_error,
+            "severity": a.severity,
+            "start_ms": a.start_ms,
+            "end_ms": a.end_ms,
+            "observed": a.observed,
+            "expected": a.expected,
+            "score": a.score,
+            "created_at": a.created_at.isoformat(),
+            "updated_at": a.updated_at.isoformat(),
+        }
+        for a in list_anomalies(db, api_key, since=since, limit=limit)
+    ]
+
+
+# =============================================================================
+# Property Catalog
+# =============================================================================
+
+@router.get("/properties", dependencies=[Depends(analytics_rate_limit())])
+def property_catalog(api_key: str, db: Session = Depends(get_analytics_db)):
+    """
+    Property keys seen in an api_key's events, for the dashboard's segment filters.
+
+    `indexed` keys (HOT_PROPERTY_KEYS) have their own index and are the
+    cheapest to filter on. The catalog is written by ingestion (and, for
+    events stored before it existed, app/workers/property_catalog.py).
+    """
+    app_key_id = get_app_key_id(db, api_key)
+    if app_key_id is None:
+        return {"properties": []}
+    keys = list_property_keys(db, app_key_id)
+    return {
+        "properties": [
+            {"key": k.key, "type": k.value_type, "indexed": k.key in HOT_PROPERTY_KEYS}
+            for k in keys
+        ]
+    }
+
+
+# =============================================================================
+# Export
+# =============================================================================
+
+@router.get("/export", dependencies=[Depends(analytics_rate_limit(COST_EXPENSIVE))])
+def export_events(
+    api_key: str,
+    fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv|arrow)$"),
+    start_ms: Optional[int] = None,
+    end_ms: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    accept_encoding: Optional[str] = Header(None),
+):
+    """
+    Stream an api_key's raw events in [start_ms, end_ms), oldest first.
+
+    Resume an interrupted export (or page with `limit`) by passing
+    `cursor=<timestamp_ms>_<id>` of the last row received. Compressed with
+    gzip when the client accepts it.
+    """
+    try:
+        after = export.parse_cursor(cursor) if cursor else None
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if start_ms is not None and end_ms is not None and end_ms <= start_ms:
+        raise HTTPException(status_code=400, detail="end_ms must be greater than start_ms")
+    if fmt == "arrow" and not export.arrow_available():
+        raise HTTPException(status_code=501, detail="Arrow export requires pyarrow on the server")
+
+    compress = "gzip" in (accept_encoding or "").lower()
+    media_type, extension = export.FORMATS[fmt]
+    headers = {"Content-Disposition": f'attachment; filename="events.{extension}"', "Vary": "Accept-Encoding"}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        _stream_export(api_key, fmt, start_ms, end_ms, after, limit, compress),
+        media_type=media_type,
+        headers=headers,
+    )
+
+
+def _stream_export(api_key, fmt, start_ms, end_ms, after, limit, compress):
+    # The stream outlives the endpoint (and its dependencies), so it owns its session.
+    db = AnalyticsSessionLocal()
+    try:
+        app_key_id = get_app_key_id(db, api_key)
+        rows = iter(()) if app_key_id is None else export.iter_export_rows(
+            db, app_key_id, start_ms, end_ms, after, limit
+        )
+        chunks = export.encode(rows, fmt)
+        yield from (export.gzip_chunks(chunks) if compress else chunks)
+    finally:
+        db.close()
 
 
 # =============================================================================
 # Insight Endpoints
 # =============================================================================
 
-@router.post("/insights")
+@router.post("/insights", status_code=202, dependencies=[Depends(analytics_rate_limit(COST_EXPENSIVE))])
 def generate_insights_endpoint(
     request: InsightRequest,
     db: Session = Depends(get_db)
 ):
     """
-    Generate LLM-powered insights from current analytics.
+    Queue LLM-powered insight generation from current analytics.
     
-    This endpoint:
-    1. Builds a snapshot of current analytics
+    Returns immediately with a job; a background worker then:
+    1. Builds a full snapshot of current analytics
     2. Sends the snapshot to the LLM for analysis
     3. Saves the insight WITH the snapshot for future comparison
-    4. Returns the generated insight
-    """
-    # Keep insight generation fast enough for typical cloud timeouts:
-    # we only need a small representative set of funnels for the LLM.
-    snapshot = build_analytics_snapshot(
-        db,
-        request.api_key,
-        max_funnels=1,
-        include_paths=False,      # can be expensive; not required for LLM summary
-        include_dropoffs=False,   # can be expensive; not required for LLM summary
-        include_time=False,       # can be expensive; not required for LLM summary
-        include_error_count=True,
-    )
     
-    # Generate prompt and get LLM insight
-    prompt = build_insight_prompt(snapshot)
-    insight = generate_insights(prompt)
-
-    # Save insight WITH snapshot for historical comparison
-    save_insight(db, request.api_key, insight, snapshot=snapshot)
-
-    return insight
+    Poll `GET /analytics/insights/jobs/{job_id}` for progress and the result.
+    A request for an api_key that already has a queued/running job returns that job.
+    """
+    job = enqueue_insight_job(db, request.api_key, sample=request.sample)
+    notify_job_queued()
+    return _job_response(db, job)
 
 
-@router.get("/insights/history")
+@router.get("/insights/jobs/{job_id}")
+def insight_job_status(job_id: str, db: Session = Depends(get_db)):
+    """
+    Status of an insight generation job.
+    
+    `status` is queued, running (with the current `stage`), succeeded (with the
+    generated `insight`) or failed (with an `error`).
+    """
+    job = get_insight_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Insight job not found")
+    return _job_response(db, job)
+
+
+def _job_response(db: Session, job: InsightJobDB) -> dict:
+    response = {
+        "job_id": job.id,
+        "api_key": job.api_key,
+        "status": job.status,
+        "stage": job.stage,
+        "error": job.error,
+        "created_at": job.created_at.isoformat(),
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+        "insight": None,
+    }
+    if job.insight_id is not None:
+        insight = db.get(InsightDB, job.insight_id)
+        if insight is not None:
+            response["insight"] = {
+                "id": insight.id,
+                "summary": insight.summary,
+                "insights": insight.insights,
+                "recommendations": insight.recommendations,
+                "has_snapshot": insight.snapshot_hash is not None or insight.analytics_snapshot is not None,
+                "created_at": insight.created_at.isoformat()
+            }
+    return response
+
+
+@router.get("/insights/history", dependencies=[Depends(analytics_rate_limit())])
 def insight_history(
     api_key: str,
-    db: Session = Depends(get_db)
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_analytics_db)
 ):
     """
     Get history of generated insights for an api_key.
     
-    Returns insights ordered by created_at descending (newest first).
+    Returns insights ordered by created_at descending (newest first), one page
+    at a time. When more rows exist, the `X-Next-Cursor` response header holds
+    the cursor for the next page.
     """
-    insights = list_insights(db, api_key)
+    try:
+        insights = list_insights(db, api_key, limit=limit + 1, offset=offset, cursor=cursor)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    if len(insights) > limit:
+        insights = insights[:limit]
+        response.headers["X-Next-Cursor"] = insight_cursor(insights[-1])
 
     return [
         {
@@ -164,17 +447,17 @@ def insight_history(
             "summary": i.summary,
             "insights": i.insights,
             "recommendations": i.recommendations,
-            "has_snapshot": i.analytics_snapshot is not None,
+            "has_snapshot": bool(i.has_snapshot),
             "created_at": i.created_at.isoformat()
         }
         for i in insights
     ]
 
 
-@router.get("/insights/trends")
+@router.get("/insights/trends", dependencies=[Depends(analytics_rate_limit(COST_EXPENSIVE))])
 def insight_trends(
     api_key: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_analytics_db)
 ):
     """
     Analyze trends across historical insights using LLM.
@@ -193,17 +476,18 @@ def insight_trends(
     return generate_trend_insights(prompt)
 
 
-@router.get("/insights/compare")
+@router.get("/insights/compare", dependencies=[Depends(analytics_rate_limit(COST_EXPENSIVE))])
 def compare_insights_endpoint(
     api_key: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_analytics_db),
+    deadline: Deadline = Depends(request_deadline),
 ):
     """
     Compare the two most recent insights using rule-based diff + LLM explanation.
     
     This endpoint:
     1. Gets the two most recent insights
-    2. Extracts their stored snapshots
+    2. Reads the metrics of their stored snapshots (no full snapshot is decoded)
     3. Runs deterministic comparison (insight_diff.py)
     4. Gets LLM explanation of the changes
     5. Returns structured comparison result
@@ -212,8 +496,8 @@ def compare_insights_endpoint(
     - FACTS (rule-based): What changed, by how much
     - INTERPRETATION (LLM): Why it matters, what to do
     """
-    # Get insights for this api_key
-    insights = list_insights(db, api_key)
+    # Get the latest insights for this api_key
+    insights = list_insights(db, api_key, limit=2)
     
     if len(insights) < 2:
         raise HTTPException(
@@ -225,14 +509,13 @@ def compare_insights_endpoint(
     latest = insights[0]
     previous = insights[1]
     
-    # Extract snapshots
-    curr_snapshot = latest.analytics_snapshot
-    prev_snapshot = previous.analytics_snapshot
+    # Extract snapshots (only the fields compare_snapshots reads)
+    curr_snapshot, prev_snapshot = get_insight_metrics(db, [latest, previous])
     
     # Handle missing snapshots
     if curr_snapshot is None:
-        # Build current snapshot as fallback
-        curr_snapshot = build_analytics_snapshot(db, api_key)
+        # Use the precomputed current snapshot, or build one as fallback
+        curr_snapshot = get_precomputed_snapshot(db, api_key) or build_analytics_snapshot(db, api_key, deadline=deadline)
     
     if prev_snapshot is None:
         # Use a baseline for comparison if previous snapshot wasn't stored
@@ -258,3 +541,27 @@ def compare_insights_endpoint(
         "explanation": explanation,
         "compared_at": datetime.now(timezone.utc).isoformat()
     }
+
+
+@router.get("/insights/timeline", dependencies=[Depends(analytics_rate_limit())])
+def insight_timeline(
+    api_key: str,
+    limit: int = Query(50, ge=2, le=500),
+    window: int = Query(3, ge=1, le=50),
+    db: Session = Depends(get_analytics_db)
+):
+    """
+    Rule-based comparison across the latest `limit` insights (no LLM call).
+
+    Returns per-metric series (values, consecutive deltas, a rolling baseline
+    over `window` previous points) and every threshold crossing, oldest first.
+    Insights without a stored snapshot are skipped.
+    """
+    insights = list_insights(db, api_key, limit=limit)
+    metrics = get_insight_metrics(db, insights)
+    points = [
+        {"insight_id": i.id, "created_at": i.created_at.isoformat(), "metrics": m}
+        for i, m in zip(reversed(insights), reversed(metrics))
+        if m is not None
+    ]
+    return build_timeline(points, window=window)
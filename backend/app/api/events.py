@@ -8,6 +8,7 @@ event batches and persists them via the storage layer.
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
 
+from app.core.ratelimit import INGEST, INGEST_QUOTA, check_rate_limit
 from app.models.pydantic_models import EventBatch
 from app.storage.events import save_events
 from app.db.deps import get_db
@@ -20,11 +21,22 @@ def ingest_events(
     batch: EventBatch,
     db: Session = Depends(get_db)
 ):
-    """Ingest a batch of events for a single `api_key`."""
+    """
+    Ingest a batch of events for a single `api_key`.
+
+    Each event counts against the key's ingest rate limit and daily quota
+    (429 + Retry-After when exceeded).
+    """
     if not batch.events:
         raise HTTPException(status_code=400, detail="No events provided")
-
-    save_events(db, batch.api_key, batch.events)
+    check_rate_limit(INGEST, batch.api_key, cost=len(batch.events))
+    # After the short-window check, so a burst rejected there doesn't eat into the day's quota
+    check_rate_limit(INGEST_QUOTA, batch.api_key, cost=len(batch.events))
+
+    try:
+        save_events(db, batch.api_key, batch.events)
+    except LookupError:
+        raise HTTPException(status_code=410, detail="The app for this api_key has been deleted")
 
     return {
         "status": "ok",
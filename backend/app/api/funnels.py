@@ -8,6 +8,7 @@ These endpoints sit on top of the storage layer and reuse the core funnel analys
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
 
+from app.core.ratelimit import analytics_rate_limit
 from app.models.pydantic_models import CreateFunnelDefinitionRequest
 from app.db.models import FunnelDefinitionDB
 from app.storage.funnel_definitions import (
@@ -17,7 +18,11 @@ from app.storage.funnel_definitions import (
 from app.analytics.funnel import run_funnel_for_steps
 from app.db.deps import get_db
 
-router = APIRouter(prefix="/analytics/definitions/funnel", tags=["funnels"])
+router = APIRouter(
+    prefix="/analytics/definitions/funnel",
+    tags=["funnels"],
+    dependencies=[Depends(analytics_rate_limit())],
+)
 
 
 @router.post("")
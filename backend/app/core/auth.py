@@ -2,24 +2,51 @@
 Authentication utilities for Supabase JWT validation.
 
 Validates JWT tokens from Supabase Auth and extracts user information.
+
+Per-request cost is kept off the network and mostly off the crypto:
+- JWKS signing keys are cached by `kid`. Past JWKS_CACHE_TTL_SECONDS a key is
+  still used while a background thread refreshes the set (stale-while-
+  revalidate); only an unknown `kid` (key rotation) or an empty cache waits
+  for a fetch, and such fetches are rate-limited.
+- Verified token payloads are kept in an LRU keyed by the token's sha256 for
+  AUTH_TOKEN_CACHE_TTL_SECONDS, never past the token's `exp`.
+
+PyJWT (and the crypto it loads) is imported on first use rather than at
+startup; `warm_up` does that, and fetches the JWKS, off the request path.
+
+See benchmarks/auth_overhead.py for the per-request overhead.
 """
 
+import hashlib
+import hmac
+import importlib
 import inspect
 import os
 import ssl
 import logging
-import jwt
-from jwt import PyJWKClient
-from typing import Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
 from fastapi import HTTPException, Depends, Header
 from functools import lru_cache
-from app.core.config import SUPABASE_URL, SUPABASE_JWT_SECRET, SUPABASE_ANON_KEY
+from app.core.config import (
+    ADMIN_TOKEN,
+    AUTH_TOKEN_CACHE_MAX_ENTRIES,
+    AUTH_TOKEN_CACHE_TTL_SECONDS,
+    JWKS_CACHE_TTL_SECONDS,
+    JWKS_MAX_STALE_SECONDS,
+    JWKS_MIN_REFRESH_INTERVAL_SECONDS,
+    SUPABASE_URL,
+    SUPABASE_JWT_SECRET,
+    SUPABASE_ANON_KEY,
+)
 
 logger = logging.getLogger(__name__)
 
 
 @lru_cache(maxsize=1)
-def get_jwks_client() -> PyJWKClient:
+def get_jwks_client():
     """
     Create a JWKS client for Supabase public keys.
 
@@ -27,6 +54,8 @@ def get_jwks_client() -> PyJWKClient:
     We validate them against the JWKS endpoint. Some Supabase projects
     require the anon key to be passed; we include it as a query param/header.
     """
+    from jwt import PyJWKClient
+
     if not SUPABASE_URL:
         raise ValueError("SUPABASE_URL is required")
 
@@ -62,9 +91,128 @@ def get_jwks_client() -> PyJWKClient:
     return PyJWKClient(jwks_url, headers=headers)
 
 
+def _fetch_jwks() -> Dict[Optional[str], object]:
+    """Download the JWKS and return {kid: signing key}."""
+    return {key.key_id: key.key for key in get_jwks_client().get_signing_keys(refresh=True)}
+
+
+class _JWKSCache:
+    """Signing keys by `kid`, refreshed in the background once stale."""
+
+    def __init__(self, fetch: Callable[[], Dict[Optional[str], object]]):
+        self._fetch = fetch
+        self._keys: Dict[Optional[str], object] = {}
+        self._fetched_at = 0.0
+        self._last_attempt = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def get_key(self, kid: Optional[str]):
+        key = self._usable_key(kid)
+        if key is not None:
+            if time.monotonic() - self._fetched_at >= JWKS_CACHE_TTL_SECONDS:
+                self._refresh_in_background()
+            return key
+
+        # Unknown kid (rotation) or nothing usable cached: fetch now, but not
+        # more often than JWKS_MIN_REFRESH_INTERVAL_SECONDS (random kids must
+        # not turn into a request flood against the JWKS endpoint).
+        with self._lock:
+            if self._usable_key(kid) is None and time.monotonic() - self._last_attempt >= JWKS_MIN_REFRESH_INTERVAL_SECONDS:
+                self._refresh()
+            key = self._usable_key(kid)
+        if key is None:
+            import jwt
+
+            raise jwt.InvalidTokenError(f"No JWKS signing key for kid {kid!r}")
+        return key
+
+    def prefetch(self) -> None:
+        """Load the key set if nothing is cached yet (startup warm-up)."""
+        with self._lock:
+            if not self._keys:
+                self._refresh()
+
+    def _usable_key(self, kid: Optional[str]):
+        if time.monotonic() - self._fetched_at >= JWKS_MAX_STALE_SECONDS:
+            return None
+        return self._keys.get(kid)
+
+    def _refresh(self) -> None:
+        self._last_attempt = time.monotonic()
+        keys = self._fetch()
+        self._keys, self._fetched_at = keys, time.monotonic()
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                with self._lock:
+                    self._refresh()
+            except Exception:
+                # Keep serving the stale keys; the next request retries.
+                logger.warning("Background JWKS refresh failed", exc_info=True)
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="jwks-refresh", daemon=True).start()
+
+
+class _VerifiedTokenCache:
+    """LRU of verified payloads by token hash; entries expire with the token."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token_hash: bytes) -> Optional[dict]:
+        with self._lock:
+            entry = self._data.get(token_hash)
+            if entry is None:
+                return None
+            payload, expires_at = entry
+            if expires_at <= time.time():
+                del self._data[token_hash]
+                return None
+            self._data.move_to_end(token_hash)
+            return dict(payload)
+
+    def put(self, token_hash: bytes, payload: dict) -> None:
+        if self.ttl_seconds <= 0 or self.max_entries <= 0:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        if isinstance(payload.get("exp"), (int, float)):
+            expires_at = min(expires_at, payload["exp"])
+        with self._lock:
+            self._data[token_hash] = (dict(payload), expires_at)
+            self._data.move_to_end(token_hash)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+_jwks_cache = _JWKSCache(_fetch_jwks)
+_verified_tokens = _VerifiedTokenCache(AUTH_TOKEN_CACHE_MAX_ENTRIES, AUTH_TOKEN_CACHE_TTL_SECONDS)
+
+
 def verify_supabase_token(token: str) -> dict:
     """
     Verify a Supabase JWT token and return the payload.
+
+    Tokens verified recently are served from a small cache (keyed by the
+    token's hash, never past its `exp`), so repeated dashboard calls skip
+    signature verification. Asymmetric tokens (ES256/RS256) are checked
+    against the cached JWKS key for their `kid`; HS256 tokens against
+    SUPABASE_JWT_SECRET.
     
     Args:
         token: JWT token string
@@ -86,38 +234,55 @@ def verify_supabase_token(token: str) -> dict:
             ),
         )
 
-    try:
-        # Prefer JWKS validation (ES256/RS256)
-        jwks_client = get_jwks_client()
-        signing_key = jwks_client.get_signing_key_from_jwt(token).key
-
-        payload = jwt.decode(
-            token,
-            signing_key,
-            algorithms=["RS256", "ES256"],
-            audience="authenticated",  # Supabase uses this audience
-        )
-        return payload
+    token_hash = hashlib.sha256(token.encode()).digest()
+    cached = _verified_tokens.get(token_hash)
+    if cached is not None:
+        return cached
+
+    import jwt
 
+    try:
+        header = jwt.get_unverified_header(token)
+        if header.get("alg") == "HS256" and SUPABASE_JWT_SECRET:
+            payload = jwt.decode(
+                token,
+                SUPABASE_JWT_SECRET,
+                algorithms=["HS256"],
+                audience="authenticated",
+            )
+        else:
+            # Prefer JWKS validation (ES256/RS256)
+            signing_key = _jwks_cache.get_key(header.get("kid"))
+            payload = jwt.decode(
+                token,
+                signing_key,
+                algorithms=["RS256", "ES256"],
+                audience="authenticated",  # Supabase uses this audience
+            )
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token has expired")
-    except Exception as jwks_error:
-        # Fallback: if JWKS is unavailable but an HMAC secret is provided, try HS256
-        if SUPABASE_JWT_SECRET:
-            try:
-                payload = jwt.decode(
-                    token,
-                    SUPABASE_JWT_SECRET,
-                    algorithms=["HS256"],
-                    audience="authenticated",
-                )
-                return payload
-            except Exception:
-                pass
+    except Exception as exc:
         # If JWKS fetch/validation fails, don't leak internal SSL/network details to clients.
-        logger.warning("Supabase token validation failed via JWKS/HS256 fallback: %s", jwks_error)
+        logger.warning("Supabase token validation failed: %s", exc)
         raise HTTPException(status_code=401, detail="Invalid token")
 
+    _verified_tokens.put(token_hash, payload)
+    return payload
+
+
+def warm_up() -> None:
+    """Import PyJWT and, with SUPABASE_URL set, fetch the JWKS ahead of the first request."""
+    # Preload only: the verification paths import jwt lazily, and after this
+    # the import is a sys.modules lookup instead of loading PyJWT and its crypto.
+    importlib.import_module("jwt")
+
+    if SUPABASE_URL:
+        try:
+            _jwks_cache.prefetch()
+        except Exception:
+            # The first request retries the fetch.
+            logger.warning("JWKS prefetch failed", exc_info=True)
+
 
 def get_current_user(
     authorization: Optional[str] = Header(None)
@@ -177,3 +342,17 @@ def get_user_id(user: dict = Depends(get_current_user)) -> str:
         User ID (UUID string from Supabase Auth)
     """
     return user["sub"]
+
+
+def require_admin(authorization: Optional[str] = Header(None)) -> None:
+    """
+    FastAPI dependency for operator-only endpoints (/admin/*).
+
+    Expects `Authorization: Bearer <ADMIN_TOKEN>`. When ADMIN_TOKEN is not
+    configured the endpoints don't exist (404).
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip().encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
@@ -13,7 +13,160 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 LLM_PROVIDER = os.getenv("LLM_PROVIDER", "mock")
 
+# LLM client (see app/insights/llm.py)
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "10"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "0"))
+# Max LLM requests in flight per process (extra callers wait their turn).
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+# Cached responses are reused for this long; 0 disables the cache.
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512"))
+# Simulated latency of the mock provider (offline benchmarks).
+LLM_MOCK_LATENCY_MS = float(os.getenv("LLM_MOCK_LATENCY_MS", "0"))
+
+# Prompt serialization (see app/insights/serialization.py): data sent to the LLM
+# is cut to the top-K paths/funnels and shrunk further to fit the token budget.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "2000"))
+PROMPT_TOP_PATHS = int(os.getenv("PROMPT_TOP_PATHS", "10"))
+PROMPT_TOP_FUNNELS = int(os.getenv("PROMPT_TOP_FUNNELS", "5"))
+
 # Supabase Auth Configuration
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
-SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
\ No newline at end of file
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+# Auth caches (see app/core/auth.py). JWKS keys are refreshed in the background
+# after the TTL and used for at most MAX_STALE without a successful refresh.
+JWKS_CACHE_TTL_SECONDS = float(os.getenv("JWKS_CACHE_TTL_SECONDS", "600"))
+JWKS_MAX_STALE_SECONDS = float(os.getenv("JWKS_MAX_STALE_SECONDS", "86400"))
+JWKS_MIN_REFRESH_INTERVAL_SECONDS = float(os.getenv("JWKS_MIN_REFRESH_INTERVAL_SECONDS", "30"))
+# Verified tokens are trusted for this long (capped by their exp); 0 disables.
+AUTH_TOKEN_CACHE_TTL_SECONDS = float(os.getenv("AUTH_TOKEN_CACHE_TTL_SECONDS", "60"))
+AUTH_TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_TOKEN_CACHE_MAX_ENTRIES", "1024"))
+# Per-api_key rate limits (see app/core/ratelimit.py); a rate of 0 disables.
+RATE_LIMIT_INGEST_EVENTS_PER_SECOND = float(os.getenv("RATE_LIMIT_INGEST_EVENTS_PER_SECOND", "1000"))
+RATE_LIMIT_INGEST_BURST_EVENTS = float(os.getenv("RATE_LIMIT_INGEST_BURST_EVENTS", "20000"))
+# Events per api_key per rolling day, on top of the per-second rate (0 disables)
+RATE_LIMIT_INGEST_EVENTS_PER_DAY = float(os.getenv("RATE_LIMIT_INGEST_EVENTS_PER_DAY", "0"))
+RATE_LIMIT_ANALYTICS_PER_SECOND = float(os.getenv("RATE_LIMIT_ANALYTICS_PER_SECOND", "2"))
+RATE_LIMIT_ANALYTICS_BURST = float(os.getenv("RATE_LIMIT_ANALYTICS_BURST", "60"))
+# SQLite file shared by the API workers of one host (unset: per-process buckets)
+RATE_LIMIT_STORE_PATH = os.getenv("RATE_LIMIT_STORE_PATH")
+# Largest request body accepted after gzip decompression (see app/core/compression.py)
+REQUEST_MAX_DECOMPRESSED_BYTES = int(os.getenv("REQUEST_MAX_DECOMPRESSED_BYTES", str(20 * 1024 * 1024)))
+# Instrumentation (see app/core/metrics.py): Prometheus metrics at /metrics,
+# and an opt-in Server-Timing response header.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() in ("1", "true", "yes")
+# Slow-query log (see app/core/slow_queries.py); threshold 0 disables.
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "1000"))
+SLOW_QUERY_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_SAMPLE_RATE", "0.2"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "100"))
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS = float(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS", "30000"))
+# Bearer token for the /admin endpoints (unset: they are disabled)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Connection pools (see app/db/database.py). The primary pool serves ingestion
+# and other writes; analytics reads get their own pool (on ANALYTICS_DATABASE_URL
+# when set, e.g. a read replica), so dashboard scans can't starve ingestion.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+ANALYTICS_POOL_SIZE = int(os.getenv("ANALYTICS_POOL_SIZE", "5"))
+ANALYTICS_MAX_OVERFLOW = int(os.getenv("ANALYTICS_MAX_OVERFLOW", "5"))
+# Postgres statement_timeout on analytics connections; 0 disables.
+ANALYTICS_STATEMENT_TIMEOUT_MS = int(os.getenv("ANALYTICS_STATEMENT_TIMEOUT_MS", "30000"))
+# Time budget of one analytics request's scans (see app/core/deadline.py); 0 disables.
+ANALYTICS_REQUEST_TIMEOUT_SECONDS = float(os.getenv("ANALYTICS_REQUEST_TIMEOUT_SECONDS", "25"))
+
+# Bulk imports (see app/workers/bulk_import.py): server directory that
+# `path=` imports may read from (unset: uploads only), and rows per chunk.
+BULK_IMPORT_DIR = os.getenv("BULK_IMPORT_DIR")
+BULK_IMPORT_CHUNK_ROWS = int(os.getenv("BULK_IMPORT_CHUNK_ROWS", "50000"))
+
+# Schema setup at process start (see app/db/schema.py):
+# "startup": check the schema fingerprint and run the setup if it changed
+# "migrate": don't touch the schema; run `python -m app.db.migrate` per deploy
+SCHEMA_SETUP = os.getenv("SCHEMA_SETUP", "startup")
+# Database connections each API process opens in the background at startup
+STARTUP_WARM_CONNECTIONS = int(os.getenv("STARTUP_WARM_CONNECTIONS", "2"))
+
+# Analytics data source: "events" scans raw event rows, "sessions" reads the
+# pre-aggregated sessions table maintained by the background sessionizer.
+ANALYTICS_SOURCE = os.getenv("ANALYTICS_SOURCE", "events")
+
+# Event property keys that segment filters use most (comma-separated, e.g.
+# "plan,country"). Each gets an expression index on events (see
+# app/analytics/segments.py); other keys use the JSONB GIN index on Postgres.
+HOT_PROPERTY_KEYS = [key.strip() for key in os.getenv("HOT_PROPERTY_KEYS", "").split(",") if key.strip()]
+
+# Sessionizer (see app/workers/sessionizer.py)
+SESSIONIZER_INTERVAL_SECONDS = float(os.getenv("SESSIONIZER_INTERVAL_SECONDS", "30"))
+# Only events older than this are sessionized, so in-flight ingest transactions
+# (whose created_at was assigned before commit) are not skipped by the high-water mark.
+SESSIONIZER_LAG_SECONDS = float(os.getenv("SESSIONIZER_LAG_SECONDS", "5"))
+SESSIONIZER_BATCH_SIZE = int(os.getenv("SESSIONIZER_BATCH_SIZE", "5000"))
+
+# Cold storage tier (see app/storage/cold.py). Disabled unless a directory is set.
+# Requires the optional `pyarrow` dependency.
+COLD_STORAGE_DIR = os.getenv("COLD_STORAGE_DIR")
+# Events whose timestamp is older than this many days are compacted to cold files.
+COLD_STORAGE_AFTER_DAYS = int(os.getenv("COLD_STORAGE_AFTER_DAYS", "30"))
+COLD_COMPACTION_INTERVAL_SECONDS = float(os.getenv("COLD_COMPACTION_INTERVAL_SECONDS", "3600"))
+# Max rows moved per compaction tick (one app/day slice is sorted in memory).
+COLD_COMPACTION_BATCH_ROWS = int(os.getenv("COLD_COMPACTION_BATCH_ROWS", "500000"))
+
+# Retention (see app/workers/purger.py). Default days of events to keep for apps
+# without their own `retention_days`; unset = keep forever.
+EVENT_RETENTION_DAYS = int(os.getenv("EVENT_RETENTION_DAYS")) if os.getenv("EVENT_RETENTION_DAYS") else None
+PURGE_INTERVAL_SECONDS = float(os.getenv("PURGE_INTERVAL_SECONDS", "300"))
+# Rows deleted per statement/transaction, pause between chunks, and max chunks
+# per tick: keeps each delete short so ingestion isn't blocked behind it.
+PURGE_CHUNK_SIZE = int(os.getenv("PURGE_CHUNK_SIZE", "5000"))
+PURGE_CHUNK_SLEEP_SECONDS = float(os.getenv("PURGE_CHUNK_SLEEP_SECONDS", "0.2"))
+PURGE_MAX_CHUNKS_PER_TICK = int(os.getenv("PURGE_MAX_CHUNKS_PER_TICK", "200"))
+
+# Snapshot store (see app/storage/snapshots.py): a new snapshot is stored as a
+# delta when the delta is smaller than this fraction of the full snapshot.
+SNAPSHOT_DELTA_MAX_RATIO = float(os.getenv("SNAPSHOT_DELTA_MAX_RATIO", "0.5"))
+SNAPSHOT_COMPRESSION = os.getenv("SNAPSHOT_COMPRESSION", "zlib")  # "zlib" or "none"
+
+# Snapshot scheduler (see app/workers/snapshot_scheduler.py): recompute each
+# active app's snapshot every interval (0 disables) plus up to JITTER seconds,
+# at most CONCURRENCY at a time, and only if it ingested events since.
+SNAPSHOT_SCHEDULE_INTERVAL_SECONDS = float(os.getenv("SNAPSHOT_SCHEDULE_INTERVAL_SECONDS", "900"))
+SNAPSHOT_SCHEDULE_JITTER_SECONDS = float(os.getenv("SNAPSHOT_SCHEDULE_JITTER_SECONDS", "120"))
+SNAPSHOT_SCHEDULE_CONCURRENCY = int(os.getenv("SNAPSHOT_SCHEDULE_CONCURRENCY", "2"))
+SNAPSHOT_SCHEDULE_POLL_SECONDS = float(os.getenv("SNAPSHOT_SCHEDULE_POLL_SECONDS", "30"))
+# Apps that ingested events within this many days are scheduled.
+SNAPSHOT_SCHEDULE_ACTIVE_DAYS = int(os.getenv("SNAPSHOT_SCHEDULE_ACTIVE_DAYS", "7"))
+# Insight generation uses a precomputed snapshot if no events arrived since it
+# was computed, or if it is at most this old (0 = only when up to date).
+SNAPSHOT_MAX_AGE_SECONDS = float(os.getenv("SNAPSHOT_MAX_AGE_SECONDS", "900"))
+# app_keys.last_ingested_at is written at most this often per app.
+INGEST_WATERMARK_RESOLUTION_SECONDS = float(os.getenv("INGEST_WATERMARK_RESOLUTION_SECONDS", "10"))
+
+# Anomaly detection (see app/workers/anomaly_detector.py). Ingestion keeps
+# per-minute counters per event name; the detector scores each closed minute
+# against EWMA and hour-of-day baselines. Interval 0 disables both.
+ANOMALY_INTERVAL_SECONDS = float(os.getenv("ANOMALY_INTERVAL_SECONDS", "60"))
+# A minute is scored once it ended this many seconds ago (late ingest commits).
+ANOMALY_LAG_SECONDS = float(os.getenv("ANOMALY_LAG_SECONDS", "30"))
+ANOMALY_Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", "4"))
+# Minutes with fewer events than this are never anomalous.
+ANOMALY_MIN_COUNT = int(os.getenv("ANOMALY_MIN_COUNT", "5"))
+# Minutes of history a series needs before it is scored (error events excepted).
+ANOMALY_WARMUP_MINUTES = int(os.getenv("ANOMALY_WARMUP_MINUTES", "30"))
+ANOMALY_EWMA_ALPHA = float(os.getenv("ANOMALY_EWMA_ALPHA", "0.05"))
+ANOMALY_SEASONAL_ALPHA = float(os.getenv("ANOMALY_SEASONAL_ALPHA", "0.01"))
+ANOMALY_COUNTER_RETENTION_HOURS = int(os.getenv("ANOMALY_COUNTER_RETENTION_HOURS", "48"))
+ANOMALY_RETENTION_DAYS = int(os.getenv("ANOMALY_RETENTION_DAYS", "30"))
+
+# Insight generation jobs (see app/workers/insight_jobs.py).
+# "inprocess": each API process runs INSIGHT_WORKER_THREADS job threads.
+# "external": only `python -m app.workers` runs jobs (API processes just enqueue).
+INSIGHT_JOB_MODE = os.getenv("INSIGHT_JOB_MODE", "inprocess")
+INSIGHT_WORKER_THREADS = int(os.getenv("INSIGHT_WORKER_THREADS", "2"))
+INSIGHT_JOB_POLL_SECONDS = float(os.getenv("INSIGHT_JOB_POLL_SECONDS", "2"))
+# A running job not updated for this long (its worker died) is re-queued.
+INSIGHT_JOB_STALE_SECONDS = float(os.getenv("INSIGHT_JOB_STALE_SECONDS", "600"))
+INSIGHT_JOB_MAX_ATTEMPTS = int(os.getenv("INSIGHT_JOB_MAX_ATTEMPTS", "3"))
@@ -0,0 +1,109 @@
+"""
+Request Deadlines
+
+Bounds how long one analytics request may scan. A `Deadline` is created per
+request (the `request_deadline` dependency) and passed into the analytics
+engines, which hand it to the session scan (app/analytics/scan.py). Between
+chunks the scan calls `deadline.check()`:
+
+- client disconnected (polled at most every DISCONNECT_POLL_SECONDS): raises
+  `ClientDisconnected`; nobody is waiting for the result
+- past the deadline: raises `DeadlineExceeded`, or, when the caller accepts
+  partial results (`allow_partial`), ends the scan early; the engine then marks
+  its result `"partial"`
+
+At the start of a scan the remaining time is also applied as a Postgres
+`SET LOCAL statement_timeout`, so a single long statement (the sort before the
+first row arrives) is cancelled server-side instead of outliving the request.
+
+`get_analytics_db` (app/db/deps.py) turns both exceptions into `503`; closing
+the request's session then returns the connection to the pool.
+"""
+
+import time
+from typing import Callable, Optional
+
+import anyio
+from fastapi import Request
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import ANALYTICS_REQUEST_TIMEOUT_SECONDS
+
+# Minimum time between two client-disconnect checks
+DISCONNECT_POLL_SECONDS = 0.5
+
+
+class DeadlineExceeded(Exception):
+    """The request's analytics deadline passed before the scan finished."""
+
+
+class ClientDisconnected(Exception):
+    """The client went away while its analytics request was running."""
+
+
+class Deadline:
+    """Time budget (and disconnect probe) for one analytics request."""
+
+    def __init__(
+        self,
+        seconds: Optional[float],
+        *,
+        allow_partial: bool = False,
+        is_disconnected: Optional[Callable[[], bool]] = None,
+    ):
+        self.expires_at = time.monotonic() + seconds if seconds and seconds > 0 else None
+        self.allow_partial = allow_partial
+        # Set once a scan was stopped early with allow_partial
+        self.cut_short = False
+        self._is_disconnected = is_disconnected
+        self._next_poll = 0.0
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left (None when unbounded)."""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def check(self) -> bool:
+        """
+        True to keep scanning; False when the deadline passed and partial
+        results are accepted. Raises ClientDisconnected / DeadlineExceeded.
+        """
+        if self.cut_short:
+            return False
+        now = time.monotonic()
+        if self._is_disconnected is not None and now >= self._next_poll:
+            self._next_poll = now + DISCONNECT_POLL_SECONDS
+            if self._is_disconnected():
+                raise ClientDisconnected()
+        if self.expires_at is not None and now >= self.expires_at:
+            if not self.allow_partial:
+                raise DeadlineExceeded()
+            self.cut_short = True
+            return False
+        return True
+
+    def apply_statement_timeout(self, db: Session) -> None:
+        """Cap the statements of the current transaction at the remaining time (Postgres)."""
+        remaining = self.remaining()
+        if remaining is None or db.get_bind().dialect.name != "postgresql":
+            return
+        db.execute(text(f"SET LOCAL statement_timeout = {max(1, int(remaining * 1000))}"))
+
+
+def request_deadline(request: Request) -> Deadline:
+    """FastAPI dependency: a Deadline of ANALYTICS_REQUEST_TIMEOUT_SECONDS for this request."""
+    return Deadline(ANALYTICS_REQUEST_TIMEOUT_SECONDS, is_disconnected=_disconnect_probe(request))
+
+
+def _disconnect_probe(request: Request) -> Callable[[], bool]:
+    def probe() -> bool:
+        # Sync endpoints run in a worker thread; ask the event loop.
+        try:
+            return anyio.from_thread.run(request.is_disconnected)
+        except RuntimeError:
+            # Not called from a worker thread (e.g. a script or test)
+            return False
+
+    return probe
@@ -0,0 +1,282 @@
+"""
+Request and Query Instrumentation
+
+In-process metrics, exposed in Prometheus text format at `GET /metrics`
+(app/api/metrics.py):
+
+- `http_request_duration_seconds{method, route, status}`: per-route latency
+  histogram (route is the path template, e.g. `/apps/{app_id}`), recorded by
+  `TimingMiddleware`
+- `db_statement_duration_seconds{operation, caller}` and
+  `db_statement_rows_total{operation, caller}`: every SQL statement run on the
+  engine (hooks installed by `instrument_engine`), labelled with the analytics
+  function running it (`caller`, "none" outside one)
+- `analytics_rows_scanned_total{engine}`, `analytics_sessions_seen_total{engine}`,
+  `analytics_loop_seconds{engine}`: what each analytics engine read and how long
+  it spent in Python (its wall time minus the SQL time inside it), recorded
+  with `track_scan`
+- `llm_prompt_data_tokens{kind}`, `llm_prompt_data_shrunk_total{kind}`,
+  `llm_prompt_data_truncated_total{kind}`: estimated size of the data
+  serialized into LLM prompts, and how often it had to be shrunk or trimmed to
+  fit PROMPT_TOKEN_BUDGET, recorded by app/insights/serialization.py
+
+With SERVER_TIMING_ENABLED, responses also carry a `Server-Timing` header
+(total, SQL and per-engine time) for the browser's network panel.
+
+Metrics are kept per process (each gunicorn/uvicorn worker serves its own).
+Prometheus client libraries aren't a dependency; the text format is small.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional, Tuple
+
+from sqlalchemy import event
+
+from app.core.config import METRICS_ENABLED, SERVER_TIMING_ENABLED
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+# Per-request accumulator (a dict, so updates from threadpool endpoints are
+# visible to the middleware; contexts are copied, not the dict)
+_request_timing: ContextVar[Optional[dict]] = ContextVar("request_timing", default=None)
+# Analytics engine currently running (labels SQL statements)
+_current_engine: ContextVar[str] = ContextVar("analytics_engine", default="none")
+# SQL time spent so far in this context (lets track_scan subtract it)
+_sql_seconds: ContextVar[float] = ContextVar("sql_seconds", default=0.0)
+
+
+class _Metric:
+    def __init__(self, name: str, help_text: str, kind: str):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self._lock = threading.Lock()
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text, "counter")
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, labels: Tuple[Tuple[str, str], ...], amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(k)} {_number(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...]):
+        super().__init__(name, help_text, "histogram")
+        self.buckets = buckets
+        self._values: Dict[Tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, labels: Tuple[Tuple[str, str], ...], value: float) -> None:
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = self.header()
+        for labels, state in items:
+            for bound, count in zip(self.buckets, state):
+                lines.append(f"{self.name}_bucket{_labels(labels + (('le', _number(bound)),))} {count}")
+            lines.append(f"{self.name}_bucket{_labels(labels + (('le', '+Inf'),))} {state[-1]}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {_number(state[-2])}")
+            lines.append(f"{self.name}_count{_labels(labels)} {state[-1]}")
+        return lines
+
+
+HTTP_DURATION = Histogram("http_request_duration_seconds", "HTTP request latency by route.", LATENCY_BUCKETS)
+DB_DURATION = Histogram("db_statement_duration_seconds", "SQL statement time by operation and calling engine.", QUERY_BUCKETS)
+DB_ROWS = Counter("db_statement_rows_total", "Rows affected or returned (when the driver reports them).")
+ROWS_SCANNED = Counter("analytics_rows_scanned_total", "Event rows read by analytics engines.")
+SESSIONS_SEEN = Counter("analytics_sessions_seen_total", "Sessions processed by analytics engines.")
+LOOP_SECONDS = Histogram("analytics_loop_seconds", "Python time per analytics run (wall time minus SQL).", LATENCY_BUCKETS)
+
+PROMPT_TOKENS = Histogram("llm_prompt_data_tokens", "Estimated tokens of prompt data by kind.", TOKEN_BUCKETS)
+PROMPT_SHRUNK = Counter("llm_prompt_data_shrunk_total", "Prompt data shrunk (top-K halved) to fit the token budget.")
+PROMPT_TRUNCATED = Counter("llm_prompt_data_truncated_total", "Prompt data trimmed (items dropped) to the token budget after shrinking.")
+
+_ALL = [
+    HTTP_DURATION, DB_DURATION, DB_ROWS, ROWS_SCANNED, SESSIONS_SEEN, LOOP_SECONDS,
+    PROMPT_TOKENS, PROMPT_SHRUNK, PROMPT_TRUNCATED,
+]
+
+
+def current_engine() -> str:
+    """Analytics engine running in this context ("none" outside one)."""
+    return _current_engine.get()
+
+
+def current_request_path() -> Optional[str]:
+    """Path of the request being served in this context, if any."""
+    timing = _request_timing.get()
+    return timing["path"] if timing is not None else None
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _ALL:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class ScanStats:
+    """Counters an analytics engine fills in while it scans (see track_scan)."""
+
+    __slots__ = ("rows", "sessions")
+
+    def __init__(self):
+        self.rows = 0
+        self.sessions = 0
+
+
+@contextmanager
+def track_scan(engine: str) -> Iterator[ScanStats]:
+    """
+    Record one analytics engine run.
+
+    Usage:
+        with track_scan("funnel") as stats:
+            for _sid, events in iter_sessions(...):
+                stats.rows += len(events)
+                stats.sessions += 1
+    """
+    stats = ScanStats()
+    token = _current_engine.set(engine)
+    timing = _request_timing.get()
+    sql_before = _sql_seconds.get()
+    started = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        elapsed = time.perf_counter() - started
+        _current_engine.reset(token)
+        loop = max(0.0, elapsed - (_sql_seconds.get() - sql_before))
+        if METRICS_ENABLED:
+            labels = (("engine", engine),)
+            ROWS_SCANNED.inc(labels, stats.rows)
+            SESSIONS_SEEN.inc(labels, stats.sessions)
+            LOOP_SECONDS.observe(labels, loop)
+        if timing is not None:
+            timing["engines"].append((engine, elapsed, stats.rows))
+
+
+def instrument_engine(engine) -> None:
+    """Install statement timing hooks on a SQLAlchemy engine."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        elapsed = time.perf_counter() - started
+        _sql_seconds.set(_sql_seconds.get() + elapsed)
+        timing = _request_timing.get()
+        if timing is not None:
+            timing["db_seconds"] += elapsed
+            timing["db_statements"] += 1
+        if not METRICS_ENABLED:
+            return
+        labels = (("operation", _operation(statement)), ("caller", _current_engine.get()))
+        DB_DURATION.observe(labels, elapsed)
+        rowcount = getattr(cursor, "rowcount", -1)
+        if rowcount is not None and rowcount >= 0:
+            DB_ROWS.inc(labels, rowcount)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        conn = context.connection
+        if conn is not None and conn.info.get("query_started"):
+            conn.info["query_started"].pop()
+
+
+class TimingMiddleware:
+    """ASGI middleware recording per-route latency (and the Server-Timing header)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not (METRICS_ENABLED or SERVER_TIMING_ENABLED):
+            await self.app(scope, receive, send)
+            return
+
+        timing = {"path": scope["path"], "db_seconds": 0.0, "db_statements": 0, "engines": []}
+        token = _request_timing.set(timing)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SERVER_TIMING_ENABLED:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", _server_timing(timing, time.perf_counter() - started).encode()))
+                    # Cross-origin pages (the dashboard) may read the timings
+                    headers.append((b"timing-allow-origin", b"*"))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_timing.reset(token)
+            if METRICS_ENABLED:
+                route = scope.get("route")
+                labels = (
+                    ("method", scope["method"]),
+                    ("route", getattr(route, "path", None) or "unmatched"),
+                    ("status", str(status)),
+                )
+                HTTP_DURATION.observe(labels, time.perf_counter() - started)
+
+
+def _server_timing(timing: dict, total: float) -> str:
+    parts = [
+        f"app;dur={total * 1000:.1f}",
+        f'db;dur={timing["db_seconds"] * 1000:.1f};desc="{timing["db_statements"]} statements"',
+    ]
+    for i, (engine, elapsed, rows) in enumerate(timing["engines"]):
+        parts.append(f'{engine}-{i};dur={elapsed * 1000:.1f};desc="{rows} rows"')
+    return ", ".join(parts)
+
+
+def _operation(statement: str) -> str:
+    word = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return word if word in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH") else "OTHER"
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
@@ -0,0 +1,205 @@
+"""
+Per-Tenant Rate Limiting
+
+Token buckets keyed by api_key, so one noisy app can't saturate ingestion or
+run expensive analytics nonstop at everyone else's expense.
+
+Independent budgets:
+- ingest: measured in events (a batch of 500 events costs 500 tokens),
+  RATE_LIMIT_INGEST_EVENTS_PER_SECOND sustained, RATE_LIMIT_INGEST_BURST_EVENTS burst
+- ingest quota: the same events against RATE_LIMIT_INGEST_EVENTS_PER_DAY, a
+  bucket holding a day's worth that refills over 24 hours (a rolling daily
+  quota rather than one reset at midnight)
+- analytics: measured in requests, expensive ones (funnels, insight
+  generation, comparisons) costing COST_EXPENSIVE;
+  RATE_LIMIT_ANALYTICS_PER_SECOND sustained, RATE_LIMIT_ANALYTICS_BURST burst
+
+A rate of 0 disables that budget. Rejected requests get `429` with a
+`Retry-After` header (seconds until enough tokens have refilled).
+
+Buckets live in process memory by default, so each API worker enforces its
+own share. With RATE_LIMIT_STORE_PATH set, they live in a small SQLite file
+instead, shared by all workers on the host (updates are serialized with
+`BEGIN IMMEDIATE`), so charging a bucket is blocking I/O: async callers go
+through a thread (see `analytics_rate_limit`).
+"""
+
+import math
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import (
+    RATE_LIMIT_ANALYTICS_BURST,
+    RATE_LIMIT_ANALYTICS_PER_SECOND,
+    RATE_LIMIT_INGEST_BURST_EVENTS,
+    RATE_LIMIT_INGEST_EVENTS_PER_DAY,
+    RATE_LIMIT_INGEST_EVENTS_PER_SECOND,
+    RATE_LIMIT_STORE_PATH,
+)
+
+# Analytics cost of a request that scans events or calls the LLM
+COST_EXPENSIVE = 5
+
+SECONDS_PER_DAY = 24 * 3600
+
+# Idle buckets kept in memory before full ones are dropped
+_MAX_MEMORY_BUCKETS = 50_000
+
+
+class Budget:
+    """A named token-bucket configuration."""
+
+    def __init__(self, name: str, rate_per_second: float, burst: float, unit: str, period_seconds: float = 1):
+        self.name = name
+        self.rate_per_second = rate_per_second
+        self.burst = max(burst, rate_per_second)
+        self.unit = unit
+        # Window the limit is stated over (1 for a rate, a day for a quota)
+        self.period_seconds = period_seconds
+
+    @classmethod
+    def quota(cls, name: str, limit: float, period_seconds: float, unit: str) -> "Budget":
+        """At most `limit` over any `period_seconds`: a full bucket that refills over the period."""
+        return cls(name, limit / period_seconds, limit, unit, period_seconds)
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate_per_second > 0
+
+    def describe(self) -> str:
+        if self.period_seconds == SECONDS_PER_DAY:
+            return f"{self.burst:g} {self.unit}/day"
+        return f"{self.rate_per_second:g} {self.unit}/s"
+
+
+INGEST = Budget("ingest", RATE_LIMIT_INGEST_EVENTS_PER_SECOND, RATE_LIMIT_INGEST_BURST_EVENTS, "events")
+INGEST_QUOTA = Budget.quota("ingest-daily", RATE_LIMIT_INGEST_EVENTS_PER_DAY, SECONDS_PER_DAY, "events")
+ANALYTICS = Budget("analytics", RATE_LIMIT_ANALYTICS_PER_SECOND, RATE_LIMIT_ANALYTICS_BURST, "requests")
+
+_BUDGETS = {budget.name: budget for budget in (INGEST, INGEST_QUOTA, ANALYTICS)}
+
+
+def _refill(tokens: float, updated: float, now: float, budget: Budget) -> float:
+    return min(budget.burst, tokens + max(0.0, now - updated) * budget.rate_per_second)
+
+
+def _take(tokens: float, cost: float, budget: Budget) -> Tuple[float, float]:
+    """(tokens left, seconds to wait); wait is 0 when the cost was taken."""
+    if tokens >= cost:
+        return tokens - cost, 0.0
+    return tokens, (cost - tokens) / budget.rate_per_second
+
+
+class _MemoryStore:
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, budget: Budget, key: str, cost: float) -> float:
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._buckets.get((budget.name, key), (budget.burst, now))
+            tokens, wait = _take(_refill(tokens, updated, now, budget), cost, budget)
+            self._buckets[(budget.name, key)] = (tokens, now)
+            if len(self._buckets) > _MAX_MEMORY_BUCKETS:
+                self._evict_full(now)
+        return wait
+
+    def _evict_full(self, now: float) -> None:
+        for bucket_key, (tokens, updated) in list(self._buckets.items()):
+            budget = _BUDGETS[bucket_key[0]]
+            if _refill(tokens, updated, now, budget) >= budget.burst:
+                del self._buckets[bucket_key]
+
+
+class _SQLiteStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                " budget TEXT NOT NULL, key TEXT NOT NULL, tokens REAL NOT NULL, updated REAL NOT NULL,"
+                " PRIMARY KEY (budget, key))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def acquire(self, budget: Budget, key: str, cost: float) -> float:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute(
+                "SELECT tokens, updated FROM buckets WHERE budget = ? AND key = ?", (budget.name, key)
+            ).fetchone()
+            tokens, updated = row if row is not None else (budget.burst, now)
+            tokens, wait = _take(_refill(tokens, updated, now, budget), cost, budget)
+            conn.execute(
+                "INSERT INTO buckets (budget, key, tokens, updated) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (budget, key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (budget.name, key, tokens, now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+
+_store = _SQLiteStore(RATE_LIMIT_STORE_PATH) if RATE_LIMIT_STORE_PATH else _MemoryStore()
+
+
+def check_rate_limit(budget: Budget, api_key: Optional[str], cost: float = 1) -> None:
+    """
+    Charge `cost` tokens to the api_key's bucket.
+
+    A cost above the burst size is charged as a full bucket (otherwise such a
+    request could never pass).
+
+    Raises:
+        HTTPException: 429 with Retry-After when the bucket is short.
+    """
+    if not budget.enabled:
+        return
+    wait = _store.acquire(budget, api_key or "", min(cost, budget.burst))
+    if wait > 0:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Rate limit exceeded for this api_key ({budget.name}: {budget.describe()})",
+            headers={"Retry-After": str(max(1, math.ceil(wait)))},
+        )
+
+
+def analytics_rate_limit(cost: float = 1):
+    """
+    FastAPI dependency charging the analytics budget of the request's api_key
+    (from the query string, or the JSON body of POST requests). The bucket is
+    charged in the threadpool, since the shared store blocks on SQLite.
+
+    Usage:
+        @router.get("/x", dependencies=[Depends(analytics_rate_limit())])
+    """
+    async def dependency(request: Request) -> None:
+        api_key = request.query_params.get("api_key")
+        if api_key is None and request.method == "POST":
+            try:
+                body = await request.json()
+                api_key = body.get("api_key") if isinstance(body, dict) else None
+            except Exception:
+                api_key = None
+        await run_in_threadpool(check_rate_limit, ANALYTICS, api_key, cost)
+
+    return dependency
@@ -0,0 +1,160 @@
+"""
+Slow-Query Log
+
+Captures read statements slower than SLOW_QUERY_THRESHOLD_MS so a query that
+suddenly got slow for one tenant can be diagnosed from production data (a sort
+spilling to disk, a missing index, a bad row estimate) without reproducing it
+offline. Admins read the captures at `GET /admin/slow-queries`.
+
+Each capture holds the SQL, the shape of its bind parameters (types and list
+lengths only, never values, which may contain api_keys or user data), the
+duration, the analytics engine and request path that ran it, and its plan:
+- Postgres: `EXPLAIN (ANALYZE, BUFFERS)`, which re-runs the query; bounded by
+  SLOW_QUERY_EXPLAIN_TIMEOUT_MS
+- SQLite: `EXPLAIN QUERY PLAN`
+
+Captures are sampled (SLOW_QUERY_SAMPLE_RATE) and kept in a ring buffer of the
+last SLOW_QUERY_LOG_SIZE per process. Plans are taken in one background thread
+on a separate connection, so the slow request isn't made slower; while a plan
+is running, further captures are stored without one.
+
+Only SELECT/WITH statements are captured: EXPLAIN ANALYZE executes the
+statement, which must never happen twice for a write.
+"""
+
+import itertools
+import logging
+import random
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from sqlalchemy import event
+
+from app.core.config import (
+    SLOW_QUERY_EXPLAIN_TIMEOUT_MS,
+    SLOW_QUERY_LOG_SIZE,
+    SLOW_QUERY_SAMPLE_RATE,
+    SLOW_QUERY_THRESHOLD_MS,
+)
+from app.core.metrics import current_engine, current_request_path
+
+logger = logging.getLogger(__name__)
+
+# Longest statement text kept per capture
+_MAX_STATEMENT_CHARS = 10_000
+
+# A WITH statement containing one of these is a write
+_WRITE_KEYWORD = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE)\b", re.IGNORECASE)
+
+_captures: deque = deque(maxlen=max(1, SLOW_QUERY_LOG_SIZE))
+_lock = threading.Lock()
+_ids = itertools.count(1)
+_explain_busy = threading.Lock()
+
+
+def recent(limit: int = 50) -> List[dict]:
+    """Captured slow queries, newest first."""
+    with _lock:
+        return [dict(c) for c in reversed(_captures)][:limit]
+
+
+def clear() -> None:
+    with _lock:
+        _captures.clear()
+
+
+def install(engine) -> None:
+    """Watch an engine's statements (no-op when SLOW_QUERY_THRESHOLD_MS is 0)."""
+    if SLOW_QUERY_THRESHOLD_MS <= 0:
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["slow_query_started"].pop()) * 1000
+        if elapsed_ms < SLOW_QUERY_THRESHOLD_MS or executemany or not _is_read(statement):
+            return
+        if random.random() >= SLOW_QUERY_SAMPLE_RATE:
+            return
+        _capture(engine, statement, parameters, elapsed_ms, getattr(cursor, "rowcount", -1))
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        conn = context.connection
+        if conn is not None and conn.info.get("slow_query_started"):
+            conn.info["slow_query_started"].pop()
+
+
+def _capture(engine, statement: str, parameters, elapsed_ms: float, rowcount: Optional[int]) -> None:
+    capture = {
+        "id": next(_ids),
+        "captured_at": datetime.now(timezone.utc).isoformat(),
+        "duration_ms": round(elapsed_ms, 1),
+        "engine": current_engine(),
+        "path": current_request_path(),
+        "statement": statement[:_MAX_STATEMENT_CHARS],
+        "parameters": _shape(parameters),
+        "rowcount": rowcount if rowcount is not None and rowcount >= 0 else None,
+        "dialect": engine.dialect.name,
+        "plan": None,
+        "plan_error": None,
+    }
+    with _lock:
+        _captures.append(capture)
+    logger.warning("Slow query (%.0f ms, engine=%s, path=%s)", elapsed_ms, capture["engine"], capture["path"])
+
+    if _explain_busy.acquire(blocking=False):
+        threading.Thread(
+            target=_explain, args=(engine, capture, statement, parameters), name="slow-query-explain", daemon=True
+        ).start()
+    else:
+        capture["plan_error"] = "skipped (another plan was being captured)"
+
+
+def _explain(engine, capture: dict, statement: str, parameters) -> None:
+    try:
+        with engine.connect() as conn:
+            if engine.dialect.name == "postgresql":
+                conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(SLOW_QUERY_EXPLAIN_TIMEOUT_MS)}")
+                rows = conn.exec_driver_sql("EXPLAIN (ANALYZE, BUFFERS) " + statement, parameters).fetchall()
+                plan = "\n".join(row[0] for row in rows)
+            elif engine.dialect.name == "sqlite":
+                rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+                plan = "\n".join(str(row[-1]) for row in rows)
+            else:
+                rows = conn.exec_driver_sql("EXPLAIN " + statement, parameters).fetchall()
+                plan = "\n".join(" ".join(str(v) for v in row) for row in rows)
+            conn.rollback()
+        capture["plan"] = plan
+    except Exception as exc:
+        capture["plan_error"] = f"{type(exc).__name__}: {exc}"[:500]
+    finally:
+        _explain_busy.release()
+
+
+def _is_read(statement: str) -> bool:
+    head = statement.lstrip()[:6].upper()
+    if head.startswith("WITH"):
+        return not _WRITE_KEYWORD.search(statement)
+    return head.startswith("SELECT")
+
+
+def _shape(value):
+    """Types (and lengths of sequences) of bind parameters, without their values."""
+    if isinstance(value, dict):
+        return {str(k): _shape(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        if len(value) > 20:
+            kinds = sorted({type(v).__name__ for v in value})
+            return f"{type(value).__name__}[{len(value)}] of {'|'.join(kinds)}"
+        return [_shape(v) for v in value]
+    if value is None:
+        return "null"
+    return type(value).__name__
@@ -3,38 +3,49 @@ Database Configuration
 
 Supports both SQLite (local development) and PostgreSQL (production).
 The DATABASE_URL environment variable determines which to use.
+
+Two engines:
+- `engine` (SessionLocal): ingestion, writes, workers
+- `analytics_engine` (AnalyticsSessionLocal): read-only analytics endpoints.
+  Connects to ANALYTICS_DATABASE_URL when set (e.g. a streaming read replica,
+  whose data may lag the primary by a moment), otherwise to DATABASE_URL.
+  On Postgres it always has its own pool, sized by ANALYTICS_POOL_SIZE /
+  ANALYTICS_MAX_OVERFLOW, and its statements are cut off after
+  ANALYTICS_STATEMENT_TIMEOUT_MS, so a runaway dashboard query can neither
+  hold ingestion's connections nor run forever. Local SQLite shares `engine`.
 """
 
 import os
 from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 
+from app.core.config import (
+    ANALYTICS_MAX_OVERFLOW,
+    ANALYTICS_POOL_SIZE,
+    ANALYTICS_STATEMENT_TIMEOUT_MS,
+    DB_MAX_OVERFLOW,
+    DB_POOL_SIZE,
+)
+
 # Load environment variables from .env early so DATABASE_URL is available
 # when this module is imported (local development).
 load_dotenv()
 
-# Get database URL from environment, default to SQLite for local dev
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./analytics.db")
-
-# Handle Supabase/Heroku PostgreSQL URL format
-# Some providers use "postgres://" but SQLAlchemy requires "postgresql://"
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
-
-# Configure engine based on database type
-if DATABASE_URL.startswith("sqlite"):
-    # SQLite configuration (local development)
-    engine = create_engine(
-        DATABASE_URL,
-        connect_args={"check_same_thread": False}
-    )
-else:
+
+def _normalize_url(url: str) -> str:
+    # Handle Supabase/Heroku PostgreSQL URL format
+    # Some providers use "postgres://" but SQLAlchemy requires "postgresql://"
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    if url.startswith("sqlite"):
+        return url
+
     # Supabase Postgres typically requires SSL. If a Supabase URL is provided
     # without sslmode, default to sslmode=require to avoid hanging connections.
     try:
-        parsed = urlparse(DATABASE_URL)
+        parsed = urlparse(url)
         is_postgres = parsed.scheme.startswith("postgres")
         is_supabase = "supabase." in (parsed.hostname or "") or "pooler.supabase.com" in (parsed.hostname or "")
         if is_postgres and is_supabase:
@@ -42,19 +53,55 @@ else:
             if "sslmode" not in qs:
                 qs["sslmode"] = "require"
                 parsed = parsed._replace(query=urlencode(qs))
-                DATABASE_URL = urlunparse(parsed)
+                url = urlunparse(parsed)
     except Exception:
         # If parsing fails, keep the original URL.
         pass
+    return url
+
+
+def _create_engine(url: str, pool_size: int, max_overflow: int, statement_timeout_ms: int = 0):
+    if url.startswith("sqlite"):
+        # SQLite configuration (local development)
+        return create_engine(
+            url,
+            connect_args={"check_same_thread": False}
+        )
 
     # PostgreSQL configuration (production)
-    engine = create_engine(
-        DATABASE_URL,
+    new_engine = create_engine(
+        url,
         connect_args={"connect_timeout": 5},
         pool_pre_ping=True,      # Check connection health before using
         pool_recycle=300,        # Recycle connections every 5 minutes
-        pool_size=5,             # Number of connections to keep
-        max_overflow=10          # Extra connections when needed
+        pool_size=pool_size,     # Number of connections to keep
+        max_overflow=max_overflow  # Extra connections when needed
+    )
+    if statement_timeout_ms > 0:
+        # Set per connection rather than in the startup packet, which
+        # transaction poolers (pgbouncer, Supavisor) may reject.
+        @event.listens_for(new_engine, "connect")
+        def _set_statement_timeout(dbapi_connection, _record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"SET statement_timeout = {int(statement_timeout_ms)}")
+            cursor.close()
+            dbapi_connection.commit()
+
+    return new_engine
+
+
+# Get database URL from environment, default to SQLite for local dev
+DATABASE_URL = _normalize_url(os.getenv("DATABASE_URL", "sqlite:///./analytics.db"))
+# Analytics reads (unset: the primary database)
+ANALYTICS_DATABASE_URL = _normalize_url(os.getenv("ANALYTICS_DATABASE_URL") or DATABASE_URL)
+
+engine = _create_engine(DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW)
+
+if ANALYTICS_DATABASE_URL == DATABASE_URL and DATABASE_URL.startswith("sqlite"):
+    analytics_engine = engine
+else:
+    analytics_engine = _create_engine(
+        ANALYTICS_DATABASE_URL, ANALYTICS_POOL_SIZE, ANALYTICS_MAX_OVERFLOW, ANALYTICS_STATEMENT_TIMEOUT_MS
     )
 
 SessionLocal = sessionmaker(
@@ -63,4 +110,10 @@ SessionLocal = sessionmaker(
     bind=engine
 )
 
+AnalyticsSessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    bind=analytics_engine
+)
+
 Base = declarative_base()
@@ -4,7 +4,15 @@ Database Dependencies
 FastAPI dependency helpers for obtaining a per-request SQLAlchemy session.
 """
 
-from app.db.database import SessionLocal
+from fastapi import HTTPException
+from sqlalchemy.exc import OperationalError
+
+from app.core.deadline import ClientDisconnected, DeadlineExceeded
+from app.db.database import AnalyticsSessionLocal, SessionLocal
+
+# Postgres SQLSTATE for a statement cancelled by statement_timeout
+_QUERY_CANCELED = "57014"
+
 
 def get_db():
     """Yield a SQLAlchemy session and ensure it is closed after the request."""
@@ -12,4 +20,36 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def get_analytics_db():
+    """
+    Yield a read-only session on the analytics engine (replica, when configured).
+
+    Only for endpoints that don't write and don't need to read their own
+    writes. A query cut off by ANALYTICS_STATEMENT_TIMEOUT_MS, or a scan
+    stopped by the request deadline or a client disconnect, becomes a `503`.
+    """
+    db = AnalyticsSessionLocal()
+    try:
+        yield db
+    except DeadlineExceeded as exc:
+        raise HTTPException(
+            status_code=503,
+            detail="Analytics request ran past its deadline; try sampling, or allow_partial",
+            headers={"Retry-After": "30"},
+        ) from exc
+    except ClientDisconnected as exc:
+        # Nobody reads this response; the scan stopped and the connection is released.
+        raise HTTPException(status_code=503, detail="Client disconnected") from exc
+    except OperationalError as exc:
+        if getattr(exc.orig, "pgcode", None) == _QUERY_CANCELED:
+            raise HTTPException(
+                status_code=503,
+                detail="Analytics query took too long; try a shorter date range or sampling",
+                headers={"Retry-After": "30"},
+            ) from exc
+        raise
+    finally:
+        db.close()
@@ -0,0 +1,47 @@
+"""
+Schema Migration Command
+
+Brings the database schema up to date (app/db/schema.py) and exits. Run it once
+per deploy (e.g. as a release command) together with SCHEMA_SETUP=migrate, so
+API and worker processes start without touching the schema at all.
+
+Usage:
+    python -m app.db.migrate [--if-needed]
+"""
+
+import argparse
+import logging
+import time
+
+from app.db.database import engine
+from app.db.schema import ensure_schema, init_schema, schema_fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bring the database schema up to date.")
+    parser.add_argument(
+        "--if-needed",
+        action="store_true",
+        help="skip the setup when the database already has the current schema fingerprint",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    started = time.monotonic()
+    if args.if_needed:
+        ran = ensure_schema(engine)
+    else:
+        init_schema(engine)
+        ran = True
+    logger.info(
+        "Schema %s %s (%.0f ms)",
+        schema_fingerprint(),
+        "applied" if ran else "already up to date",
+        (time.monotonic() - started) * 1000,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Legacy Events Migration
+
+Copies rows from `events_legacy` (the old string-keyed layout, renamed by
+app/db/schema.py) into the dictionary-encoded `events` table, in chunks.
+
+Each chunk is inserted and then deleted from the legacy table in one
+transaction, so the command can be interrupted and re-run safely. Rows of
+api_keys whose app was deleted are dropped instead (and counted), as the
+purge worker would have done. The legacy
+table is dropped once it is empty, and the sessionizer's high-water mark is
+reset so sessions are rebuilt to include the migrated (older) rows.
+
+Usage:
+    python -m app.db.migrate_legacy_events [--chunk-size 10000]
+"""
+
+import argparse
+import logging
+from typing import Dict, List, Tuple
+from sqlalchemy import MetaData, Table, inspect, insert, select
+from sqlalchemy.orm import Session
+
+from app.db.database import SessionLocal, engine
+from app.db.models import EventDB, WorkerStateDB
+from app.db.schema import LEGACY_EVENTS_TABLE, init_schema
+from app.storage.dictionary import get_app_key_id, get_event_name_ids, get_session_key_ids, register_property_keys
+
+logger = logging.getLogger(__name__)
+
+
+def migrate_chunk(db: Session, legacy: Table, chunk_size: int) -> Tuple[int, int]:
+    """
+    Move up to `chunk_size` legacy rows.
+
+    Returns:
+        (rows moved, rows dropped because their app was deleted)
+    """
+    rows = db.execute(
+        select(legacy).order_by(legacy.c.created_at, legacy.c.id).limit(chunk_size)
+    ).mappings().all()
+    if not rows:
+        return 0, 0
+
+    by_key: Dict[str, List] = {}
+    for row in rows:
+        by_key.setdefault(row["api_key"], []).append(row)
+
+    new_rows = []
+    dropped = 0
+    for api_key, key_rows in by_key.items():
+        app_key_id = get_app_key_id(db, api_key, create=True)
+        if app_key_id is None:
+            # Tombstoned key: the app was deleted, so its events go too.
+            dropped += len(key_rows)
+            continue
+        name_ids = get_event_name_ids(db, app_key_id, (r["event_name"] for r in key_rows), create=True)
+        session_ids = get_session_key_ids(db, app_key_id, (r["session_id"] for r in key_rows), create=True)
+        register_property_keys(db, app_key_id, (r["properties"] for r in key_rows))
+        for r in key_rows:
+            new_rows.append({
+                "app_key_id": app_key_id,
+                "event_name_id": name_ids[r["event_name"]],
+                "session_key_id": session_ids[r["session_id"]],
+                "timestamp_ms": r["timestamp_ms"],
+                "platform": r["platform"],
+                "properties": r["properties"],
+                "created_at": r["created_at"],
+            })
+
+    if new_rows:
+        db.execute(insert(EventDB), new_rows)
+    db.execute(legacy.delete().where(legacy.c.id.in_([r["id"] for r in rows])))
+    db.commit()
+    return len(new_rows), dropped
+
+
+def migrate(chunk_size: int = 10_000) -> int:
+    """Migrate every legacy row; returns the total moved."""
+    init_schema(engine)
+    if LEGACY_EVENTS_TABLE not in inspect(engine).get_table_names():
+        logger.info("No %s table; nothing to migrate", LEGACY_EVENTS_TABLE)
+        return 0
+
+    legacy = Table(LEGACY_EVENTS_TABLE, MetaData(), autoload_with=engine)
+    total = dropped_total = 0
+    db = SessionLocal()
+    try:
+        while True:
+            moved, dropped = migrate_chunk(db, legacy, chunk_size)
+            if moved == 0 and dropped == 0:
+                break
+            total += moved
+            dropped_total += dropped
+            logger.info("Migrated %d legacy events (%d of deleted apps dropped)", total, dropped_total)
+        db.query(WorkerStateDB).filter(WorkerStateDB.name == "sessionizer").delete()
+        db.commit()
+    finally:
+        db.close()
+
+    legacy.drop(bind=engine)
+    logger.info("Dropped %s after migrating %d events", LEGACY_EVENTS_TABLE, total)
+    return total
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Copy legacy string-keyed events into the encoded layout.")
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    args = parser.parse_args()
+    migrate(args.chunk_size)
@@ -3,17 +3,110 @@ Database Models (SQLAlchemy)
 
 Defines the persistent schema used by the backend:
 - apps (per-user tracked applications + API keys)
-- events (raw analytics events)
+- app_keys / event_names / session_keys (integer dictionaries for events)
+- events (raw analytics events, dictionary-encoded)
 - funnel_definitions (saved funnels)
 - insights (LLM outputs + optional stored snapshots)
+- snapshots (content-addressed analytics snapshots referenced by insights)
+- precomputed_snapshots (latest scheduled snapshot per api_key)
+- insight_jobs (queued/running insight generation requests)
+- llm_responses (LLM completions cached by prompt hash)
+- property_keys (per-app catalog of event property keys, for segment filters)
+- sessions (one pre-aggregated row per session, built by the sessionizer)
+- event_counters / anomaly_baselines / anomalies (streaming anomaly detection)
+- worker_state (high-water marks for background workers)
 """
 
-from sqlalchemy import Column, String, DateTime, JSON, BigInteger, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import (
+    Column,
+    String,
+    Text,
+    DateTime,
+    JSON,
+    BigInteger,
+    Integer,
+    LargeBinary,
+    Boolean,
+    Float,
+    ForeignKey,
+    UniqueConstraint,
+    Index,
+    Identity,
+    cast,
+    literal_column,
+    text,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import query_expression, relationship
+from sqlalchemy.sql.functions import FunctionElement
 from datetime import datetime, timezone
+import re
 import uuid
+from app.core.config import HOT_PROPERTY_KEYS
 from app.db.database import Base
 
+# SQLite only auto-increments INTEGER PRIMARY KEY columns, so 64-bit ids are
+# BIGINT identities on Postgres and plain INTEGER (also 64-bit) on SQLite.
+BigIntId = BigInteger().with_variant(Integer, "sqlite")
+
+# Session sampling (app/analytics/sampling.py): every session falls into one of
+# SAMPLE_BUCKETS buckets by a multiplicative hash of its id. The constants are
+# rendered inline (not as bind parameters) so queries match the expression index.
+SAMPLE_BUCKETS = 65536
+SAMPLE_HASH_MULTIPLIER = 40503
+
+
+def sample_bucket(session_key_id_column):
+    """SQL expression for a session's sample bucket, in [0, SAMPLE_BUCKETS)."""
+    return (session_key_id_column * literal_column(str(SAMPLE_HASH_MULTIPLIER))) % literal_column(str(SAMPLE_BUCKETS))
+
+
+class property_text(FunctionElement):
+    """
+    SQL expression for one event property as text (NULL when absent):
+    `properties ->> 'key'` on Postgres, the json_extract equivalent on SQLite
+    (booleans read 'true'/'false' on both). The key is rendered inline, so
+    queries match the hot-key expression indexes.
+    """
+    type = Text()
+    name = "property_text"
+    inherit_cache = True
+
+    def __init__(self, properties_column, key: str):
+        self.key = key
+        super().__init__(properties_column, literal_column(_quote_literal(key)))
+
+
+def _quote_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+@compiles(property_text)
+def _property_text_postgresql(element, compiler, **kw):
+    column, key = element.clauses
+    return f"({compiler.process(column, **kw)} ->> {compiler.process(key, **kw)})"
+
+
+@compiles(property_text, "sqlite")
+def _property_text_sqlite(element, compiler, **kw):
+    column, _key = element.clauses
+    column_sql = compiler.process(column, **kw)
+    path = _quote_literal(f'$."{element.key}"')
+    return (
+        f"CASE json_type({column_sql}, {path}) WHEN 'true' THEN 'true' WHEN 'false' THEN 'false' "
+        f"ELSE CAST(json_extract({column_sql}, {path}) AS TEXT) END"
+    )
+
+
+# Property keys usable in segment filters (no quotes/backslashes: they are
+# rendered inline, and into SQLite JSON paths)
+PROPERTY_KEY_PATTERN = re.compile(r'^[^"\\\x00-\x1f]{1,100}$')
+
+
+def hot_property_index_name(key: str) -> str:
+    return "ix_events_prop_" + re.sub(r"\W+", "_", key).strip("_").lower()[:40]
+
 
 # ============ App Model ============
 # Links Supabase Auth users to their apps
@@ -41,25 +134,146 @@ class AppDB(Base):
     
     # Optional description
     description = Column(String, nullable=True)
+
+    # Days of events to keep (None = EVENT_RETENTION_DAYS default, see purge worker)
+    retention_days = Column(Integer, nullable=True)
     
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), 
                         onupdate=lambda: datetime.now(timezone.utc))
 
 
+# ============ Event Dictionaries ============
+# Events reference their api_key, event name and session through small integer
+# ids instead of repeating the strings on every row (and in every index).
+# Dictionary rows are append-only, so ids can be cached in-process
+# (see app/storage/dictionary.py).
+
+class AppKeyDB(Base):
+    """Integer surrogate for every api_key that has ingested events."""
+    __tablename__ = "app_keys"
+
+    id = Column(Integer, primary_key=True)
+    api_key = Column(String, unique=True, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    # Set when the owning app is deleted; the purge worker then removes the
+    # key's events and dictionaries in the background and finally this row.
+    deleted_at = Column(DateTime, nullable=True)
+
+    # Ingestion watermark: when events were last received (updated at most
+    # once per INGEST_WATERMARK_RESOLUTION_SECONDS)
+    last_ingested_at = Column(DateTime, nullable=True)
+
+    # The app a replaced key belonged to (set by regenerate_api_key), so
+    # deleting the app also purges events ingested under its old keys
+    app_id = Column(String, nullable=True)
+
+
+class EventNameDB(Base):
+    """Per-app dictionary of event names."""
+    __tablename__ = "event_names"
+    __table_args__ = (
+        UniqueConstraint("app_key_id", "name", name="uq_event_names_app_key_name"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    app_key_id = Column(Integer, ForeignKey("app_keys.id"), nullable=False)
+    name = Column(String, nullable=False)
+
+
+class SessionKeyDB(Base):
+    """Per-app dictionary of client session ids."""
+    __tablename__ = "session_keys"
+    __table_args__ = (
+        UniqueConstraint("app_key_id", "session_id", name="uq_session_keys_app_key_session"),
+    )
+
+    id = Column(BigIntId, Identity(), primary_key=True)
+    app_key_id = Column(Integer, ForeignKey("app_keys.id"), nullable=False)
+    session_id = Column(String, nullable=False)
+    # NULL for keys created before the column existed; the purge worker
+    # leaves keys younger than the dictionary cache TTL alone
+    created_at = Column(DateTime, nullable=True, default=lambda: datetime.now(timezone.utc))
+
+
 # ============ Event Model ============
 
 class EventDB(Base):
     __tablename__ = "events"
+    __table_args__ = (
+        # Session scans: WHERE app_key_id = ? ORDER BY session_key_id, timestamp_ms
+        Index("ix_events_app_session_ts", "app_key_id", "session_key_id", "timestamp_ms"),
+        # Time-range queries (event volume)
+        Index("ix_events_app_ts", "app_key_id", "timestamp_ms"),
+        # Sessionizer high-water mark
+        Index("ix_events_created_at", "created_at"),
+        # Platform segments (app/analytics/segments.py)
+        Index("ix_events_app_platform_session", "app_key_id", "platform", "session_key_id"),
+        # Bulk imports skip events whose client event_id the app already has
+        Index(
+            "uq_events_app_event_id",
+            "app_key_id",
+            "event_id",
+            unique=True,
+            postgresql_where=text("event_id IS NOT NULL"),
+            sqlite_where=text("event_id IS NOT NULL"),
+        ),
+    )
 
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    api_key = Column(String, index=True, nullable=False)
-    event_name = Column(String, index=True, nullable=False)
-    session_id = Column(String, index=True, nullable=False)
+    id = Column(BigIntId, Identity(), primary_key=True)
+    app_key_id = Column(Integer, ForeignKey("app_keys.id"), nullable=False)
+    event_name_id = Column(Integer, ForeignKey("event_names.id"), nullable=False)
+    session_key_id = Column(BigIntId, ForeignKey("session_keys.id"), nullable=False)
     timestamp_ms = Column(BigInteger, nullable=False)
     platform = Column(String, nullable=True)
     properties = Column(JSON, nullable=True)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    # Client-assigned id; set by bulk imports (dedupe key), not by SDK ingestion
+    event_id = Column(String, nullable=True)
+
+
+# Sampled scans of the events backend (app/analytics/sampling.py) only touch
+# the sampled buckets' index range, like ix_sessions_app_sample.
+Index(
+    "ix_events_app_sample",
+    EventDB.__table__.c.app_key_id,
+    sample_bucket(EventDB.__table__.c.session_key_id),
+)
+
+# Property segments: containment (`properties::jsonb @> '{"plan": "pro"}'`) on
+# any key uses the GIN index (Postgres only); HOT_PROPERTY_KEYS get a b-tree on
+# (app, value, session) each, on both databases.
+Index(
+    "ix_events_properties_gin",
+    cast(EventDB.__table__.c.properties, JSONB).label("properties_jsonb"),
+    postgresql_using="gin",
+    postgresql_ops={"properties_jsonb": "jsonb_path_ops"},
+).ddl_if(dialect="postgresql")
+
+for _key in HOT_PROPERTY_KEYS:
+    if PROPERTY_KEY_PATTERN.match(_key):
+        Index(
+            hot_property_index_name(_key),
+            EventDB.__table__.c.app_key_id,
+            property_text(EventDB.__table__.c.properties, _key),
+            EventDB.__table__.c.session_key_id,
+        )
+
+
+class PropertyKeyDB(Base):
+    """Per-app catalog of event property keys (offered as segment filters)."""
+    __tablename__ = "property_keys"
+    __table_args__ = (
+        UniqueConstraint("app_key_id", "key", name="uq_property_keys_app_key"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    app_key_id = Column(Integer, ForeignKey("app_keys.id"), nullable=False)
+    key = Column(String, nullable=False)
+    # "string", "number", "boolean", or "mixed" once a key was seen with several
+    value_type = Column(String, nullable=False)
+    first_seen_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
 class FunnelDefinitionDB(Base):
     __tablename__ = "funnel_definitions"
@@ -73,14 +287,265 @@ class FunnelDefinitionDB(Base):
 class InsightDB(Base):
     __tablename__ = "insights"
 
+    __table_args__ = (
+        # History pages: WHERE api_key = ? ORDER BY created_at DESC, id DESC LIMIT ?
+        Index("ix_insights_api_key_created_at", "api_key", "created_at", "id"),
+    )
+
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    api_key = Column(String, index=True, nullable=False)
+    api_key = Column(String, nullable=False)
 
     summary = Column(String, nullable=False)
     insights = Column(JSON, nullable=False)
     recommendations = Column(JSON, nullable=False)
     
-    # Store the analytics snapshot for historical comparison
-    analytics_snapshot = Column(JSON, nullable=True)
+    # Analytics snapshot for historical comparison, in the snapshot store
+    snapshot_hash = Column(String(64), ForeignKey("snapshots.hash"), nullable=True)
+    # Legacy inline snapshot (rows written before the snapshot store; SQL NULL
+    # when absent, so has_snapshot never has to read the JSON)
+    analytics_snapshot = Column(JSON(none_as_null=True), nullable=True)
+
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    # Filled by list_insights() without loading analytics_snapshot
+    has_snapshot = query_expression()
+
+
+# ============ Snapshot Store ============
+# Content-addressed analytics snapshots (app/storage/snapshots.py). Identical
+# snapshots are stored once; near-duplicates as a delta against a full one.
+
+class SnapshotDB(Base):
+    __tablename__ = "snapshots"
+
+    __table_args__ = (
+        # Finding the latest full snapshot of an app (delta base)
+        Index("ix_snapshots_api_key_created_at", "api_key", "created_at"),
+    )
+
+    # sha256 of the canonical JSON of the full snapshot
+    hash = Column(String(64), primary_key=True)
+    api_key = Column(String, nullable=False)
+
+    # "full": payload is the snapshot; "delta": payload patches base_hash (always a full one)
+    encoding = Column(String, nullable=False)
+    base_hash = Column(String(64), nullable=True)
+    # "zlib" or "none"
+    compression = Column(String, nullable=False)
+    payload = Column(LargeBinary, nullable=False)
+    size_bytes = Column(Integer, nullable=False)  # canonical JSON size before delta/compression
+
+    # Headline fields (what compare/trends read), so those never decode payloads
+    metrics = Column(JSON, nullable=False)
+
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
\ No newline at end of file
+
+class PrecomputedSnapshotDB(Base):
+    """Latest snapshot computed ahead of time by app/workers/snapshot_scheduler.py."""
+    __tablename__ = "precomputed_snapshots"
+
+    api_key = Column(String, primary_key=True)
+    # NULL until the first run
+    snapshot_hash = Column(String(64), ForeignKey("snapshots.hash"), nullable=True)
+    # When the last computation started (data ingested before this is included)
+    computed_at = Column(DateTime, nullable=True)
+    duration_ms = Column(Integer, nullable=True)
+    next_run_at = Column(DateTime, nullable=False, index=True)
+
+
+# ============ Insight Job Model ============
+# Insight generation runs in background workers (app/workers/insight_jobs.py);
+# the API only enqueues a job and reports its status.
+
+INSIGHT_JOB_QUEUED = "queued"
+INSIGHT_JOB_RUNNING = "running"
+INSIGHT_JOB_SUCCEEDED = "succeeded"
+INSIGHT_JOB_FAILED = "failed"
+INSIGHT_JOB_IN_FLIGHT = (INSIGHT_JOB_QUEUED, INSIGHT_JOB_RUNNING)
+
+
+class InsightJobDB(Base):
+    __tablename__ = "insight_jobs"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    api_key = Column(String, nullable=False)
+
+    status = Column(String, nullable=False, default=INSIGHT_JOB_QUEUED)
+    # Current step while running: snapshot, llm, saving
+    stage = Column(String, nullable=True)
+    sample = Column(Float, nullable=True)
+
+    insight_id = Column(String, ForeignKey("insights.id", ondelete="SET NULL"), nullable=True)
+    error = Column(String, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    # Bumped on every stage change; a running job that stops updating is re-queued
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc),
+                        onupdate=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        # At most one in-flight job per api_key: duplicate requests join it
+        Index(
+            "uq_insight_jobs_in_flight",
+            "api_key",
+            unique=True,
+            postgresql_where=status.in_(INSIGHT_JOB_IN_FLIGHT),
+            sqlite_where=status.in_(INSIGHT_JOB_IN_FLIGHT),
+        ),
+        # Claiming: oldest queued job first
+        Index("ix_insight_jobs_status_created", "status", "created_at"),
+    )
+
+
+# ============ LLM Response Cache ============
+# Shared second-level cache behind app/insights/llm.py, so identical prompts
+# never pay for a second LLM round trip (across processes and restarts).
+
+class LLMResponseDB(Base):
+    __tablename__ = "llm_responses"
+
+    # sha256 of provider, model, system message and prompt
+    prompt_hash = Column(String(64), primary_key=True)
+    model = Column(String, nullable=False)
+    response = Column(String, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+
+
+# ============ Session Model ============
+# Maintained by the background sessionizer (app/workers/sessionizer.py).
+# Lets analytics read one row per session instead of every raw event.
+
+class SessionDB(Base):
+    __tablename__ = "sessions"
+
+    session_key_id = Column(BigIntId, ForeignKey("session_keys.id"), primary_key=True, autoincrement=False)
+    app_key_id = Column(Integer, ForeignKey("app_keys.id"), index=True, nullable=False)
+
+    # Sampled reads only touch the sampled buckets' index range
+    __table_args__ = (
+        Index("ix_sessions_app_sample", app_key_id, sample_bucket(session_key_id)),
+    )
+
+    first_ts_ms = Column(BigInteger, nullable=False)
+    last_ts_ms = Column(BigInteger, nullable=False)
+    event_count = Column(Integer, nullable=False)
+    platform = Column(String, nullable=True)
+
+    # Ordered event_names.id codes and their offsets from first_ts_ms (parallel arrays)
+    event_name_ids = Column(JSON, nullable=False)
+    event_offsets_ms = Column(JSON, nullable=False)
+
+    # True if any event name contains "error" (same rule as the snapshot error count)
+    has_error = Column(Boolean, nullable=False, default=False)
+
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc),
+                        onupdate=lambda: datetime.now(timezone.utc))
+
+
+# ============ Anomaly Detection ============
+# Ingestion counts events per (app, event name, minute); the anomaly detector
+# (app/workers/anomaly_detector.py) scores closed minutes against a fixed-size
+# baseline per series and records anomalies for the dashboard to poll.
+
+class EventCounterDB(Base):
+    __tablename__ = "event_counters"
+    __table_args__ = (
+        UniqueConstraint("app_key_id", "event_name_id", "minute_ms", name="uq_event_counters_series_minute"),
+        # Detector reads one closed minute range at a time
+        Index("ix_event_counters_minute", "minute_ms"),
+    )
+
+    id = Column(BigIntId, Identity(), primary_key=True)
+    app_key_id = Column(Integer, ForeignKey("app_keys.id"), nullable=False)
+    event_name_id = Column(Integer, ForeignKey("event_names.id"), nullable=False)
+    # Start of the UTC minute the events were received in (epoch ms)
+    minute_ms = Column(BigInteger, nullable=False)
+    count = Column(Integer, nullable=False)
+
+
+class AnomalyBaselineDB(Base):
+    """Detector state for one (app, event name) series (see app/analytics/anomaly.py)."""
+    __tablename__ = "anomaly_baselines"
+
+    app_key_id = Column(Integer, ForeignKey("app_keys.id"), primary_key=True, autoincrement=False)
+    event_name_id = Column(Integer, ForeignKey("event_names.id"), primary_key=True, autoincrement=False)
+    last_minute_ms = Column(BigInteger, nullable=False)
+    observations = Column(Integer, nullable=False)
+    mean = Column(Float, nullable=False)
+    variance = Column(Float, nullable=False)
+    # 24 hour-of-day means and their observation counts
+    seasonal = Column(JSON, nullable=False)
+    seasonal_counts = Column(JSON, nullable=False)
+    # Anomaly still being extended while consecutive minutes stay anomalous
+    open_anomaly_id = Column(Integer, nullable=True)
+
+
+class AnomalyDB(Base):
+    __tablename__ = "anomalies"
+    __table_args__ = (
+        # Dashboard polling: WHERE api_key = ? AND updated_at > ?
+        Index("ix_anomalies_api_key_updated_at", "api_key", "updated_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    api_key = Column(String, nullable=False)
+    event_name = Column(String, nullable=False)
+    is_error = Column(Boolean, nullable=False, default=False)
+    # "warning" or "critical"
+    severity = Column(String, nullable=False)
+    # [start_ms, end_ms): the anomalous minutes
+    start_ms = Column(BigInteger, nullable=False)
+    end_ms = Column(BigInteger, nullable=False)
+    # Peak minute: events seen, baseline expectation and its z-score
+    observed = Column(Integer, nullable=False)
+    expected = Column(Float, nullable=False)
+    score = Column(Float, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc),
+                        onupdate=lambda: datetime.now(timezone.utc))
+
+
+class WorkerStateDB(Base):
+    """High-water mark for an incremental background worker (one row per worker)."""
+    __tablename__ = "worker_state"
+
+    name = Column(String, primary_key=True)
+    watermark_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc),
+                        onupdate=lambda: datetime.now(timezone.utc))
+
+
+# ============ Bulk Imports ============
+# Historical backfills (app/workers/bulk_import.py); one row per import, updated
+# after every chunk so any API process can report progress.
+
+IMPORT_QUEUED = "queued"
+IMPORT_RUNNING = "running"
+IMPORT_SUCCEEDED = "succeeded"
+IMPORT_FAILED = "failed"
+
+
+class BulkImportDB(Base):
+    __tablename__ = "bulk_imports"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    api_key = Column(String, nullable=False)
+    source = Column(String, nullable=False)
+    format = Column(String, nullable=False)
+    status = Column(String, nullable=False, default=IMPORT_QUEUED)
+
+    rows_read = Column(BigInteger, nullable=False, default=0)
+    rows_inserted = Column(BigInteger, nullable=False, default=0)
+    rows_duplicate = Column(BigInteger, nullable=False, default=0)
+    rows_invalid = Column(BigInteger, nullable=False, default=0)
+    # First few validation errors ("line 12: timestamp_ms must be an integer")
+    errors = Column(JSON, nullable=True)
+    error = Column(String, nullable=True)
+
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc),
+                        onupdate=lambda: datetime.now(timezone.utc))
@@ -0,0 +1,246 @@
+"""
+Schema Setup
+
+Creates missing tables and moves tables from older, incompatible layouts out of
+the way first (`create_all` never alters an existing table):
+
+- `events` with string columns (api_key/event_name/session_id) is renamed to
+  `events_legacy`; copy its rows into the dictionary-encoded layout with
+  `python -m app.db.migrate_legacy_events`.
+- `sessions` keyed by api_key/session_id is dropped (it is derived data) and
+  the sessionizer's high-water mark reset so it is rebuilt.
+
+New nullable columns and new indexes on existing tables are added in place, and
+one-off data fixes run once (recorded in `worker_state`).
+
+Setup ends by recording a fingerprint of the models (tables, columns, indexes,
+data fixes) in `worker_state`. `ensure_schema`, which API and worker processes
+call at startup, only checks for that row: a worker joining an up-to-date
+database costs one query instead of reflecting every table. When the models
+changed, one process runs the setup while the others wait (a Postgres advisory
+lock) and then find the new fingerprint. With SCHEMA_SETUP=migrate processes
+skip even that check and `python -m app.db.migrate` is run once per deploy.
+Maintenance that takes part of the schema away for a while (bulk imports
+dropping indexes) calls `invalidate_schema` first, so the next setup puts it
+back even if that maintenance never finishes.
+"""
+
+import hashlib
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateIndex
+
+from app.db.models import Base
+
+logger = logging.getLogger(__name__)
+
+LEGACY_EVENTS_TABLE = "events_legacy"
+
+# pg_advisory_lock key serializing schema setup across processes
+_SCHEMA_LOCK_KEY = 726_001
+
+
+def init_schema(bind: Engine) -> None:
+    """Bring the database schema up to date (safe to call repeatedly)."""
+    _retire_legacy_tables(bind)
+    Base.metadata.create_all(bind=bind)
+    _add_missing_columns(bind)
+    _add_missing_indexes(bind)
+    _run_data_fixes(bind)
+    _record_fingerprint(bind)
+
+
+def ensure_schema(bind: Engine) -> bool:
+    """
+    Run `init_schema` unless the database already has the current models.
+
+    Returns:
+        True if the setup ran in this process.
+    """
+    if _has_fingerprint(bind):
+        return False
+    with _schema_lock(bind):
+        if _has_fingerprint(bind):
+            return False  # another process finished it while we waited
+        init_schema(bind)
+    return True
+
+
+def invalidate_schema(bind: Engine) -> None:
+    """Forget the recorded fingerprint, so the next `ensure_schema` runs the full setup."""
+    with bind.begin() as conn:
+        conn.execute(text("DELETE FROM worker_state WHERE name LIKE 'schema:%'"))
+
+
+def schema_fingerprint() -> str:
+    """Short hash of the models and data fixes (changes whenever setup has work to do)."""
+    parts = []
+    for table in Base.metadata.sorted_tables:
+        parts.append(table.name)
+        parts.extend(f"{c.name}:{c.type!r}:{c.nullable}" for c in table.columns)
+        parts.extend(sorted(i.name for i in table.indexes))
+    parts.extend(name for name, _sql in _DATA_FIXES)
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()[:16]
+
+
+def _fingerprint_marker() -> str:
+    return f"schema:{schema_fingerprint()}"
+
+
+def _has_fingerprint(bind: Engine) -> bool:
+    try:
+        with bind.connect() as conn:
+            row = conn.execute(
+                text("SELECT 1 FROM worker_state WHERE name = :name"), {"name": _fingerprint_marker()}
+            ).first()
+        return row is not None
+    except Exception:
+        # No worker_state table yet: a fresh database.
+        return False
+
+
+def _record_fingerprint(bind: Engine) -> None:
+    marker = _fingerprint_marker()
+    with bind.begin() as conn:
+        conn.execute(
+            text("DELETE FROM worker_state WHERE name LIKE 'schema:%' AND name != :name"), {"name": marker}
+        )
+        if conn.execute(text("SELECT 1 FROM worker_state WHERE name = :name"), {"name": marker}).first() is None:
+            conn.execute(
+                text("INSERT INTO worker_state (name, watermark_at, updated_at) VALUES (:name, :now, :now)"),
+                {"name": marker, "now": datetime.now(timezone.utc).replace(tzinfo=None)},
+            )
+
+
+@contextmanager
+def _schema_lock(bind: Engine):
+    if bind.dialect.name != "postgresql":
+        yield
+        return
+    with bind.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _SCHEMA_LOCK_KEY})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _SCHEMA_LOCK_KEY})
+            conn.commit()
+
+
+def _add_missing_columns(bind: Engine) -> None:
+    """Add nullable model columns that an existing table doesn't have yet."""
+    inspector = inspect(bind)
+    tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable or column.primary_key:
+                continue
+            col_type = column.type.compile(dialect=bind.dialect)
+            try:
+                with bind.begin() as conn:
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}"))
+                logger.info("Added column %s.%s", table.name, column.name)
+            except Exception:
+                # Another worker may have added it concurrently.
+                logger.exception("Could not add column %s.%s", table.name, column.name)
+
+
+def dialect_indexes(table, bind: Engine) -> list:
+    """A table's indexes, minus those limited to another database with `Index.ddl_if`."""
+    dialect = bind.dialect.name
+    return [
+        index for index in table.indexes
+        if index._ddl_if is None or index._ddl_if.dialect in (None, dialect)
+    ]
+
+
+def _add_missing_indexes(bind: Engine) -> None:
+    """Create model indexes that an existing table doesn't have yet."""
+    # IF NOT EXISTS rather than inspecting: reflection skips expression indexes.
+    for table in Base.metadata.sorted_tables:
+        for index in dialect_indexes(table, bind):
+            try:
+                with bind.begin() as conn:
+                    conn.execute(CreateIndex(index, if_not_exists=True))
+            except Exception:
+                logger.exception("Could not create index %s", index.name)
+
+
+# (name, SQL) pairs; each runs once per database.
+_DATA_FIXES = [
+    # Snapshots used to be stored as JSON 'null' instead of SQL NULL.
+    (
+        "fix:insights_null_snapshots",
+        "UPDATE insights SET analytics_snapshot = NULL WHERE CAST(analytics_snapshot AS TEXT) = 'null'",
+    ),
+]
+
+
+def _run_data_fixes(bind: Engine) -> None:
+    for name, sql in _DATA_FIXES:
+        try:
+            with bind.begin() as conn:
+                done = conn.execute(text("SELECT 1 FROM worker_state WHERE name = :name"), {"name": name}).first()
+                if done:
+                    continue
+                conn.execute(text(sql))
+                conn.execute(
+                    text("INSERT INTO worker_state (name, watermark_at, updated_at) VALUES (:name, :now, :now)"),
+                    {"name": name, "now": datetime.now(timezone.utc).replace(tzinfo=None)},
+                )
+            logger.info("Applied data fix %s", name)
+        except Exception:
+            # Another worker may be applying it concurrently; it is retried on the next start.
+            logger.exception("Data fix %s failed", name)
+
+
+def _retire_legacy_tables(bind: Engine) -> None:
+    inspector = inspect(bind)
+    tables = set(inspector.get_table_names())
+
+    try:
+        with bind.begin() as conn:
+            if "events" in tables and _has_column(inspector, "events", "event_name"):
+                if LEGACY_EVENTS_TABLE in tables:
+                    raise RuntimeError(
+                        f"Both events (legacy layout) and {LEGACY_EVENTS_TABLE} exist; "
+                        "finish migrate_legacy_events before upgrading again"
+                    )
+                conn.execute(text(f"ALTER TABLE events RENAME TO {LEGACY_EVENTS_TABLE}"))
+                logger.warning(
+                    "Renamed legacy events table to %s; run `python -m app.db.migrate_legacy_events`",
+                    LEGACY_EVENTS_TABLE,
+                )
+
+            if "sessions" in tables and _has_column(inspector, "sessions", "api_key"):
+                conn.execute(text("DROP TABLE sessions"))
+                if "worker_state" in tables:
+                    conn.execute(text("DELETE FROM worker_state WHERE name = 'sessionizer'"))
+                logger.warning("Dropped legacy sessions table; the sessionizer will rebuild it")
+    except RuntimeError:
+        raise
+    except Exception:
+        # Fine if another worker retired the tables concurrently; anything else
+        # (a failed rename, a lock timeout) must stop setup before create_all
+        # builds the new layout next to tables it could not move.
+        if _has_legacy_tables(bind):
+            raise
+        logger.info("Legacy tables were retired by another process")
+
+
+def _has_legacy_tables(bind: Engine) -> bool:
+    inspector = inspect(bind)
+    tables = set(inspector.get_table_names())
+    return (
+        ("events" in tables and _has_column(inspector, "events", "event_name"))
+        or ("sessions" in tables and _has_column(inspector, "sessions", "api_key"))
+    )
+
+
+def _has_column(inspector, table: str, column: str) -> bool:
+    return any(c["name"] == column for c in inspector.get_columns(table))
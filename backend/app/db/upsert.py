@@ -0,0 +1,50 @@
+"""
+Dialect-Aware Insert Helpers
+
+`INSERT ... ON CONFLICT` is spelled the same on Postgres and SQLite but lives in
+dialect-specific SQLAlchemy modules; these helpers pick the right one for the
+session's bind so storage code stays database-agnostic.
+"""
+
+from typing import List, Sequence
+from sqlalchemy.orm import Session
+
+
+def dialect_insert(db: Session, model):
+    """Return a dialect-specific `insert(model)` supporting `on_conflict_*`."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
+
+def insert_ignore_conflicts(
+    db: Session,
+    model,
+    rows: List[dict],
+    index_elements: Sequence[str],
+) -> None:
+    """Insert rows, silently skipping any that violate the given unique key."""
+    if not rows:
+        return
+    stmt = dialect_insert(db, model).on_conflict_do_nothing(index_elements=list(index_elements))
+    db.execute(stmt, rows)
+
+
+def upsert_increment(
+    db: Session,
+    model,
+    rows: List[dict],
+    index_elements: Sequence[str],
+    column: str,
+) -> None:
+    """Insert rows; where the unique key already exists, add the row's `column` to the stored value."""
+    if not rows:
+        return
+    stmt = dialect_insert(db, model)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(index_elements),
+        set_={column: model.__table__.c[column] + stmt.excluded[column]},
+    )
+    db.execute(stmt, rows)
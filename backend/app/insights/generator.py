@@ -12,54 +12,35 @@ The rule-based engines (insight_diff.py) determine what changed.
 This module explains WHY it matters and WHAT to do about it.
 """
 
+from app.insights.llm import KIND_DIFF, KIND_INSIGHT, KIND_TREND, LLMError, get_llm_client
 from app.insights.models import InsightResponse, InsightTrendResponse
-from app.core.config import LLM_PROVIDER, OPENAI_API_KEY
-from openai import OpenAI
+from app.insights.serialization import compact_json, serialize_diff
 import json
 import re
 
+SYSTEM_PROMPT = "You are a senior product analytics expert."
+SYSTEM_PROMPT_JSON = "You are a senior product analytics expert. Respond only with valid JSON."
+
 
 def generate_insights(prompt: str) -> InsightResponse:
     """Generate insights from an analytics snapshot."""
-    if LLM_PROVIDER == "openai":
-        return generate_with_openai(prompt)
-    # Always return a structured response (never hang / return None)
-    return InsightResponse(
-        summary="LLM insights are not configured (LLM_PROVIDER != openai).",
-        insights=[],
-        recommendations=[],
-    )
+    return generate_with_llm(prompt)
 
 
-def generate_with_openai(prompt: str, mode: str = "default"):
+def generate_with_llm(prompt: str, mode: str = "default"):
     """
-    Call OpenAI API to generate insights.
+    Call the shared LLM client (see llm.py) to generate insights.
     
     Args:
         prompt: The prompt to send to the LLM
         mode: "default" for InsightResponse, "trend" for InsightTrendResponse
     """
-    # Bound LLM latency so the API never hangs long enough to time out in cloud.
-    # If OpenAI is slow/unavailable, we return a safe structured fallback.
-    client = OpenAI(api_key=OPENAI_API_KEY, timeout=10.0, max_retries=0)
-
+    # Always return a structured response (never hang / return None):
+    # if the LLM is slow/unavailable, we return a safe structured fallback.
+    kind = KIND_TREND if mode == "trend" else KIND_INSIGHT
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a senior product analytics expert."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            temperature=0.3
-        )
-        content = response.choices[0].message.content
-    except Exception as e:
+        content = get_llm_client().complete(SYSTEM_PROMPT, prompt, kind=kind)
+    except LLMError:
         if mode == "trend":
             return InsightTrendResponse(
                 summary="LLM request failed or timed out.",
@@ -78,8 +59,6 @@ def generate_with_openai(prompt: str, mode: str = "default"):
     return parse_llm_response(content)
 
 
-
-
 def parse_llm_response(text: str) -> InsightResponse:
     """Parse LLM response into InsightResponse model."""
     try:
@@ -118,15 +97,7 @@ def _clean_llm_json(text: str) -> str:
 
 def generate_trend_insights(prompt: str) -> InsightTrendResponse:
     """Generate trend insights from historical data."""
-    if LLM_PROVIDER == "openai":
-        return generate_with_openai(prompt, mode="trend")
-
-    return InsightTrendResponse(
-        summary="Insufficient data to identify clear trends.",
-        changes=[],
-        risks=[],
-        opportunities=[]
-    )
+    return generate_with_llm(prompt, mode="trend")
 
 
 def explain_diff(diff: dict) -> dict:
@@ -159,13 +130,13 @@ Analyze these detected changes in user behavior and provide actionable insights.
 ## Detected Changes (Factual Data):
 
 Metrics Changed:
-{json.dumps(diff.get('metrics_changed', {}), indent=2)}
+{serialize_diff(diff.get('metrics_changed', {}))}
 
 Issues Identified:
-{diff.get('issues', [])}
+{compact_json(diff.get('issues', []))}
 
 Improvements Observed:
-{diff.get('improvements', [])}
+{compact_json(diff.get('improvements', []))}
 
 Overall Trend: {diff.get('overall_trend', 'unknown')}
 
@@ -183,39 +154,24 @@ Respond with VALID JSON ONLY (no markdown):
 }}
 """
 
-    if LLM_PROVIDER == "openai":
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system", 
-                    "content": "You are a senior product analytics expert. Respond only with valid JSON."
-                },
-                {
-                    "role": "user", 
-                    "content": prompt
-                }
-            ],
-            temperature=0.3
-        )
-        
-        content = response.choices[0].message.content
-        
-        try:
-            cleaned = _clean_llm_json(content)
-            return json.loads(cleaned)
-        except Exception:
-            # If JSON parsing fails, return a structured fallback
-            return {
-                "interpretation": content,
-                "likely_causes": [],
-                "recommended_actions": [],
-                "priority": "medium"
-            }
-    
-
-
-
+    try:
+        content = get_llm_client().complete(SYSTEM_PROMPT_JSON, prompt, kind=KIND_DIFF)
+    except LLMError:
+        return {
+            "interpretation": "LLM request failed or timed out.",
+            "likely_causes": [],
+            "recommended_actions": [],
+            "priority": "medium"
+        }
 
+    try:
+        cleaned = _clean_llm_json(content)
+        return json.loads(cleaned)
+    except Exception:
+        # If JSON parsing fails, return a structured fallback
+        return {
+            "interpretation": content,
+            "likely_causes": [],
+            "recommended_actions": [],
+            "priority": "medium"
+        }
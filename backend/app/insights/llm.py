@@ -0,0 +1,339 @@
+"""
+LLM Client
+
+One shared LLM client per process, used by app/insights/generator.py:
+
+- a single `AsyncOpenAI` client (one HTTP connection pool, reused TLS
+  connections) running on a background event loop thread, so sync callers
+  (request handlers, job workers) and async callers share it
+- a per-request timeout (LLM_TIMEOUT_SECONDS) and a semaphore bounding
+  requests in flight (LLM_MAX_CONCURRENCY)
+- responses cached by a hash of the prompt: an in-memory LRU in front of the
+  `llm_responses` table, and concurrent identical prompts share one request,
+  so an identical snapshot or diff never pays for a second round trip
+- a mock provider (LLM_PROVIDER=mock, the default) that answers offline with
+  fixed JSON, optionally after LLM_MOCK_LATENCY_MS, for tests and benchmarks
+
+Callers get the raw completion text (or an `LLMError`) and do their own parsing.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from app.core.config import (
+    LLM_CACHE_MAX_ENTRIES,
+    LLM_CACHE_TTL_SECONDS,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_RETRIES,
+    LLM_MOCK_LATENCY_MS,
+    LLM_MODEL,
+    LLM_PROVIDER,
+    LLM_TIMEOUT_SECONDS,
+    OPENAI_API_KEY,
+)
+
+logger = logging.getLogger(__name__)
+
+# Response kinds, used by the mock provider to answer in the expected shape.
+KIND_INSIGHT = "insight"
+KIND_TREND = "trend"
+KIND_DIFF = "diff"
+
+
+class LLMError(Exception):
+    """The LLM request failed or timed out."""
+
+
+# =============================================================================
+# Providers
+# =============================================================================
+
+class OpenAIProvider:
+    """Chat completions through one pooled AsyncOpenAI client."""
+
+    name = "openai"
+
+    def __init__(self, model: str = LLM_MODEL):
+        self.model = model
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            from openai import AsyncOpenAI
+
+            self._client = AsyncOpenAI(
+                api_key=OPENAI_API_KEY,
+                timeout=LLM_TIMEOUT_SECONDS,
+                max_retries=LLM_MAX_RETRIES,
+            )
+        return self._client
+
+    async def complete(self, system: str, prompt: str, kind: str) -> str:
+        response = await self._get_client().chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": prompt},
+            ],
+            temperature=0.3,
+        )
+        return response.choices[0].message.content or ""
+
+
+class MockProvider:
+    """Offline provider returning fixed, well-formed JSON for each response kind."""
+
+    name = "mock"
+    model = "mock"
+
+    _RESPONSES = {
+        KIND_INSIGHT: {
+            "summary": "LLM insights are not configured (LLM_PROVIDER != openai).",
+            "insights": [],
+            "recommendations": [],
+        },
+        KIND_TREND: {
+            "summary": "Insufficient data to identify clear trends.",
+            "changes": [],
+            "risks": [],
+            "opportunities": [],
+        },
+        KIND_DIFF: {
+            "interpretation": "LLM explanations are not configured (LLM_PROVIDER != openai).",
+            "likely_causes": [],
+            "recommended_actions": [],
+            "priority": "low",
+        },
+    }
+
+    def __init__(self, latency_ms: float = LLM_MOCK_LATENCY_MS):
+        self.latency_ms = latency_ms
+
+    async def complete(self, system: str, prompt: str, kind: str) -> str:
+        if self.latency_ms > 0:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return json.dumps(self._RESPONSES.get(kind, self._RESPONSES[KIND_INSIGHT]))
+
+
+def _create_provider():
+    if LLM_PROVIDER == "openai":
+        return OpenAIProvider()
+    return MockProvider()
+
+
+# =============================================================================
+# Cache
+# =============================================================================
+
+class _ResponseCache:
+    """In-memory LRU in front of the `llm_responses` table."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                response, expires_at = entry
+                if expires_at >= time.monotonic():
+                    self._memory.move_to_end(key)
+                    return response
+                del self._memory[key]
+
+        response = self._db_get(key)
+        if response is not None:
+            self._remember(key, response)
+        return response
+
+    def put(self, key: str, model: str, response: str) -> None:
+        if not self.enabled:
+            return
+        self._remember(key, response)
+        self._db_put(key, model, response)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+
+    def _remember(self, key: str, response: str) -> None:
+        with self._lock:
+            self._memory[key] = (response, time.monotonic() + self.ttl_seconds)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _db_get(self, key: str) -> Optional[str]:
+        from app.db.database import SessionLocal
+        from app.db.models import LLMResponseDB
+
+        # created_at is stored without tzinfo (UTC); compare like with like.
+        fresh_after = (datetime.now(timezone.utc) - timedelta(seconds=self.ttl_seconds)).replace(tzinfo=None)
+        db = SessionLocal()
+        try:
+            row = db.get(LLMResponseDB, key)
+            if row is None or row.created_at is None or row.created_at < fresh_after:
+                return None
+            return row.response
+        except Exception:
+            logger.exception("LLM cache read failed")
+            return None
+        finally:
+            db.close()
+
+    def _db_put(self, key: str, model: str, response: str) -> None:
+        from app.db.database import SessionLocal
+        from app.db.models import LLMResponseDB
+
+        db = SessionLocal()
+        try:
+            db.merge(LLMResponseDB(
+                prompt_hash=key,
+                model=model,
+                response=response,
+                created_at=datetime.now(timezone.utc),
+            ))
+            db.commit()
+        except Exception:
+            # Another process may have stored the same prompt concurrently.
+            db.rollback()
+            logger.debug("LLM cache write skipped", exc_info=True)
+        finally:
+            db.close()
+
+
+def prompt_hash(provider: str, model: str, system: str, prompt: str) -> str:
+    payload = "\x1f".join((provider, model, system, prompt))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# =============================================================================
+# Client
+# =============================================================================
+
+class LLMClient:
+    """
+    Shared client: cache lookup, single-flight for identical prompts, bounded
+    concurrency and timeouts around a provider.
+
+    `complete` is for sync code and blocks the calling thread only (the request
+    itself runs on the client's event loop thread); `complete_async` is for code
+    already running on an event loop.
+    """
+
+    def __init__(self, provider=None):
+        self.provider = provider or _create_provider()
+        self.cache = _ResponseCache(LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL_SECONDS)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    def complete(self, system: str, prompt: str, kind: str = KIND_INSIGHT) -> str:
+        key = prompt_hash(self.provider.name, self.provider.model, system, prompt)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        future = asyncio.run_coroutine_threadsafe(self._request(key, system, prompt, kind), self._get_loop())
+        try:
+            # Slack over the request timeout for time spent waiting on the semaphore.
+            return future.result(timeout=LLM_TIMEOUT_SECONDS * 3)
+        except LLMError:
+            raise
+        except Exception as exc:
+            future.cancel()
+            raise LLMError(str(exc) or type(exc).__name__) from exc
+
+    async def complete_async(self, system: str, prompt: str, kind: str = KIND_INSIGHT) -> str:
+        return await asyncio.to_thread(self.complete, system, prompt, kind)
+
+    async def _request(self, key: str, system: str, prompt: str, kind: str) -> str:
+        # Identical prompts already being requested share that request.
+        shared = self._in_flight.get(key)
+        if shared is not None:
+            return await asyncio.shield(shared)
+
+        shared = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = shared
+        try:
+            async with self._semaphore:
+                response = await asyncio.wait_for(
+                    self.provider.complete(system, prompt, kind),
+                    timeout=LLM_TIMEOUT_SECONDS,
+                )
+        except Exception as exc:
+            if isinstance(exc, asyncio.TimeoutError):
+                error = LLMError(f"LLM request timed out after {LLM_TIMEOUT_SECONDS}s")
+            else:
+                error = LLMError(str(exc) or type(exc).__name__)
+            shared.set_exception(error)
+            shared.exception()  # mark retrieved when nobody else was waiting
+            raise error from exc
+        else:
+            shared.set_result(response)
+        finally:
+            self._in_flight.pop(key, None)
+            if not shared.done():
+                # Cancelled (the owning caller gave up): waiters must not hang.
+                shared.set_exception(LLMError("LLM request was cancelled"))
+                shared.exception()
+
+        await asyncio.to_thread(self.cache.put, key, self.provider.model, response)
+        return response
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is not None:
+            return self._loop
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run() -> None:
+                    asyncio.set_event_loop(loop)
+                    self._semaphore = asyncio.Semaphore(max(1, LLM_MAX_CONCURRENCY))
+                    ready.set()
+                    loop.run_forever()
+
+                threading.Thread(target=run, name="llm-client", daemon=True).start()
+                ready.wait()
+                self._loop = loop
+        return self._loop
+
+
+_client: Optional[LLMClient] = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """The process-wide LLM client (created on first use)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient()
+    return _client
+
+
+def warm_up() -> None:
+    """Create the client (and, for OpenAI, import the SDK) before the first insight request."""
+    client = get_llm_client()
+    if isinstance(client.provider, OpenAIProvider):
+        client.provider._get_client()
@@ -5,12 +5,14 @@ These models define the expected JSON structure returned by the LLM layer.
 Keeping this strict lets the API validate and persist insights safely.
 """
 
-from pydantic import BaseModel
-from typing import Dict, Any, List
+from pydantic import BaseModel, Field
+from typing import Dict, Any, List, Optional
 
 class InsightRequest(BaseModel):
     """Request payload for generating a new insight for an app/api_key."""
     api_key: str
+    # Build the snapshot from a fraction of sessions (faster on large apps); None = exact
+    sample: Optional[float] = Field(None, gt=0, le=1)
 
 class InsightResponse(BaseModel):
     """Structured insight returned from the LLM (summary + bullet insights + recommendations)."""
@@ -3,11 +3,14 @@ LLM Prompt Builders
 
 Small helpers that turn structured analytics data into LLM prompts.
 All prompt builders instruct the model to return strict JSON (no markdown) so the
-backend can parse responses deterministically.
+backend can parse responses deterministically. Data is embedded as compact,
+size-bounded JSON (see serialization.py).
 """
 
 from typing import Dict, Any
 
+from app.insights.serialization import serialize_history, serialize_snapshot
+
 def build_insight_prompt(analytics_snapshot: dict) -> str:
     """Build a prompt to generate a single InsightResponse from a snapshot."""
     return f"""
@@ -24,8 +27,8 @@ You are a senior product analytics expert.
 
 Analyze the following analytics data and produce actionable insights.
 
-Analytics snapshot:
-{analytics_snapshot}
+Analytics snapshot (JSON):
+{serialize_snapshot(analytics_snapshot)}
 """
 def build_trend_prompt(insights: list[dict]) -> str:
     """Build a prompt to generate InsightTrendResponse from historical insights."""
@@ -47,6 +50,6 @@ Return fields:
 - risks (array)
 - opportunities (array)
 
-Historical insights:
-{insights}
+Historical insights (JSON):
+{serialize_history(insights)}
 """
@@ -0,0 +1,232 @@
+"""
+Prompt Serialization
+
+Turns snapshots, insight histories and diffs into compact, deterministic JSON
+for LLM prompts, so prompt size (and with it LLM latency and cost) stays flat as
+apps grow:
+
+- compact JSON (sorted keys, no whitespace), identical input -> identical
+  text, which also makes the LLM response cache (llm.py) hit
+- floats rounded to 4 decimals
+- only the top PROMPT_TOP_PATHS paths and PROMPT_TOP_FUNNELS funnels, with
+  the remainder summarized
+- histories without their nested analytics snapshots (only headline metrics)
+- a token budget (PROMPT_TOKEN_BUDGET): the top-K limits are halved until the
+  data fits; data still over budget after that loses whole list items and
+  keys, largest first, until it fits (logged), so it stays valid JSON
+
+Every serialization records its size in the `llm_prompt_data_*` metrics
+(`GET /metrics`, app/core/metrics.py).
+"""
+
+import json
+import logging
+from typing import Any, Callable, List
+
+from app.core import metrics
+from app.core.config import METRICS_ENABLED, PROMPT_TOKEN_BUDGET, PROMPT_TOP_FUNNELS, PROMPT_TOP_PATHS
+
+logger = logging.getLogger(__name__)
+
+FLOAT_DIGITS = 4
+
+# Rough token estimate for English/JSON text with GPT-style tokenizers.
+CHARS_PER_TOKEN = 4
+
+# Snapshot fields that summarize a past insight in a history prompt
+HISTORY_METRICS = ("conversion_rate", "avg_time_to_complete_ms", "unique_paths", "error_count", "sample")
+
+
+def compact_json(data: Any) -> str:
+    """Deterministic, whitespace-free JSON with rounded floats."""
+    return json.dumps(
+        round_numbers(data),
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str,
+    )
+
+
+def round_numbers(data: Any, digits: int = FLOAT_DIGITS) -> Any:
+    if isinstance(data, float):
+        return round(data, digits)
+    if isinstance(data, dict):
+        return {key: round_numbers(value, digits) for key, value in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [round_numbers(value, digits) for value in data]
+    return data
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+# =============================================================================
+# Snapshot / history compaction
+# =============================================================================
+
+def compact_snapshot(snapshot: dict, top_paths: int = PROMPT_TOP_PATHS, top_funnels: int = PROMPT_TOP_FUNNELS) -> dict:
+    """Copy of a snapshot limited to its top paths and funnels (by session count)."""
+    result = {key: value for key, value in snapshot.items() if key not in ("api_key", "paths", "funnels")}
+
+    paths = sorted((snapshot.get("paths") or {}).items(), key=lambda item: (-item[1], item[0]))
+    result["paths"] = dict(paths[:top_paths])
+    if len(paths) > top_paths:
+        rest = paths[top_paths:]
+        result["other_paths"] = {"count": len(rest), "sessions": sum(count for _path, count in rest)}
+
+    funnels = sorted(
+        (snapshot.get("funnels") or {}).items(),
+        key=lambda item: (-(item[1].get("sessions_entered") or 0), item[0]),
+    )
+    result["funnels"] = {name: _compact_funnel(funnel) for name, funnel in funnels[:top_funnels]}
+    if len(funnels) > top_funnels:
+        result["other_funnels"] = len(funnels) - top_funnels
+    return result
+
+
+def _compact_funnel(funnel: dict) -> dict:
+    compact = {
+        "steps": funnel.get("steps"),
+        "sessions_entered": funnel.get("sessions_entered"),
+        "sessions_completed": funnel.get("sessions_completed"),
+        "conversion_rate": funnel.get("conversion_rate"),
+    }
+    sample = funnel.get("sample")
+    if sample:
+        compact["conversion_rate_ci"] = sample.get("conversion_rate_ci")
+    return compact
+
+
+def compact_history(history: List[dict], max_items_per_list: int = 5) -> List[dict]:
+    """Past insights without nested snapshots: text plus a few headline metrics."""
+    result = []
+    for item in history:
+        snapshot = item.get("analytics_snapshot") or {}
+        entry = {
+            "created_at": item.get("created_at"),
+            "summary": item.get("summary"),
+            "insights": (item.get("insights") or [])[:max_items_per_list],
+            "recommendations": (item.get("recommendations") or [])[:max_items_per_list],
+        }
+        headline = {key: snapshot[key] for key in HISTORY_METRICS if snapshot.get(key) is not None}
+        if headline:
+            entry["metrics"] = headline
+        result.append(entry)
+    return result
+
+
+# =============================================================================
+# Budgeted serialization
+# =============================================================================
+
+def serialize_snapshot(snapshot: dict, budget: int = PROMPT_TOKEN_BUDGET) -> str:
+    """Compact snapshot JSON within `budget` tokens (top-K limits halved until it fits)."""
+    return _fit(
+        "snapshot",
+        lambda level: compact_snapshot(
+            snapshot,
+            top_paths=PROMPT_TOP_PATHS >> level,
+            top_funnels=max(1, PROMPT_TOP_FUNNELS >> level),
+        ),
+        budget,
+    )
+
+
+def serialize_history(history: List[dict], budget: int = PROMPT_TOKEN_BUDGET) -> str:
+    """Compact history JSON within `budget` tokens (fewer list items, then fewer insights)."""
+    compact = compact_history(history)
+
+    def shrink(level: int) -> List[dict]:
+        per_list = max(1, 5 >> level)
+        keep = max(2, len(compact) >> max(0, level - 2))
+        return [
+            {**entry, "insights": entry["insights"][:per_list], "recommendations": entry["recommendations"][:per_list]}
+            for entry in compact[:keep]
+        ]
+
+    return _fit("history", shrink, budget)
+
+
+def serialize_diff(diff: dict, budget: int = PROMPT_TOKEN_BUDGET) -> str:
+    """Compact diff JSON (diffs are small and bounded by the metrics compared)."""
+    return _fit("diff", lambda _level: diff, budget, max_level=0)
+
+
+def _fit(kind: str, build: Callable[[int], Any], budget: int, max_level: int = 8) -> str:
+    level = 0
+    data = build(level)
+    text = compact_json(data)
+    while estimate_tokens(text) > budget and level < max_level:
+        level += 1
+        data = build(level)
+        text = compact_json(data)
+    truncated = estimate_tokens(text) > budget
+    if truncated:
+        logger.warning(
+            "prompt data kind=%s est_tokens=%d over budget %d after shrinking; dropping items",
+            kind, estimate_tokens(text), budget,
+        )
+        data = round_numbers(data)  # a copy: the caller's data is left alone
+        while estimate_tokens(text) > budget and _drop_items(data, len(text) - budget * CHARS_PER_TOKEN):
+            text = compact_json(data)
+    _record(kind, text, level, truncated)
+    return text
+
+
+def _drop_items(data: Any, excess_chars: int) -> bool:
+    """
+    Remove whole list items or dict entries from `data`, largest first.
+
+    Children that make up most of their container are shrunk from the inside
+    (so a big list loses items rather than the whole list), by up to
+    `excess_chars` and only until they stop dominating; otherwise one child
+    of `data` itself is removed. The caller repeats until the data fits.
+
+    Returns:
+        False if there was nothing left to remove.
+    """
+    node, allowance = data, None
+    while isinstance(node, (dict, list)) and node:
+        keys = node.keys() if isinstance(node, dict) else range(len(node))
+        # (size, key), largest first; ties drop the later list item, or the later key
+        sizes = sorted(((_entry_size(node, key), key) for key in keys), reverse=True)
+        largest, key = sizes[0]
+        rest = sum(size for size, _key in sizes[1:])
+        child = node[key]
+        if isinstance(child, (dict, list)) and child and largest > rest:
+            node = child
+            allowance = min(excess_chars if allowance is None else allowance, largest - rest)
+            continue
+
+        dropped, saved = [], 0
+        for size, key in sizes:
+            dropped.append(key)
+            saved += size + 1  # and its comma
+            if allowance is None or saved >= allowance:
+                break
+        for key in sorted(dropped, reverse=True):  # list indexes from the end
+            del node[key]
+        return True
+    return False
+
+
+def _entry_size(node: Any, key: Any) -> int:
+    # `data` is already rounded: plain dumps, without compact_json's copy
+    size = len(json.dumps(node[key], sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str))
+    if isinstance(node, dict):
+        size += len(json.dumps(key, ensure_ascii=False)) + 1
+    return size
+
+
+def _record(kind: str, text: str, shrink_level: int, truncated: bool) -> None:
+    tokens = estimate_tokens(text)
+    if METRICS_ENABLED:
+        labels = (("kind", kind),)
+        metrics.PROMPT_TOKENS.observe(labels, tokens)
+        if shrink_level:
+            metrics.PROMPT_SHRUNK.inc(labels)
+        if truncated:
+            metrics.PROMPT_TRUNCATED.inc(labels)
+    logger.info("prompt data kind=%s chars=%d est_tokens=%d shrink_level=%d", kind, len(text), tokens, shrink_level)
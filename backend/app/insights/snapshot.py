@@ -16,8 +16,12 @@ from app.analytics.path_analysis import analyze_paths
 from app.analytics.funnel import run_funnel_for_steps
 from app.analytics.dropoff import calculate_dropoff
 from app.analytics.time_analysis import calculate_time_to_complete
-from app.storage.insights import list_insights
+from app.core.deadline import Deadline
+from app.analytics.sampling import effective_rate, in_sample, sample_threshold, scale_count
+from app.storage.insights import get_insight_metrics, list_insights
 from app.storage.funnel_definitions import list_funnel_definitions
+from app.storage import cold
+from app.storage.dictionary import get_app_key_id, get_event_name_map
 from app.db.models import EventDB
 from sqlalchemy import func
 
@@ -31,6 +35,8 @@ def build_analytics_snapshot(
     include_dropoffs: bool = True,
     include_time: bool = True,
     include_error_count: bool = True,
+    sample: float | None = None,
+    deadline: Deadline | None = None,
 ) -> dict:
     """
     Build a comprehensive analytics snapshot for the given api_key.
@@ -42,6 +48,9 @@ def build_analytics_snapshot(
     Args:
         db: Database session
         api_key: The API key to filter data by
+        sample: Fraction of sessions to scan (see app/analytics/sampling.py);
+            counts are scaled back up. None means exact.
+        deadline: Request deadline shared by all scans (app/core/deadline.py).
         
     Returns:
         A dict containing:
@@ -52,6 +61,8 @@ def build_analytics_snapshot(
         - error_count: Number of error events
         - paths: List of user paths
         - funnels: Detailed funnel results
+        - sample: The sampled fraction of sessions (only when sampled)
+        - partial: True when the deadline cut the scans short (only then)
     """
     snapshot = {
         "api_key": api_key,
@@ -63,10 +74,13 @@ def build_analytics_snapshot(
         "paths": {},
         "funnels": {}
     }
+    threshold = sample_threshold(sample)
+    if threshold is not None:
+        snapshot["sample"] = round(effective_rate(threshold), 6)
     
     # 1. Analyze user paths (optional; can be expensive on large datasets)
     if include_paths:
-        paths = analyze_paths(db, max_depth=5, api_key=api_key)
+        paths = analyze_paths(db, max_depth=5, api_key=api_key, sample=sample, deadline=deadline)
         snapshot["paths"] = paths
         snapshot["unique_paths"] = len(paths)
     
@@ -81,7 +95,7 @@ def build_analytics_snapshot(
         steps = funnel_def.steps
         
         # Run funnel analysis
-        funnel_result = run_funnel_for_steps(steps, db, api_key=api_key)
+        funnel_result = run_funnel_for_steps(steps, db, api_key=api_key, sample=sample, deadline=deadline)
         snapshot["funnels"][funnel_name] = funnel_result
         
         # Use first funnel's conversion rate as primary metric
@@ -90,19 +104,23 @@ def build_analytics_snapshot(
         
         # Calculate drop-off rates (optional)
         if include_dropoffs:
-            dropoff_result = calculate_dropoff(steps, db, api_key=api_key)
+            dropoff_result = calculate_dropoff(steps, db, api_key=api_key, sample=sample, deadline=deadline)
             dropoff_rates = _calculate_dropoff_rates(dropoff_result, funnel_result)
             snapshot["dropoff_rates"].update(dropoff_rates)
         
         # Calculate time-to-complete for first funnel (optional)
         if include_time and snapshot["avg_time_to_complete_ms"] is None and len(steps) >= 2:
-            time_result = calculate_time_to_complete(steps[0], steps[-1], db, api_key=api_key)
+            time_result = calculate_time_to_complete(
+                steps[0], steps[-1], db, api_key=api_key, sample=sample, deadline=deadline
+            )
             snapshot["avg_time_to_complete_ms"] = time_result.get("average_ms")
     
     # 4. Count error events (optional)
     if include_error_count:
-        snapshot["error_count"] = _count_error_events(db, api_key)
-    
+        snapshot["error_count"] = _count_error_events(db, api_key, threshold)
+
+    if deadline is not None and deadline.cut_short:
+        snapshot["partial"] = True
     return snapshot
 
 
@@ -131,7 +149,7 @@ def _calculate_dropoff_rates(dropoff_result: dict, funnel_result: dict) -> dict:
     return dropoff_rates
 
 
-def _count_error_events(db: Session, api_key: str) -> int:
+def _count_error_events(db: Session, api_key: str, threshold: Optional[int] = None) -> int:
     """
     Count the number of error events for the given api_key.
     
@@ -140,19 +158,33 @@ def _count_error_events(db: Session, api_key: str) -> int:
     Args:
         db: Database session
         api_key: The API key to filter by
+        threshold: Sample bucket threshold (count sampled sessions only, then scale up)
         
     Returns:
         Count of error events
     """
     # PERF: count in SQL (no full event scan in Python).
-    # Use lower()+LIKE for broad compatibility.
-    return int(
+    # Match names against the small per-app dictionary, then count integer codes.
+    app_key_id = get_app_key_id(db, api_key)
+    if app_key_id is None:
+        return 0
+    error_codes = [
+        code for code, name in get_event_name_map(db, app_key_id).items()
+        if "error" in name.lower()
+    ]
+    if not error_codes:
+        return 0
+    query = (
         db.query(func.count(EventDB.id))
-        .filter(EventDB.api_key == api_key)
-        .filter(func.lower(EventDB.event_name).like("%error%"))
-        .scalar()
-        or 0
+        .filter(EventDB.app_key_id == app_key_id)
+        .filter(EventDB.event_name_id.in_(error_codes))
     )
+    if threshold is not None:
+        query = query.filter(in_sample(EventDB.session_key_id, threshold))
+    count = int(query.scalar() or 0)
+    if cold.cold_enabled():
+        count += cold.count_events(app_key_id, codes=error_codes, sample_threshold=threshold)
+    return scale_count(count, threshold)
 
 
 def build_insight_history_snapshot(db: Session, api_key: str, limit: int = 5) -> list:
@@ -165,17 +197,19 @@ def build_insight_history_snapshot(db: Session, api_key: str, limit: int = 5) ->
         limit: Maximum number of insights to return
         
     Returns:
-        List of insight summaries, ordered newest first
+        List of insight summaries, ordered newest first. `analytics_snapshot`
+        holds the snapshot's headline metrics (all that trend prompts use).
     """
-    history = list_insights(db, api_key)[:limit]
+    history = list_insights(db, api_key, limit=limit)
+    metrics = get_insight_metrics(db, history)
 
     return [
         {
             "summary": i.summary,
             "insights": i.insights,
             "recommendations": i.recommendations,
-            "analytics_snapshot": getattr(i, 'analytics_snapshot', None),
+            "analytics_snapshot": snapshot_metrics,
             "created_at": i.created_at.isoformat()
         }
-        for i in history
+        for i, snapshot_metrics in zip(history, metrics)
     ]
@@ -1,17 +1,60 @@
 """
 FastAPI Application Entry Point
 
-Creates the FastAPI app, configures CORS for the dashboard, initializes database
-tables, and mounts the API routers.
+Creates the FastAPI app, configures CORS for the dashboard, mounts the API
+routers, and on startup (lifespan) brings the schema up to date if needed,
+warms connections and caches in the background, and (in the default in-process
+mode) runs the insight job threads for the lifetime of the app.
+
+Importing this module does no I/O, so a new worker is ready to serve quickly.
 """
 
+import logging
+import threading
+from contextlib import ExitStack, asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import events, funnels, analytics, apps
-from app.db.database import engine
-from app.db.models import Base
+from app.api import admin, events, funnels, analytics, apps, metrics as metrics_api
+from app.core import auth, slow_queries
+from app.core.compression import GzipRequestMiddleware
+from app.core.metrics import TimingMiddleware, instrument_engine
+from app.core.config import INSIGHT_JOB_MODE, SCHEMA_SETUP, STARTUP_WARM_CONNECTIONS
+from app.db.database import analytics_engine, engine
+from app.db.schema import ensure_schema
+from app.workers import insight_jobs
+
+logger = logging.getLogger(__name__)
+
+
+def _warm_up() -> None:
+    """Open pooled connections, load the JWT library and JWKS, and create the LLM client."""
+    try:
+        with ExitStack() as stack:
+            for db_engine in {engine, analytics_engine}:
+                for _ in range(max(0, STARTUP_WARM_CONNECTIONS)):
+                    stack.enter_context(db_engine.connect())
+        auth.warm_up()
+        from app.insights import llm
+
+        llm.warm_up()
+    except Exception:
+        logger.warning("Startup warm-up failed", exc_info=True)
 
-app = FastAPI(title="User Behavior Analytics API")
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    if SCHEMA_SETUP == "startup":
+        ensure_schema(engine)
+    threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
+    if INSIGHT_JOB_MODE == "inprocess":
+        insight_jobs.start_pool()
+    try:
+        yield
+    finally:
+        insight_jobs.stop_pool()
+
+
+app = FastAPI(title="User Behavior Analytics API", lifespan=lifespan)
 
 # CORS configuration - allow frontend to make requests
 app.add_middleware(
@@ -27,11 +70,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allow all HTTP methods
     allow_headers=["*"],  # Allow all headers
+    expose_headers=["X-Next-Cursor", "Retry-After", "Server-Timing"],  # Insight history pagination, rate limits, timing
 )
 
-Base.metadata.create_all(bind=engine)
+# SDKs may gzip event batches (Content-Encoding: gzip)
+app.add_middleware(GzipRequestMiddleware)
+# Outermost: per-route latency (and Server-Timing) covers everything below
+app.add_middleware(TimingMiddleware)
+
+for _engine in {engine, analytics_engine}:
+    instrument_engine(_engine)
+    slow_queries.install(_engine)
 
 app.include_router(events.router)
 app.include_router(funnels.router)
 app.include_router(analytics.router)
 app.include_router(apps.router)
+app.include_router(metrics_api.router)
+app.include_router(admin.router)
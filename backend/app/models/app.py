@@ -22,6 +22,7 @@ class AppResponse(BaseModel):
     api_key: str
     name: str
     description: Optional[str]
+    retention_days: Optional[int] = None
     created_at: datetime
     updated_at: datetime
 
@@ -33,4 +34,7 @@ class AppUpdate(BaseModel):
     """Request model for updating an app."""
     name: Optional[str] = Field(None, min_length=1, max_length=100)
     description: Optional[str] = Field(None, max_length=500)
+    retention_days: Optional[int] = Field(
+        None, ge=1, le=3650, description="Days of events to keep (null = server default)"
+    )
 
@@ -46,6 +46,13 @@ class FunnelDefinition(BaseModel):
 class FunnelRequest(BaseModel):
     api_key: Optional[str] = None
     steps: List[str]
+    # Fraction of sessions to scan (deterministic per session); None = exact
+    sample: Optional[float] = Field(None, gt=0, le=1)
+    # Past the request deadline, return what was scanned (marked "partial") instead of 503
+    allow_partial: bool = False
+    # Segment: only sessions with an event on this platform / with these property values
+    platform: Optional[str] = None
+    properties: Dict[str, Primitive] = {}
 
 
 class CreateFunnelDefinitionRequest(BaseModel):
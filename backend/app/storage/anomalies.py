@@ -0,0 +1,37 @@
+"""
+Anomaly Storage
+
+Read/delete helpers for `AnomalyDB` records written by the anomaly detector
+(app/workers/anomaly_detector.py). Listing uses the (api_key, updated_at)
+index, so the dashboard can poll for new or still-growing anomalies cheaply.
+"""
+
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy.orm import Session
+
+from app.db.models import AnomalyDB
+
+
+def list_anomalies(
+    db: Session,
+    api_key: str,
+    *,
+    since: Optional[datetime] = None,
+    limit: int = 100,
+) -> List[AnomalyDB]:
+    """
+    Anomalies of an api_key, most recently updated first.
+
+    Args:
+        since: Only anomalies created or extended after this time (UTC)
+    """
+    query = db.query(AnomalyDB).filter(AnomalyDB.api_key == api_key)
+    if since is not None:
+        query = query.filter(AnomalyDB.updated_at > since)
+    return query.order_by(AnomalyDB.updated_at.desc(), AnomalyDB.id.desc()).limit(limit).all()
+
+
+def delete_anomalies(db: Session, api_key: str) -> None:
+    """Stage deletion of an api_key's anomalies (the caller commits)."""
+    db.query(AnomalyDB).filter(AnomalyDB.api_key == api_key).delete(synchronize_session=False)
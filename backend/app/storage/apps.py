@@ -8,8 +8,12 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 import uuid
 
-from app.db.models import AppDB
+from app.db.models import AppDB, FunnelDefinitionDB, InsightDB
 from app.models.app import AppCreate, AppUpdate
+from app.storage.dictionary import app_api_keys, link_app_key, tombstone_app_key
+from app.storage.anomalies import delete_anomalies
+from app.storage.insight_jobs import delete_insight_jobs
+from app.storage.snapshots import delete_snapshots
 
 
 def generate_api_key() -> str:
@@ -96,6 +100,9 @@ def update_app(db: Session, app_id: str, user_id: str, app_data: AppUpdate) -> O
         db_app.name = app_data.name
     if app_data.description is not None:
         db_app.description = app_data.description
+    # An explicit null resets retention to the server default.
+    if "retention_days" in app_data.model_fields_set:
+        db_app.retention_days = app_data.retention_days
     
     db.commit()
     db.refresh(db_app)
@@ -104,7 +111,11 @@ def update_app(db: Session, app_id: str, user_id: str, app_data: AppUpdate) -> O
 
 def delete_app(db: Session, app_id: str, user_id: str) -> bool:
     """
-    Delete an app.
+    Delete an app and everything stored under its api_key.
+
+    Funnel definitions and insights are deleted immediately; events (which can be
+    large) are tombstoned and removed in bounded chunks by the purge worker.
+    Keys the app replaced with `regenerate_api_key` are deleted the same way.
     
     Args:
         db: Database session
@@ -118,6 +129,15 @@ def delete_app(db: Session, app_id: str, user_id: str) -> bool:
     if not db_app:
         return False
     
+    # The current key and any it replaced (regenerate_api_key)
+    for api_key in app_api_keys(db, db_app.api_key, db_app.id):
+        db.query(FunnelDefinitionDB).filter(FunnelDefinitionDB.api_key == api_key).delete(synchronize_session=False)
+        delete_insight_jobs(db, api_key)
+        db.query(InsightDB).filter(InsightDB.api_key == api_key).delete(synchronize_session=False)
+        delete_snapshots(db, api_key)
+        delete_anomalies(db, api_key)
+        tombstone_app_key(db, api_key)
+
     db.delete(db_app)
     db.commit()
     return True
@@ -140,6 +160,8 @@ def regenerate_api_key(db: Session, app_id: str, user_id: str) -> Optional[AppDB
     if not db_app:
         return None
     
+    # Events stay under the old key; remember it so delete_app purges them too.
+    link_app_key(db, db_app.api_key, db_app.id)
     db_app.api_key = generate_api_key()
     db.commit()
     db.refresh(db_app)
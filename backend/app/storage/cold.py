@@ -0,0 +1,388 @@
+"""
+Cold Event Storage (Arrow IPC files)
+
+Historical events are moved out of the `events` table (see
+app/workers/compactor.py) into one columnar file per app and UTC day:
+
+    {COLD_STORAGE_DIR}/{app_key_id}/{YYYY-MM-DD}.arrow
+
+Files are uncompressed Arrow IPC, sorted by (session_key_id, timestamp_ms, id),
+so they can be memory-mapped and read zero-copy with column pruning: a funnel
+scan only touches the session/event-name/timestamp columns.
+
+pyarrow is an optional dependency. It is imported lazily and only required
+when COLD_STORAGE_DIR is set.
+"""
+
+import heapq
+import json
+import os
+import shutil
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from app.core.config import COLD_STORAGE_AFTER_DAYS, COLD_STORAGE_DIR
+from app.db.models import SAMPLE_BUCKETS, SAMPLE_HASH_MULTIPLIER
+
+DAY_MS = 86_400_000
+
+# Rows converted to Python objects per record batch when iterating.
+_BATCH_ROWS = 64_000
+
+SCAN_COLUMNS = ["session_key_id", "event_name_id", "timestamp_ms"]
+# Columns a segment's row mask reads (app/analytics/segments.py)
+SEGMENT_COLUMNS = ["platform", "properties"]
+
+
+def cold_enabled() -> bool:
+    return bool(COLD_STORAGE_DIR)
+
+
+def cold_cutoff_ms(now: Optional[datetime] = None) -> int:
+    """Events with timestamp_ms below this (a UTC day boundary) belong in cold storage."""
+    now = now or datetime.now(timezone.utc)
+    cutoff_day = (now - timedelta(days=COLD_STORAGE_AFTER_DAYS)).date()
+    return day_bounds_ms(cutoff_day)[0]
+
+
+def day_of(ts_ms: int) -> date:
+    return datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc).date()
+
+
+def day_bounds_ms(day: date) -> Tuple[int, int]:
+    """[start, end) of a UTC day in epoch ms."""
+    start = int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp() * 1000)
+    return start, start + DAY_MS
+
+
+# =============================================================================
+# Layout
+# =============================================================================
+
+def _app_dir(app_key_id: int) -> str:
+    return os.path.join(COLD_STORAGE_DIR, str(app_key_id))
+
+
+def _day_path(app_key_id: int, day: date) -> str:
+    return os.path.join(_app_dir(app_key_id), f"{day.isoformat()}.arrow")
+
+
+def list_app_key_ids() -> List[int]:
+    if not cold_enabled() or not os.path.isdir(COLD_STORAGE_DIR):
+        return []
+    return sorted(int(name) for name in os.listdir(COLD_STORAGE_DIR) if name.isdigit())
+
+
+def list_days(
+    app_key_id: int,
+    start_ms: Optional[int] = None,
+    end_ms: Optional[int] = None,
+) -> List[date]:
+    """Days with a cold file for this app, optionally limited to those overlapping [start_ms, end_ms)."""
+    if not cold_enabled():
+        return []
+    app_dir = _app_dir(app_key_id)
+    if not os.path.isdir(app_dir):
+        return []
+    days = []
+    for name in os.listdir(app_dir):
+        if not name.endswith(".arrow"):
+            continue
+        day = date.fromisoformat(name[: -len(".arrow")])
+        day_start, day_end = day_bounds_ms(day)
+        if start_ms is not None and day_end <= start_ms:
+            continue
+        if end_ms is not None and day_start >= end_ms:
+            continue
+        days.append(day)
+    return sorted(days)
+
+
+def _app_ids(app_key_id: Optional[int]) -> List[int]:
+    return list_app_key_ids() if app_key_id is None else [app_key_id]
+
+
+# =============================================================================
+# Read / write
+# =============================================================================
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.ipc as ipc
+    except ImportError as exc:  # pragma: no cover - depends on environment
+        raise RuntimeError(
+            "COLD_STORAGE_DIR is set but pyarrow is not installed (pip install pyarrow)"
+        ) from exc
+    return pa, pc, ipc
+
+
+def _schema(pa):
+    return pa.schema([
+        ("id", pa.int64()),
+        ("session_key_id", pa.int64()),
+        ("event_name_id", pa.int32()),
+        ("timestamp_ms", pa.int64()),
+        ("platform", pa.string()),
+        ("properties", pa.string()),
+        ("created_at", pa.timestamp("us")),
+    ])
+
+
+def read_day(app_key_id: int, day: date, columns: Optional[List[str]] = None):
+    """Memory-map one day file and return a pyarrow Table with only `columns`."""
+    pa, _pc, ipc = _pyarrow()
+    source = pa.memory_map(_day_path(app_key_id, day), "r")
+    table = ipc.open_file(source).read_all()
+    return table.select(columns) if columns is not None else table
+
+
+def write_day(app_key_id: int, day: date, rows: List[dict]) -> int:
+    """
+    Merge rows (dicts shaped like `events` rows) into a day file.
+
+    Existing rows are kept, duplicates (same `id`) are dropped, and the result is
+    re-sorted and written atomically (temp file + rename). Returns the row count.
+    """
+    pa, pc, ipc = _pyarrow()
+    schema = _schema(pa)
+    new_table = pa.Table.from_pylist(
+        [
+            {
+                **{name: row.get(name) for name in schema.names},
+                "properties": json.dumps(row["properties"]) if row.get("properties") is not None else None,
+            }
+            for row in rows
+        ],
+        schema=schema,
+    )
+
+    path = _day_path(app_key_id, day)
+    if os.path.exists(path):
+        existing = read_day(app_key_id, day)
+        new_ids = new_table["id"]
+        existing = existing.filter(pc.invert(pc.is_in(existing["id"], value_set=new_ids)))
+        table = pa.concat_tables([existing, new_table])
+    else:
+        table = new_table
+
+    table = table.sort_by([("session_key_id", "ascending"), ("timestamp_ms", "ascending"), ("id", "ascending")])
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with ipc.new_file(sink, schema) as writer:
+            writer.write_table(table, max_chunksize=_BATCH_ROWS)
+    with open(tmp_path, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return table.num_rows
+
+
+def delete_day(app_key_id: int, day: date) -> None:
+    try:
+        os.remove(_day_path(app_key_id, day))
+    except FileNotFoundError:
+        pass
+
+
+def delete_app(app_key_id: int) -> None:
+    """Remove every cold file of one app."""
+    if cold_enabled():
+        shutil.rmtree(_app_dir(app_key_id), ignore_errors=True)
+
+
+# =============================================================================
+# Query helpers used by the analytics layer
+# =============================================================================
+
+def iter_session_rows(
+    app_key_id: Optional[int],
+    codes: Optional[List[int]] = None,
+    sample_threshold: Optional[int] = None,
+    session_key_ids: Optional[Set[int]] = None,
+) -> Iterator[Tuple[int, int, int]]:
+    """
+    Yield cold `(session_key_id, event_name_id, timestamp_ms)` rows in
+    session+time order (k-way merge of the per-day files), optionally only for
+    sessions in a sample (see app/analytics/sampling.py) or in `session_key_ids`.
+    """
+    if session_key_ids is not None and not session_key_ids:
+        return iter(())
+    streams = [
+        _iter_day_rows(key, day, codes, sample_threshold, session_key_ids)
+        for key in _app_ids(app_key_id)
+        for day in list_days(key)
+    ]
+    if not streams:
+        return iter(())
+    if len(streams) == 1:
+        return streams[0]
+    return heapq.merge(*streams, key=lambda row: (row[0], row[2]))
+
+
+def _iter_day_rows(
+    app_key_id: int,
+    day: date,
+    codes: Optional[List[int]],
+    sample_threshold: Optional[int],
+    session_key_ids: Optional[Set[int]] = None,
+) -> Iterator[Tuple[int, int, int]]:
+    pa, pc, _ipc = _pyarrow()
+    table = read_day(app_key_id, day, SCAN_COLUMNS)
+    if codes is not None:
+        table = table.filter(pc.is_in(table["event_name_id"], value_set=pa.array(codes, pa.int32())))
+    if sample_threshold is not None:
+        table = table.filter(_sample_mask(pc, table, sample_threshold))
+    if session_key_ids is not None:
+        table = table.filter(pc.is_in(table["session_key_id"], value_set=pa.array(list(session_key_ids), pa.int64())))
+    for batch in table.to_batches(max_chunksize=_BATCH_ROWS):
+        yield from zip(
+            batch.column(0).to_pylist(),
+            batch.column(1).to_pylist(),
+            batch.column(2).to_pylist(),
+        )
+
+
+def iter_rows_by_time(
+    app_key_id: int,
+    start_ms: Optional[int] = None,
+    end_ms: Optional[int] = None,
+    after: Optional[Tuple[int, int]] = None,
+) -> Iterator[Tuple[int, int, int, int, Optional[str], Optional[str]]]:
+    """
+    Yield cold `(id, timestamp_ms, event_name_id, session_key_id, platform, properties_json)`
+    rows in [start_ms, end_ms) in (timestamp_ms, id) order, starting just after
+    the keyset position `after` = (timestamp_ms, id). One day file at a time
+    (day files cover disjoint time ranges, so their order is the time order).
+    """
+    _pa, pc, _ipc = _pyarrow()
+    columns = ["id", "timestamp_ms", "event_name_id", "session_key_id", "platform", "properties"]
+    for table in _tables(app_key_id, columns, start_ms=start_ms, end_ms=end_ms):
+        if after is not None:
+            after_ts, after_id = after
+            table = table.filter(pc.or_(
+                pc.greater(table["timestamp_ms"], after_ts),
+                pc.and_(pc.equal(table["timestamp_ms"], after_ts), pc.greater(table["id"], after_id)),
+            ))
+        table = table.sort_by([("timestamp_ms", "ascending"), ("id", "ascending")])
+        for batch in table.to_batches(max_chunksize=_BATCH_ROWS):
+            yield from zip(*(batch.column(i).to_pylist() for i in range(len(columns))))
+
+
+def read_session_rows(
+    app_key_id: int,
+    session_key_ids: Iterable[int],
+    start_ms: int,
+) -> List[Tuple[int, int, int, int, Optional[str]]]:
+    """
+    Return cold `(session_key_id, id, event_name_id, timestamp_ms, platform)` rows
+    for the given sessions, reading only day files from `start_ms` on.
+    """
+    pa, pc, _ipc = _pyarrow()
+    keys = pa.array(list(session_key_ids), pa.int64())
+    columns = ["session_key_id", "id", "event_name_id", "timestamp_ms", "platform"]
+    rows = []
+    for day in list_days(app_key_id, start_ms=start_ms):
+        table = read_day(app_key_id, day, columns)
+        table = table.filter(pc.is_in(table["session_key_id"], value_set=keys))
+        rows.extend(zip(*(table.column(c).to_pylist() for c in columns)))
+    return rows
+
+
+def count_events(
+    app_key_id: Optional[int],
+    codes: Optional[List[int]] = None,
+    start_ms: Optional[int] = None,
+    end_ms: Optional[int] = None,
+    sample_threshold: Optional[int] = None,
+) -> int:
+    """Count cold events, optionally by event-name codes, time range and session sample."""
+    _pa, pc, _ipc = _pyarrow()
+    total = 0
+    for table in _tables(app_key_id, ["session_key_id", "event_name_id", "timestamp_ms"], codes, start_ms, end_ms):
+        if sample_threshold is not None:
+            table = table.filter(_sample_mask(pc, table, sample_threshold))
+        total += table.num_rows
+    return total
+
+
+def event_name_counts(app_key_id: Optional[int]) -> Dict[int, int]:
+    """{event_name_id: count} over all cold events."""
+    _pa, pc, _ipc = _pyarrow()
+    counts: Dict[int, int] = {}
+    for table in _tables(app_key_id, ["event_name_id"]):
+        for item in pc.value_counts(table["event_name_id"]).to_pylist():
+            counts[item["values"]] = counts.get(item["values"], 0) + item["counts"]
+    return counts
+
+
+def timestamps(
+    app_key_id: int,
+    start_ms: int,
+    end_ms: int,
+    codes: Optional[List[int]] = None,
+    row_mask: Optional[Callable] = None,
+) -> List[int]:
+    """Cold event timestamps in [start_ms, end_ms), optionally of rows selected by `row_mask`."""
+    columns = ["event_name_id", "timestamp_ms"] + (SEGMENT_COLUMNS if row_mask is not None else [])
+    result: List[int] = []
+    for table in _tables(app_key_id, columns, codes, start_ms, end_ms):
+        if row_mask is not None:
+            table = table.filter(row_mask(table))
+        result.extend(table["timestamp_ms"].to_pylist())
+    return result
+
+
+def matching_sessions(app_key_id: Optional[int], row_mask: Callable) -> Set[int]:
+    """Sessions with at least one cold event selected by `row_mask` (a table -> boolean mask callable)."""
+    sessions: Set[int] = set()
+    for table in _tables(app_key_id, ["session_key_id"] + SEGMENT_COLUMNS):
+        sessions.update(table.filter(row_mask(table))["session_key_id"].to_pylist())
+    return sessions
+
+
+def sessions_with_events(app_key_id: int, session_key_ids: Iterable[int]) -> Set[int]:
+    """The given sessions that have at least one event in the app's cold files."""
+    days = list_days(app_key_id)
+    if not days:
+        return set()
+    pa, pc, _ipc = _pyarrow()
+    keys = pa.array(list(session_key_ids), pa.int64())
+    sessions: Set[int] = set()
+    for day in days:
+        table = read_day(app_key_id, day, ["session_key_id"])
+        sessions.update(table.filter(pc.is_in(table["session_key_id"], value_set=keys))["session_key_id"].to_pylist())
+    return sessions
+
+
+def _sample_mask(pc, table, threshold: int):
+    """Arrow twin of `sample_bucket` (SAMPLE_BUCKETS is a power of two, so mod is a mask)."""
+    buckets = pc.bit_wise_and(pc.multiply(table["session_key_id"], SAMPLE_HASH_MULTIPLIER), SAMPLE_BUCKETS - 1)
+    return pc.less(buckets, threshold)
+
+
+def _tables(
+    app_key_id: Optional[int],
+    columns: List[str],
+    codes: Optional[List[int]] = None,
+    start_ms: Optional[int] = None,
+    end_ms: Optional[int] = None,
+):
+    """Yield column-pruned, filtered day tables."""
+    pa, pc, _ipc = _pyarrow()
+    for key in _app_ids(app_key_id):
+        for day in list_days(key, start_ms, end_ms):
+            table = read_day(key, day, columns)
+            mask = None
+            if codes is not None:
+                mask = pc.is_in(table["event_name_id"], value_set=pa.array(codes, pa.int32()))
+            day_start, day_end = day_bounds_ms(day)
+            if start_ms is not None and start_ms > day_start:
+                cond = pc.greater_equal(table["timestamp_ms"], start_ms)
+                mask = cond if mask is None else pc.and_(mask, cond)
+            if end_ms is not None and end_ms < day_end:
+                cond = pc.less(table["timestamp_ms"], end_ms)
+                mask = cond if mask is None else pc.and_(mask, cond)
+            yield table.filter(mask) if mask is not None else table
@@ -0,0 +1,314 @@
+"""
+Event Dictionary Storage
+
+Maps the strings carried by events (api_key, event_name, session_id) to the
+small integer ids stored on `events` rows, and back.
+
+Dictionary rows are append-only while an app exists, so lookups are cached
+per process:
+- app keys in a short-TTL cache (so a deleted app stops resolving everywhere)
+- event names in an LRU cache
+- session ids in a larger LRU (sessions are high-cardinality, short-lived,
+  and their rows are purged with retention)
+
+Every other process may still hold an id after the purge worker deletes its
+row, so the caches expire: app keys after APP_KEY_CACHE_TTL_SECONDS, the rest
+after DICTIONARY_CACHE_TTL_SECONDS. The purge worker waits those out before
+deleting rows an ingesting process could still be using (see
+app/workers/purger.py).
+
+It also keeps the per-app catalog of event property keys (`property_keys`),
+which the dashboard offers as segment filters: ingestion registers keys it
+hasn't seen for an app, so a batch of known keys costs no queries.
+
+Deleted apps are tombstoned (`app_keys.deleted_at`); the purge worker removes
+their rows later.
+
+Rows created with `create=True` are committed immediately, so a cached id
+always refers to a row that exists even if the caller's transaction later
+rolls back.
+"""
+
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy.orm import Session
+
+from app.db.models import AppKeyDB, EventNameDB, PropertyKeyDB, SessionKeyDB
+from app.db.upsert import insert_ignore_conflicts
+
+
+class _LRU:
+    """Tiny thread-tolerant LRU map (worst case under races is a redundant DB lookup)."""
+
+    def __init__(self, maxsize: int, ttl_seconds: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key):
+        try:
+            value, expires_at = self._data[key]
+        except KeyError:
+            return None
+        if expires_at is not None and expires_at < time.monotonic():
+            self._data.pop(key, None)
+            return None
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            pass
+        return value
+
+    def put(self, key, value) -> None:
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds is not None else None
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            try:
+                self._data.popitem(last=False)
+            except KeyError:
+                break
+
+    def pop(self, key) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+# How long a process may keep using a cached id (see module docstring)
+APP_KEY_CACHE_TTL_SECONDS = 60
+DICTIONARY_CACHE_TTL_SECONDS = 3600
+
+_app_key_cache = _LRU(10_000, ttl_seconds=APP_KEY_CACHE_TTL_SECONDS)
+_event_name_cache = _LRU(100_000, ttl_seconds=DICTIONARY_CACHE_TTL_SECONDS)
+_session_key_cache = _LRU(200_000, ttl_seconds=DICTIONARY_CACHE_TTL_SECONDS)
+# (app_key_id, key) -> value type; the TTL also heals keys whose insert rolled back
+_property_key_cache = _LRU(100_000, ttl_seconds=DICTIONARY_CACHE_TTL_SECONDS)
+
+
+def get_app_key_id(db: Session, api_key: str, *, create: bool = False) -> Optional[int]:
+    """
+    Return the integer id for an api_key (registering it when `create=True`).
+
+    Returns None for unknown keys and for keys whose app was deleted.
+    """
+    cached = _app_key_cache.get(api_key)
+    if cached is not None:
+        return cached
+
+    live = db.query(AppKeyDB.id).filter(AppKeyDB.api_key == api_key, AppKeyDB.deleted_at.is_(None))
+    app_key_id = live.scalar()
+    if app_key_id is None and create:
+        # No-op if a tombstoned row holds the key: deleted apps stay deleted.
+        insert_ignore_conflicts(db, AppKeyDB, [{"api_key": api_key}], ["api_key"])
+        db.commit()
+        app_key_id = live.scalar()
+
+    if app_key_id is not None:
+        _app_key_cache.put(api_key, app_key_id)
+    return app_key_id
+
+
+def get_event_name_ids(
+    db: Session,
+    app_key_id: int,
+    names: Iterable[str],
+    *,
+    create: bool = False,
+) -> Dict[str, int]:
+    """
+    Map event names to their ids for one app.
+
+    Unknown names are omitted from the result unless `create=True`.
+    """
+    return _resolve(
+        db,
+        cache=_event_name_cache,
+        model=EventNameDB,
+        value_column=EventNameDB.name,
+        value_field="name",
+        app_key_id=app_key_id,
+        values=names,
+        create=create,
+    )
+
+
+def get_session_key_ids(
+    db: Session,
+    app_key_id: int,
+    session_ids: Iterable[str],
+    *,
+    create: bool = False,
+) -> Dict[str, int]:
+    """
+    Map client session ids to their ids for one app.
+
+    Unknown sessions are omitted from the result unless `create=True`.
+    """
+    return _resolve(
+        db,
+        cache=_session_key_cache,
+        model=SessionKeyDB,
+        value_column=SessionKeyDB.session_id,
+        value_field="session_id",
+        app_key_id=app_key_id,
+        values=session_ids,
+        create=create,
+    )
+
+
+def get_session_id_map(db: Session, session_key_ids: Iterable[int]) -> Dict[int, str]:
+    """Return {session_key_id: session_id} (decodes cold rows, which store only the id)."""
+    ids = list(set(session_key_ids))
+    if not ids:
+        return {}
+    rows = db.query(SessionKeyDB.id, SessionKeyDB.session_id).filter(SessionKeyDB.id.in_(ids)).all()
+    return {session_key_id: session_id for (session_key_id, session_id) in rows}
+
+
+def get_event_name_map(db: Session, app_key_id: Optional[int] = None) -> Dict[int, str]:
+    """
+    Return {event_name_id: name} for one app (or for every app when None).
+
+    Used to decode scans; per-app dictionaries are small (distinct event names).
+    """
+    q = db.query(EventNameDB.id, EventNameDB.name)
+    if app_key_id is not None:
+        q = q.filter(EventNameDB.app_key_id == app_key_id)
+    return {event_name_id: name for (event_name_id, name) in q.all()}
+
+
+def register_property_keys(db: Session, app_key_id: int, properties: Iterable[Optional[dict]]) -> None:
+    """
+    Add the keys of these events' properties to the app's catalog (the caller commits).
+
+    A key seen with values of different types is recorded as "mixed".
+    """
+    seen: Dict[str, str] = {}
+    for props in properties:
+        for key, value in (props or {}).items():
+            value_type = _value_type(value)
+            if value_type is not None and seen.setdefault(key, value_type) != value_type:
+                seen[key] = "mixed"
+
+    pending = {
+        key: value_type
+        for key, value_type in seen.items()
+        if _property_key_cache.get((app_key_id, key)) not in (value_type, "mixed")
+    }
+    if not pending:
+        return
+    insert_ignore_conflicts(
+        db,
+        PropertyKeyDB,
+        [{"app_key_id": app_key_id, "key": key, "value_type": t} for key, t in pending.items()],
+        ["app_key_id", "key"],
+    )
+    stored = dict(
+        db.query(PropertyKeyDB.key, PropertyKeyDB.value_type)
+        .filter(PropertyKeyDB.app_key_id == app_key_id, PropertyKeyDB.key.in_(list(pending)))
+        .all()
+    )
+    mixed = [key for key, t in pending.items() if key in stored and stored[key] not in (t, "mixed")]
+    if mixed:
+        db.query(PropertyKeyDB).filter(
+            PropertyKeyDB.app_key_id == app_key_id, PropertyKeyDB.key.in_(mixed)
+        ).update({PropertyKeyDB.value_type: "mixed"}, synchronize_session=False)
+    for key in pending:
+        _property_key_cache.put((app_key_id, key), "mixed" if key in mixed else stored.get(key, pending[key]))
+
+
+def list_property_keys(db: Session, app_key_id: int) -> List[PropertyKeyDB]:
+    """The app's property keys, alphabetically."""
+    return db.query(PropertyKeyDB).filter(PropertyKeyDB.app_key_id == app_key_id).order_by(PropertyKeyDB.key).all()
+
+
+def _value_type(value) -> Optional[str]:
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, (int, float)):
+        return "number"
+    if isinstance(value, str):
+        return "string"
+    return None
+
+
+def link_app_key(db: Session, api_key: str, app_id: str) -> None:
+    """
+    Record that an api_key belongs to an app (the caller commits), so the app's
+    deletion also covers events ingested under a key it has since replaced.
+    """
+    insert_ignore_conflicts(db, AppKeyDB, [{"api_key": api_key}], ["api_key"])
+    db.query(AppKeyDB).filter(AppKeyDB.api_key == api_key, AppKeyDB.app_id.is_(None)).update(
+        {AppKeyDB.app_id: app_id}, synchronize_session=False
+    )
+
+
+def app_api_keys(db: Session, api_key: str, app_id: str) -> List[str]:
+    """An app's current api_key followed by the keys it replaced (see `link_app_key`)."""
+    previous = db.query(AppKeyDB.api_key).filter(AppKeyDB.app_id == app_id, AppKeyDB.api_key != api_key)
+    return [api_key] + [key for (key,) in previous.order_by(AppKeyDB.id).all()]
+
+
+def tombstone_app_key(db: Session, api_key: str) -> None:
+    """Mark an api_key as deleted (the caller commits); its data is purged in the background."""
+    db.query(AppKeyDB).filter(AppKeyDB.api_key == api_key, AppKeyDB.deleted_at.is_(None)).update(
+        {AppKeyDB.deleted_at: datetime.now(timezone.utc)}, synchronize_session=False
+    )
+    _app_key_cache.pop(api_key)
+
+
+def clear_dictionary_caches() -> None:
+    """Drop all cached ids (e.g. after dictionary rows were purged)."""
+    _app_key_cache.clear()
+    _event_name_cache.clear()
+    _session_key_cache.clear()
+    _property_key_cache.clear()
+
+
+def _resolve(
+    db: Session,
+    *,
+    cache: _LRU,
+    model,
+    value_column,
+    value_field: str,
+    app_key_id: int,
+    values: Iterable[str],
+    create: bool,
+) -> Dict[str, int]:
+    result: Dict[str, int] = {}
+    missing = []
+    for value in dict.fromkeys(values):
+        cached = cache.get((app_key_id, value))
+        if cached is not None:
+            result[value] = cached
+        else:
+            missing.append(value)
+    if not missing:
+        return result
+
+    found = _lookup(db, model, value_column, app_key_id, missing)
+    if create and len(found) < len(missing):
+        new_rows = [{"app_key_id": app_key_id, value_field: v} for v in missing if v not in found]
+        insert_ignore_conflicts(db, model, new_rows, ["app_key_id", value_field])
+        db.commit()
+        found = _lookup(db, model, value_column, app_key_id, missing)
+
+    for value, row_id in found.items():
+        cache.put((app_key_id, value), row_id)
+    result.update(found)
+    return result
+
+
+def _lookup(db: Session, model, value_column, app_key_id: int, values: list) -> Dict[str, int]:
+    rows = (
+        db.query(value_column, model.id)
+        .filter(model.app_key_id == app_key_id)
+        .filter(value_column.in_(values))
+        .all()
+    )
+    return {value: row_id for (value, row_id) in rows}
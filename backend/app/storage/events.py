@@ -2,27 +2,126 @@
 Event Storage (DB Persistence)
 
 This module is the data-access layer for analytics events:
-- write incoming events into the database
+- write incoming events into the database (dictionary-encoded, see dictionary.py)
+- advance the app's ingestion watermark (`app_keys.last_ingested_at`)
+- register new property keys in the app's catalog (for segment filters)
+- bump the per-minute event counters read by the anomaly detector
+- stream an app's events in time order for export
 """
 
-from typing import List
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, List, Optional, Tuple
+from sqlalchemy import insert, or_, tuple_
 from sqlalchemy.orm import Session
 
+from app.analytics.anomaly import minute_of
+from app.core.config import ANOMALY_INTERVAL_SECONDS, INGEST_WATERMARK_RESOLUTION_SECONDS
 from app.models.pydantic_models import Event
-from app.db.models import EventDB
+from app.db.models import AppKeyDB, EventCounterDB, EventDB, EventNameDB, SessionKeyDB
+from app.db.upsert import upsert_increment
+from app.storage.dictionary import get_app_key_id, get_event_name_ids, get_session_key_ids, register_property_keys
 
 
 def save_events(db: Session, api_key: str, events: List[Event]) -> None:
-    """Persist a batch of validated `Event` objects for a single `api_key`."""
-    for event in events:
-        db_event = EventDB(
-            api_key=api_key,
-            event_name=event.event_name,
-            session_id=event.session_id,
-            timestamp_ms=event.timestamp_ms,
-            platform=event.platform,
-            properties=event.properties,
-        )
-        db.add(db_event)
+    """
+    Persist a batch of validated `Event` objects for a single `api_key`.
+
+    Raises:
+        LookupError: If the api_key belongs to a deleted app.
+    """
+    app_key_id = get_app_key_id(db, api_key, create=True)
+    if app_key_id is None:
+        raise LookupError("api_key belongs to a deleted app")
+    name_ids = get_event_name_ids(db, app_key_id, (e.event_name for e in events), create=True)
+    session_ids = get_session_key_ids(db, app_key_id, (e.session_id for e in events), create=True)
+
+    rows = [
+        {
+            "app_key_id": app_key_id,
+            "event_name_id": name_ids[event.event_name],
+            "session_key_id": session_ids[event.session_id],
+            "timestamp_ms": event.timestamp_ms,
+            "platform": event.platform,
+            "properties": event.properties,
+        }
+        for event in events
+    ]
+    # One multi-row INSERT instead of an ORM object per event.
+    db.execute(insert(EventDB), rows)
+    register_property_keys(db, app_key_id, (event.properties for event in events))
+    _advance_watermark(db, app_key_id)
+    if ANOMALY_INTERVAL_SECONDS > 0:
+        _count_events(db, app_key_id, [row["event_name_id"] for row in rows])
+    db.commit()
+
+
+def _count_events(db: Session, app_key_id: int, event_name_ids: List[int]) -> None:
+    # One upsert row per event name in the batch, in a fixed order so
+    # concurrent batches lock counter rows in the same order.
+    minute_ms = minute_of(int(time.time() * 1000))
+    counts = Counter(event_name_ids)
+    upsert_increment(
+        db,
+        EventCounterDB,
+        [
+            {"app_key_id": app_key_id, "event_name_id": name_id, "minute_ms": minute_ms, "count": counts[name_id]}
+            for name_id in sorted(counts)
+        ],
+        ["app_key_id", "event_name_id", "minute_ms"],
+        "count",
+    )
 
-    db.commit()
\ No newline at end of file
+
+def _advance_watermark(db: Session, app_key_id: int) -> None:
+    # Conditional, so a busy app's key row is written once per resolution
+    # window rather than once per batch. Readers allow for that lag (see
+    # snapshots.precomputed_is_fresh).
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    db.query(AppKeyDB).filter(
+        AppKeyDB.id == app_key_id,
+        or_(
+            AppKeyDB.last_ingested_at.is_(None),
+            AppKeyDB.last_ingested_at < now - timedelta(seconds=INGEST_WATERMARK_RESOLUTION_SECONDS),
+        ),
+    ).update({AppKeyDB.last_ingested_at: now}, synchronize_session=False)
+
+
+def iter_event_rows(
+    db: Session,
+    app_key_id: int,
+    start_ms: Optional[int] = None,
+    end_ms: Optional[int] = None,
+    after: Optional[Tuple[int, int]] = None,
+    chunk_size: int = 5000,
+) -> Iterator[tuple]:
+    """
+    Stream an app's events in [start_ms, end_ms) in (timestamp_ms, id) order.
+
+    Rows are `(id, timestamp_ms, event_name, session_id, platform, properties)`,
+    starting just after the keyset position `after` = (timestamp_ms, id).
+    Fetched `chunk_size` rows at a time through a server-side cursor.
+    """
+    q = (
+        db.query(
+            EventDB.id,
+            EventDB.timestamp_ms,
+            EventNameDB.name,
+            SessionKeyDB.session_id,
+            EventDB.platform,
+            EventDB.properties,
+        )
+        .join(EventNameDB, EventNameDB.id == EventDB.event_name_id)
+        .join(SessionKeyDB, SessionKeyDB.id == EventDB.session_key_id)
+        .filter(EventDB.app_key_id == app_key_id)
+    )
+    if start_ms is not None:
+        q = q.filter(EventDB.timestamp_ms >= start_ms)
+    if end_ms is not None:
+        q = q.filter(EventDB.timestamp_ms < end_ms)
+    if after is not None:
+        q = q.filter(tuple_(EventDB.timestamp_ms, EventDB.id) > tuple_(*after))
+    q = q.order_by(EventDB.timestamp_ms, EventDB.id)
+    for row in q.yield_per(chunk_size):
+        yield tuple(row)
@@ -8,11 +8,14 @@ The API layer uses these functions to manage saved funnel definitions.
 from sqlalchemy.orm import Session
 from typing import List
 from app.db.models import FunnelDefinitionDB
+from app.storage.snapshots import invalidate_precomputed_snapshot
 
 
 def save_funnel_definition(db: Session, definition: FunnelDefinitionDB):
     """Persist a new `FunnelDefinitionDB` record and return the refreshed object."""
     db.add(definition)
+    # Snapshots include every funnel, so the precomputed one is out of date.
+    invalidate_precomputed_snapshot(db, definition.api_key)
     db.commit()
     db.refresh(definition)
     return definition
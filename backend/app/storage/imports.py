@@ -0,0 +1,37 @@
+"""
+Bulk Import Storage
+
+Persistence helpers for `BulkImportDB` records: one row per historical
+backfill (app/workers/bulk_import.py), updated after every chunk so progress
+can be read from any process.
+"""
+
+from datetime import datetime, timezone
+from typing import List, Optional
+from sqlalchemy.orm import Session
+
+from app.db.models import BulkImportDB
+
+
+def create_import(db: Session, api_key: str, source: str, fmt: str) -> BulkImportDB:
+    job = BulkImportDB(api_key=api_key, source=source, format=fmt)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def get_import(db: Session, import_id: str) -> Optional[BulkImportDB]:
+    return db.get(BulkImportDB, import_id)
+
+
+def list_imports(db: Session, limit: int = 50) -> List[BulkImportDB]:
+    """Most recent imports first."""
+    return db.query(BulkImportDB).order_by(BulkImportDB.created_at.desc()).limit(limit).all()
+
+
+def update_import(db: Session, import_id: str, **fields) -> None:
+    """Set fields on an import and commit."""
+    fields["updated_at"] = datetime.now(timezone.utc)
+    db.query(BulkImportDB).filter(BulkImportDB.id == import_id).update(fields, synchronize_session=False)
+    db.commit()
@@ -0,0 +1,201 @@
+"""
+Insight Job Storage
+
+Persistence helpers for `InsightJobDB` records: the queue behind
+`POST /analytics/insights`.
+
+The queue lives in the database so API processes and `python -m app.workers`
+share it without extra infrastructure:
+- enqueueing joins an in-flight job for the same api_key instead of adding a
+  duplicate (enforced by a partial unique index, so concurrent requests agree)
+- claiming is a conditional UPDATE (queued -> running), so exactly one worker
+  wins each job
+- progress, completion and failure are conditional on the claim too (same
+  `attempts`), so a worker whose job was re-queued as stale cannot overwrite
+  the claim that replaced it
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.db.models import (
+    INSIGHT_JOB_FAILED,
+    INSIGHT_JOB_IN_FLIGHT,
+    INSIGHT_JOB_QUEUED,
+    INSIGHT_JOB_RUNNING,
+    INSIGHT_JOB_SUCCEEDED,
+    InsightJobDB,
+)
+
+
+def enqueue_insight_job(db: Session, api_key: str, sample: Optional[float] = None) -> InsightJobDB:
+    """
+    Queue insight generation for an api_key.
+
+    Returns:
+        The new job, or the already queued/running job for this api_key.
+    """
+    existing = get_in_flight_job(db, api_key)
+    if existing is not None:
+        return existing
+
+    job = InsightJobDB(api_key=api_key, sample=sample, status=INSIGHT_JOB_QUEUED)
+    db.add(job)
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent request queued one first; join it.
+        db.rollback()
+        existing = get_in_flight_job(db, api_key)
+        if existing is None:
+            raise
+        return existing
+    db.refresh(job)
+    return job
+
+
+def get_in_flight_job(db: Session, api_key: str) -> Optional[InsightJobDB]:
+    return (
+        db.query(InsightJobDB)
+        .filter(InsightJobDB.api_key == api_key, InsightJobDB.status.in_(INSIGHT_JOB_IN_FLIGHT))
+        .first()
+    )
+
+
+def get_insight_job(db: Session, job_id: str) -> Optional[InsightJobDB]:
+    return db.get(InsightJobDB, job_id)
+
+
+def claim_next_job(db: Session) -> Optional[InsightJobDB]:
+    """
+    Atomically take the oldest queued job (queued -> running).
+
+    Returns:
+        The claimed job, or None if the queue is empty.
+    """
+    while True:
+        job_id = (
+            db.query(InsightJobDB.id)
+            .filter(InsightJobDB.status == INSIGHT_JOB_QUEUED)
+            .order_by(InsightJobDB.created_at)
+            .limit(1)
+            .scalar()
+        )
+        if job_id is None:
+            return None
+        claimed = (
+            db.query(InsightJobDB)
+            .filter(InsightJobDB.id == job_id, InsightJobDB.status == INSIGHT_JOB_QUEUED)
+            .update(
+                {
+                    InsightJobDB.status: INSIGHT_JOB_RUNNING,
+                    InsightJobDB.stage: None,
+                    InsightJobDB.attempts: InsightJobDB.attempts + 1,
+                    InsightJobDB.updated_at: datetime.now(timezone.utc),
+                },
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        if claimed:
+            return db.get(InsightJobDB, job_id)
+        # Another worker won the race; try the next one.
+
+
+def _claim(db: Session, job_id: str, attempt: int):
+    """The job while claim number `attempt` (its `attempts` when claimed) still runs it."""
+    return db.query(InsightJobDB).filter(
+        InsightJobDB.id == job_id,
+        InsightJobDB.status == INSIGHT_JOB_RUNNING,
+        InsightJobDB.attempts == attempt,
+    )
+
+
+def set_job_stage(db: Session, job_id: str, attempt: int, stage: str) -> bool:
+    """
+    Record progress of a running job (also a heartbeat).
+
+    Returns:
+        False if the claim no longer owns the job (it was re-queued as stale).
+    """
+    owned = _claim(db, job_id, attempt).update(
+        {InsightJobDB.stage: stage, InsightJobDB.updated_at: datetime.now(timezone.utc)},
+        synchronize_session=False,
+    )
+    db.commit()
+    return bool(owned)
+
+
+def heartbeat_job(db: Session, job_id: str, attempt: int) -> bool:
+    """Keep a running job from looking stale; False once the claim no longer owns it."""
+    owned = _claim(db, job_id, attempt).update(
+        {InsightJobDB.updated_at: datetime.now(timezone.utc)},
+        synchronize_session=False,
+    )
+    db.commit()
+    return bool(owned)
+
+
+def complete_job(db: Session, job_id: str, attempt: int, insight_id: str) -> bool:
+    """
+    Mark the job succeeded and commit what the caller staged with it (the
+    insight), or roll it all back if the claim no longer owns the job.
+    """
+    owned = _claim(db, job_id, attempt).update(
+        {
+            InsightJobDB.status: INSIGHT_JOB_SUCCEEDED,
+            InsightJobDB.stage: None,
+            InsightJobDB.insight_id: insight_id,
+        },
+        synchronize_session=False,
+    )
+    if not owned:
+        db.rollback()
+        return False
+    db.commit()
+    return True
+
+
+def fail_job(db: Session, job_id: str, attempt: int, error: str) -> bool:
+    """Mark the job failed, unless the claim no longer owns it."""
+    owned = _claim(db, job_id, attempt).update(
+        {InsightJobDB.status: INSIGHT_JOB_FAILED, InsightJobDB.error: error[:500]},
+        synchronize_session=False,
+    )
+    db.commit()
+    return bool(owned)
+
+
+def requeue_stale_jobs(db: Session, stale_after_seconds: float, max_attempts: int) -> int:
+    """
+    Put running jobs whose worker stopped reporting back in the queue (or fail
+    them after `max_attempts`). Returns the number of jobs touched.
+    """
+    # updated_at is stored without tzinfo (UTC); compare like with like.
+    stale_before = (datetime.now(timezone.utc) - timedelta(seconds=stale_after_seconds)).replace(tzinfo=None)
+    stale = (
+        (InsightJobDB.status == INSIGHT_JOB_RUNNING)
+        & (InsightJobDB.updated_at < stale_before)
+    )
+    failed = (
+        db.query(InsightJobDB)
+        .filter(stale, InsightJobDB.attempts >= max_attempts)
+        .update(
+            {InsightJobDB.status: INSIGHT_JOB_FAILED, InsightJobDB.error: "worker stopped responding"},
+            synchronize_session=False,
+        )
+    )
+    requeued = (
+        db.query(InsightJobDB)
+        .filter(stale)
+        .update({InsightJobDB.status: INSIGHT_JOB_QUEUED}, synchronize_session=False)
+    )
+    db.commit()
+    return failed + requeued
+
+
+def delete_insight_jobs(db: Session, api_key: str) -> None:
+    """Stage deletion of every job for an api_key (the caller commits)."""
+    db.query(InsightJobDB).filter(InsightJobDB.api_key == api_key).delete(synchronize_session=False)
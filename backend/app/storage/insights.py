@@ -1,7 +1,26 @@
-from sqlalchemy.orm import Session
-from typing import List, Optional
+"""
+Insight Storage
+
+Persistence helpers for `InsightDB` records.
+
+Listing is paginated in SQL (newest first, by `(created_at, id)` on the
+`(api_key, created_at, id)` index) and leaves the large `analytics_snapshot`
+column unloaded unless asked for; `has_snapshot` is computed by the database.
+
+Snapshots live in the snapshot store (app/storage/snapshots.py) and insights
+reference them by `snapshot_hash`. Rows written before the store keep theirs
+inline in `analytics_snapshot`; the getters below read either.
+"""
+
+import base64
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session, defer, with_expression
+
 from app.db.models import InsightDB
 from app.insights.models import InsightResponse
+from app.storage.snapshots import load_snapshot, load_snapshot_metrics, save_snapshot
 
 
 def save_insight(
@@ -18,30 +37,118 @@ def save_insight(
         api_key: The API key this insight belongs to
         insight: The InsightResponse from the LLM
         snapshot: Optional analytics snapshot to store for comparison
+            (saved in the snapshot store, deduplicated by content)
         
     Returns:
         The saved InsightDB record
     """
+    db_insight = stage_insight(db, api_key, insight, snapshot=snapshot)
+    db.commit()
+    db.refresh(db_insight)
+    return db_insight
+
+
+def stage_insight(
+    db: Session,
+    api_key: str,
+    insight: InsightResponse,
+    snapshot: Optional[dict] = None
+) -> InsightDB:
+    """Add an insight (and its snapshot) to the session without committing. The caller commits."""
     db_insight = InsightDB(
         api_key=api_key,
         summary=insight.summary,
         insights=insight.insights,
         recommendations=insight.recommendations,
-        analytics_snapshot=snapshot
+        snapshot_hash=save_snapshot(db, api_key, snapshot) if snapshot is not None else None,
     )
-
     db.add(db_insight)
-    db.commit()
-    db.refresh(db_insight)
+    db.flush()
     return db_insight
 
+
 def list_insights(
     db: Session,
-    api_key: str
+    api_key: str,
+    *,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    include_snapshot: bool = False,
 ) -> List[InsightDB]:
-    return (
+    """
+    List insights for an api_key, newest first.
+
+    Args:
+        db: Database session
+        api_key: The API key to filter by
+        limit: Max rows to return (None = all)
+        offset: Rows to skip (prefer `cursor` for deep pages)
+        cursor: Keyset cursor from `insight_cursor()`: return rows after that one
+        include_snapshot: Load the legacy inline `analytics_snapshot` (deferred otherwise)
+
+    Returns:
+        InsightDB rows; `has_snapshot` is always populated.
+
+    Raises:
+        ValueError: If `cursor` is malformed.
+    """
+    query = (
         db.query(InsightDB)
+        .options(with_expression(InsightDB.has_snapshot, _has_snapshot_expr()))
         .filter(InsightDB.api_key == api_key)
-        .order_by(InsightDB.created_at.desc())
-        .all()
-    )
\ No newline at end of file
+    )
+    if not include_snapshot:
+        query = query.options(defer(InsightDB.analytics_snapshot))
+    if cursor is not None:
+        created_at, insight_id = _decode_cursor(cursor)
+        query = query.filter(or_(
+            InsightDB.created_at < created_at,
+            and_(InsightDB.created_at == created_at, InsightDB.id < insight_id),
+        ))
+    query = query.order_by(InsightDB.created_at.desc(), InsightDB.id.desc())
+    if offset:
+        query = query.offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+
+def get_insight_snapshot(db: Session, insight: InsightDB) -> Optional[dict]:
+    """Full snapshot stored with an insight (None if it has none)."""
+    if insight.snapshot_hash is not None:
+        return load_snapshot(db, insight.snapshot_hash)
+    return insight.analytics_snapshot
+
+
+def get_insight_metrics(db: Session, insights: List[InsightDB]) -> List[Optional[dict]]:
+    """
+    Headline snapshot metrics (see snapshots.METRIC_FIELDS) for each insight, in order.
+
+    Store-backed snapshots are read from `snapshots.metrics` in one query,
+    without decoding payloads; legacy inline snapshots are returned as stored.
+    """
+    metrics: Dict[str, dict] = load_snapshot_metrics(db, (i.snapshot_hash for i in insights))
+    return [
+        metrics.get(i.snapshot_hash) if i.snapshot_hash is not None else i.analytics_snapshot
+        for i in insights
+    ]
+
+
+def insight_cursor(insight: InsightDB) -> str:
+    """Opaque keyset cursor pointing just past `insight` in list order."""
+    raw = f"{insight.created_at.isoformat()}|{insight.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        created_at, insight_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(created_at), insight_id
+    except Exception as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def _has_snapshot_expr():
+    # NULL checks only: the (possibly large) legacy JSON value itself is never read.
+    return or_(InsightDB.snapshot_hash.isnot(None), InsightDB.analytics_snapshot.isnot(None))
@@ -0,0 +1,223 @@
+"""
+Snapshot Storage (content-addressed)
+
+Analytics snapshots attached to insights are stored once per distinct content:
+
+- the key is the sha256 of the snapshot's canonical JSON (sorted keys, no
+  whitespace), so saving an identical snapshot again is a no-op
+- a new snapshot is stored as a delta against the app's latest *full*
+  snapshot when that is smaller than SNAPSHOT_DELTA_MAX_RATIO of the full
+  JSON; otherwise it becomes a new full snapshot. Deltas never chain, so a
+  read decodes at most two payloads.
+- payloads are zlib-compressed (SNAPSHOT_COMPRESSION)
+- headline metrics (the fields compare/trends read) are kept uncompressed in
+  `metrics`, so comparisons don't decode payloads at all
+
+Delta format: {"s": {key: new value}, "d": [deleted keys], "n": {key: nested delta}}
+with empty parts omitted; nested deltas apply to dict values.
+
+`precomputed_snapshots` points at each app's latest scheduled snapshot (see
+app/workers/snapshot_scheduler.py); the helpers at the bottom read and
+invalidate it.
+"""
+
+import copy
+import hashlib
+import json
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Optional
+from sqlalchemy.orm import Session, load_only
+
+from app.analytics.insight_diff import COMPARED_FIELDS
+from app.core.config import (
+    ANALYTICS_SOURCE,
+    INGEST_WATERMARK_RESOLUTION_SECONDS,
+    SESSIONIZER_INTERVAL_SECONDS,
+    SESSIONIZER_LAG_SECONDS,
+    SNAPSHOT_COMPRESSION,
+    SNAPSHOT_DELTA_MAX_RATIO,
+    SNAPSHOT_MAX_AGE_SECONDS,
+)
+from app.db.models import AppKeyDB, PrecomputedSnapshotDB, SnapshotDB
+from app.db.upsert import insert_ignore_conflicts
+
+# Kept in `metrics`: what compare_snapshots and trend prompts read
+METRIC_FIELDS = COMPARED_FIELDS + ("sample",)
+
+
+def canonical_json(snapshot: dict) -> bytes:
+    return json.dumps(snapshot, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+
+
+def snapshot_hash(snapshot: dict) -> str:
+    return hashlib.sha256(canonical_json(snapshot)).hexdigest()
+
+
+def save_snapshot(db: Session, api_key: str, snapshot: dict) -> str:
+    """
+    Store a snapshot (if not stored yet) and return its hash. The caller commits.
+    """
+    data = canonical_json(snapshot)
+    key = hashlib.sha256(data).hexdigest()
+    if db.query(SnapshotDB.hash).filter(SnapshotDB.hash == key).first() is not None:
+        return key
+
+    # Round-trip through JSON so the delta base and the new snapshot compare like with like.
+    normalized = json.loads(data)
+    encoding, base_hash, raw = "full", None, data
+    base = _latest_full(db, api_key)
+    if base is not None:
+        delta = make_delta(_decode(base.payload, base.compression), normalized)
+        delta_raw = json.dumps(delta, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        if len(delta_raw) < SNAPSHOT_DELTA_MAX_RATIO * len(data):
+            encoding, base_hash, raw = "delta", base.hash, delta_raw
+
+    compression = "zlib" if SNAPSHOT_COMPRESSION == "zlib" else "none"
+    insert_ignore_conflicts(db, SnapshotDB, [{
+        "hash": key,
+        "api_key": api_key,
+        "encoding": encoding,
+        "base_hash": base_hash,
+        "compression": compression,
+        "payload": zlib.compress(raw, 6) if compression == "zlib" else raw,
+        "size_bytes": len(data),
+        "metrics": {field: normalized.get(field) for field in METRIC_FIELDS if field in normalized},
+    }], ["hash"])
+    return key
+
+
+def load_snapshot(db: Session, key: str) -> Optional[dict]:
+    """Return the full snapshot for a hash (None if unknown)."""
+    row = db.get(SnapshotDB, key)
+    if row is None:
+        return None
+    payload = _decode(row.payload, row.compression)
+    if row.encoding == "delta":
+        base = db.get(SnapshotDB, row.base_hash)
+        return apply_delta(_decode(base.payload, base.compression), payload)
+    return payload
+
+
+def load_snapshot_metrics(db: Session, keys: Iterable[str]) -> Dict[str, dict]:
+    """{hash: headline metrics} without reading payloads."""
+    keys = [key for key in set(keys) if key]
+    if not keys:
+        return {}
+    rows = db.query(SnapshotDB.hash, SnapshotDB.metrics).filter(SnapshotDB.hash.in_(keys)).all()
+    return {key: metrics for key, metrics in rows}
+
+
+def delete_snapshots(db: Session, api_key: str) -> None:
+    """Stage deletion of an app's snapshots (after its insights; the caller commits)."""
+    invalidate_precomputed_snapshot(db, api_key)
+    db.query(SnapshotDB).filter(SnapshotDB.api_key == api_key).delete(synchronize_session=False)
+
+
+def _latest_full(db: Session, api_key: str) -> Optional[SnapshotDB]:
+    return (
+        db.query(SnapshotDB)
+        .options(load_only(SnapshotDB.hash, SnapshotDB.payload, SnapshotDB.compression))
+        .filter(SnapshotDB.api_key == api_key, SnapshotDB.encoding == "full")
+        .order_by(SnapshotDB.created_at.desc())
+        .first()
+    )
+
+
+def _decode(payload: bytes, compression: str) -> Any:
+    raw = zlib.decompress(payload) if compression == "zlib" else payload
+    return json.loads(raw)
+
+
+# =============================================================================
+# Delta encoding
+# =============================================================================
+
+def make_delta(base: dict, new: dict) -> dict:
+    """Delta that turns `base` into `new` (see module docstring for the format)."""
+    changed, nested = {}, {}
+    for key, value in new.items():
+        if key not in base:
+            changed[key] = value
+        elif isinstance(value, dict) and isinstance(base[key], dict):
+            sub = make_delta(base[key], value)
+            if sub:
+                nested[key] = sub
+        elif base[key] != value or type(base[key]) is not type(value):
+            changed[key] = value
+    deleted = sorted(key for key in base if key not in new)
+
+    delta = {}
+    if changed:
+        delta["s"] = changed
+    if deleted:
+        delta["d"] = deleted
+    if nested:
+        delta["n"] = nested
+    return delta
+
+
+def apply_delta(base: dict, delta: dict) -> dict:
+    result = copy.deepcopy(base)
+    for key in delta.get("d", ()):
+        result.pop(key, None)
+    for key, sub in delta.get("n", {}).items():
+        result[key] = apply_delta(result.get(key) or {}, sub)
+    result.update(delta.get("s", {}))
+    return result
+
+
+# =============================================================================
+# Precomputed snapshots
+# =============================================================================
+
+def precomputed_is_fresh(computed_at: Optional[datetime], last_ingested_at: Optional[datetime]) -> bool:
+    """
+    True if a snapshot computed at `computed_at` includes every event ingested so far.
+
+    The watermark is only written once per INGEST_WATERMARK_RESOLUTION_SECONDS
+    (and the sessions table trails ingestion), so events may be up to that much
+    newer than `last_ingested_at`.
+    """
+    if computed_at is None:
+        return False
+    if last_ingested_at is None:
+        return True
+    margin = INGEST_WATERMARK_RESOLUTION_SECONDS
+    if ANALYTICS_SOURCE == "sessions":
+        margin += SESSIONIZER_LAG_SECONDS + SESSIONIZER_INTERVAL_SECONDS
+    return computed_at >= last_ingested_at + timedelta(seconds=margin)
+
+
+def get_precomputed_snapshot(
+    db: Session,
+    api_key: str,
+    max_age_seconds: float = SNAPSHOT_MAX_AGE_SECONDS,
+) -> Optional[dict]:
+    """
+    The app's precomputed snapshot, if it is up to date or at most
+    `max_age_seconds` old; None otherwise (the caller computes one inline).
+    """
+    row = (
+        db.query(PrecomputedSnapshotDB.snapshot_hash, PrecomputedSnapshotDB.computed_at, AppKeyDB.last_ingested_at)
+        .outerjoin(AppKeyDB, AppKeyDB.api_key == PrecomputedSnapshotDB.api_key)
+        .filter(PrecomputedSnapshotDB.api_key == api_key)
+        .first()
+    )
+    if row is None or row.snapshot_hash is None:
+        return None
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    recent = max_age_seconds > 0 and row.computed_at >= now - timedelta(seconds=max_age_seconds)
+    if not recent and not precomputed_is_fresh(row.computed_at, row.last_ingested_at):
+        return None
+    return load_snapshot(db, row.snapshot_hash)
+
+
+def invalidate_precomputed_snapshot(db: Session, api_key: str) -> None:
+    """
+    Stage removal of the app's precomputed snapshot (e.g. its funnels changed;
+    the caller commits). The scheduler picks the app up again.
+    """
+    db.query(PrecomputedSnapshotDB).filter(PrecomputedSnapshotDB.api_key == api_key).delete(
+        synchronize_session=False
+    )
@@ -0,0 +1,27 @@
+"""
+Worker State Storage
+
+Persistence helpers for `WorkerStateDB` records: the high-water marks that let
+background workers resume incrementally after a restart.
+"""
+
+from datetime import datetime
+from typing import Optional
+from sqlalchemy.orm import Session
+
+from app.db.models import WorkerStateDB
+
+
+def get_watermark(db: Session, name: str) -> Optional[datetime]:
+    """Return the stored high-water mark for a worker, or None if it never ran."""
+    state = db.get(WorkerStateDB, name)
+    return state.watermark_at if state is not None else None
+
+
+def set_watermark(db: Session, name: str, watermark_at: datetime) -> None:
+    """Stage a new high-water mark for a worker (the caller commits)."""
+    state = db.get(WorkerStateDB, name)
+    if state is None:
+        db.add(WorkerStateDB(name=name, watermark_at=watermark_at))
+    else:
+        state.watermark_at = watermark_at
@@ -0,0 +1,56 @@
+"""
+Background Workers Entry Point
+
+Runs every background worker in one process:
+
+    python -m app.workers
+
+Run exactly one instance of this process per database; the API workers
+(gunicorn) do not start background jobs themselves.
+"""
+
+import logging
+
+from app.core.config import ANOMALY_INTERVAL_SECONDS, INSIGHT_JOB_MODE, SCHEMA_SETUP, SNAPSHOT_SCHEDULE_INTERVAL_SECONDS
+from app.db.database import engine
+from app.db.schema import ensure_schema
+from app.storage.cold import cold_enabled
+from app.workers import (
+    anomaly_detector,
+    compactor,
+    insight_jobs,
+    property_catalog,
+    purger,
+    sessionizer,
+    snapshot_scheduler,
+)
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    if SCHEMA_SETUP == "startup":
+        ensure_schema(engine)
+    workers = [
+        sessionizer.create_worker(),
+        purger.create_worker(),
+        property_catalog.create_worker(),
+    ]
+    if cold_enabled():
+        workers.append(compactor.create_worker())
+    if ANOMALY_INTERVAL_SECONDS > 0:
+        workers.append(anomaly_detector.create_worker())
+    if SNAPSHOT_SCHEDULE_INTERVAL_SECONDS > 0:
+        workers.append(snapshot_scheduler.create_worker())
+    if INSIGHT_JOB_MODE == "external":
+        workers.extend(insight_jobs.create_workers())
+    for worker in workers[1:]:
+        worker.start()
+    try:
+        workers[0].run_forever()
+    finally:
+        for worker in workers[1:]:
+            worker.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Anomaly Detector
+
+Scores the per-minute event counters maintained by ingestion (`event_counters`,
+see app/storage/events.py) against each series' baseline (app/analytics/anomaly.py)
+and records spikes in `anomalies`, which the dashboard polls through
+`GET /analytics/anomalies`.
+
+Each tick:
+1. Reads the counters of every minute that closed (ended more than
+   ANOMALY_LAG_SECONDS ago) since the stored high-water mark, oldest first.
+   Only these small rows are read, never `events`.
+2. For each (app, event name, minute): folds missed zero-minutes into the
+   series' baseline, scores the count, and updates the baseline.
+3. An anomalous minute right after another one of the same series extends
+   that anomaly instead of opening a new one.
+4. Advances the high-water mark in the same transaction.
+
+On its first run the detector starts at the latest closed minute (history is
+not replayed).
+
+Run standalone with: python -m app.workers.anomaly_detector
+"""
+
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, Tuple
+from sqlalchemy.orm import Session
+
+from app.analytics import anomaly
+from app.core.config import ANOMALY_INTERVAL_SECONDS, ANOMALY_LAG_SECONDS
+from app.db.models import AnomalyBaselineDB, AnomalyDB, AppKeyDB, EventCounterDB, EventNameDB
+from app.storage.worker_state import get_watermark, set_watermark
+from app.workers.runner import PeriodicWorker
+
+logger = logging.getLogger(__name__)
+
+WORKER_NAME = "anomaly-detector"
+
+# Closed minutes scored per tick (a backlog is worked off over several ticks).
+_MAX_MINUTES_PER_TICK = 60
+
+
+def detect_once(db: Session, now_ms: int | None = None) -> bool:
+    """
+    Score the minutes that closed since the last tick.
+
+    Returns:
+        True if closed minutes remain (catching up after downtime).
+    """
+    now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+    closed_until = anomaly.minute_of(now_ms - int(ANOMALY_LAG_SECONDS * 1000))  # exclusive
+    watermark = get_watermark(db, WORKER_NAME)
+    start = _to_ms(watermark) if watermark is not None else closed_until - anomaly.MINUTE_MS
+    end = min(closed_until, start + _MAX_MINUTES_PER_TICK * anomaly.MINUTE_MS)
+    if end <= start:
+        return False
+
+    counters = (
+        db.query(EventCounterDB.app_key_id, EventCounterDB.event_name_id, EventCounterDB.minute_ms, EventCounterDB.count)
+        .filter(EventCounterDB.minute_ms >= start, EventCounterDB.minute_ms < end)
+        .order_by(EventCounterDB.minute_ms)
+        .all()
+    )
+    if counters:
+        _score(db, counters)
+
+    set_watermark(db, WORKER_NAME, _from_ms(end))
+    db.commit()
+    return end < closed_until
+
+
+def _score(db: Session, counters: list) -> None:
+    app_ids = {row.app_key_id for row in counters}
+    api_keys = dict(db.query(AppKeyDB.id, AppKeyDB.api_key).filter(AppKeyDB.id.in_(app_ids)).all())
+    names = dict(db.query(EventNameDB.id, EventNameDB.name).filter(EventNameDB.app_key_id.in_(app_ids)).all())
+    baselines: Dict[Tuple[int, int], AnomalyBaselineDB] = {
+        (b.app_key_id, b.event_name_id): b
+        for b in db.query(AnomalyBaselineDB).filter(AnomalyBaselineDB.app_key_id.in_(app_ids)).all()
+    }
+
+    for app_key_id, event_name_id, minute_ms, count in counters:
+        api_key, name = api_keys.get(app_key_id), names.get(event_name_id)
+        if api_key is None or name is None:
+            continue  # purged meanwhile
+        state = baselines.get((app_key_id, event_name_id))
+        if state is None:
+            state = AnomalyBaselineDB(app_key_id=app_key_id, event_name_id=event_name_id)
+            anomaly.init_state(state, minute_ms)
+            db.add(state)
+            baselines[(app_key_id, event_name_id)] = state
+
+        continues_open = state.open_anomaly_id is not None and state.last_minute_ms == minute_ms - anomaly.MINUTE_MS
+        anomaly.catch_up(state, minute_ms)
+        expected, z, anomalous = anomaly.score(state, minute_ms, count, is_error="error" in name.lower())
+
+        if not anomalous:
+            state.open_anomaly_id = None
+            anomaly.observe(state, minute_ms, count)
+            continue
+
+        learn = anomaly.clamp(state, minute_ms, count)
+        if continues_open:
+            _extend(db, state.open_anomaly_id, minute_ms, count, expected, z)
+        else:
+            record = AnomalyDB(
+                api_key=api_key,
+                event_name=name,
+                is_error="error" in name.lower(),
+                severity=anomaly.severity(z),
+                start_ms=minute_ms,
+                end_ms=minute_ms + anomaly.MINUTE_MS,
+                observed=count,
+                expected=round(expected, 3),
+                score=round(z, 2),
+            )
+            db.add(record)
+            db.flush()
+            state.open_anomaly_id = record.id
+            logger.info("Anomaly: api_key=%s event=%s count=%d expected=%.1f z=%.1f", api_key, name, count, expected, z)
+        anomaly.observe(state, minute_ms, learn)
+
+
+def _extend(db: Session, anomaly_id: int, minute_ms: int, count: int, expected: float, z: float) -> None:
+    record = db.get(AnomalyDB, anomaly_id)
+    if record is None:
+        return
+    record.end_ms = minute_ms + anomaly.MINUTE_MS
+    if z > record.score:
+        record.observed, record.expected, record.score = count, round(expected, 3), round(z, 2)
+        record.severity = anomaly.severity(z)
+    record.updated_at = datetime.now(timezone.utc)
+
+
+def _to_ms(dt: datetime) -> int:
+    return int(dt.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _from_ms(ts_ms: int) -> datetime:
+    # worker_state stores naive UTC
+    return datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc).replace(tzinfo=None)
+
+
+def create_worker() -> PeriodicWorker:
+    return PeriodicWorker(WORKER_NAME, detect_once, ANOMALY_INTERVAL_SECONDS)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    create_worker().run_forever()
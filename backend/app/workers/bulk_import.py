@@ -0,0 +1,389 @@
+"""
+Bulk Event Import
+
+Loads historical events for one api_key from NDJSON, CSV or Parquet files
+(NDJSON/CSV may be gzip-compressed), far faster than posting SDK batches:
+
+- records are read and validated BULK_IMPORT_CHUNK_ROWS at a time, with the
+  same rules as `Event`; invalid records are counted (the first few reported)
+  and skipped, not fatal
+- event names and session ids are dictionary-encoded once per chunk
+- Postgres: each chunk is COPYed into a temp staging table and moved into
+  `events` with one INSERT ... SELECT; SQLite: multi-row INSERTs
+- events whose `event_id` the app already has are skipped (unique index on
+  (app_key_id, event_id)), so an interrupted import can simply be re-run.
+  Events already moved to cold storage are not checked.
+- with `defer_indexes` (command line only), the secondary `events` indexes are
+  dropped for the load and rebuilt once at the end, even when it fails. They
+  are the whole database's indexes, not the app's: for initial loads during a
+  maintenance window, with the API and workers stopped. If the process dies
+  mid-load, the next schema setup (process startup, or
+  `python -m app.db.migrate --if-needed`) recreates them.
+- progress is written to `bulk_imports` after every chunk
+
+Imported events skip the anomaly counters and the ingestion watermark (they
+are history, not live traffic); the sessionizer picks them up like new rows.
+
+Imports run one at a time per process, in a background thread of the API
+(`POST /admin/imports`, never with deferred indexes) or from the command line:
+
+    python -m app.workers.bulk_import events.ndjson.gz --api-key app_XXXX [--format ndjson] [--defer-indexes]
+
+Record fields: event_name, timestamp_ms, session_id, platform, and optionally
+properties (object, or JSON string in CSV) and event_id.
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex, DropIndex
+
+from app.core.config import BULK_IMPORT_CHUNK_ROWS, SCHEMA_SETUP
+from app.db.database import SessionLocal, engine
+from app.db.models import IMPORT_FAILED, IMPORT_RUNNING, IMPORT_SUCCEEDED, EventDB
+from app.db.schema import dialect_indexes, ensure_schema, invalidate_schema
+from app.storage.dictionary import get_app_key_id, get_event_name_ids, get_session_key_ids, register_property_keys
+from app.storage.imports import create_import, get_import, update_import
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("ndjson", "csv", "parquet")
+
+# Validation errors kept per import
+MAX_REPORTED_ERRORS = 20
+
+_STAGING_TABLE = "bulk_import_staging"
+
+# One import at a time per process (they compete for the same disk and indexes)
+_import_lock = threading.Lock()
+
+Row = Tuple[str, int, str, str, dict, Optional[str]]  # event_name, timestamp_ms, session_id, platform, properties, event_id
+
+
+def detect_format(path: str) -> Optional[str]:
+    """Format from the file name (`events.ndjson.gz` -> "ndjson")."""
+    name = path.lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    if name.endswith((".ndjson", ".jsonl", ".json")):
+        return "ndjson"
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith(".parquet"):
+        return "parquet"
+    return None
+
+
+def run_import(
+    import_id: str,
+    path: str,
+    fmt: str,
+    *,
+    defer_indexes: bool = False,
+    delete_after: bool = False,
+) -> None:
+    """Load one file into the import's api_key, recording progress on the import row."""
+    with _import_lock:
+        db = SessionLocal()
+        try:
+            _run(db, import_id, path, fmt, defer_indexes)
+        except Exception as exc:
+            logger.exception("Bulk import %s failed", import_id)
+            db.rollback()
+            update_import(
+                db, import_id, status=IMPORT_FAILED, error=f"{type(exc).__name__}: {exc}"[:500],
+                finished_at=datetime.now(timezone.utc),
+            )
+        finally:
+            db.close()
+            if delete_after:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def _run(db: Session, import_id: str, path: str, fmt: str, defer_indexes: bool) -> None:
+    job = get_import(db, import_id)
+    app_key_id = get_app_key_id(db, job.api_key, create=True)
+    if app_key_id is None:
+        raise LookupError("api_key belongs to a deleted app")
+    update_import(db, import_id, status=IMPORT_RUNNING, started_at=datetime.now(timezone.utc))
+
+    bind = db.get_bind()
+    if defer_indexes:
+        _drop_indexes(bind)
+    counts = {"rows_read": 0, "rows_inserted": 0, "rows_duplicate": 0, "rows_invalid": 0}
+    errors: List[str] = []
+    started = time.monotonic()
+    try:
+        for records in read_records(path, fmt, BULK_IMPORT_CHUNK_ROWS):
+            rows = []
+            for line, record in records:
+                try:
+                    rows.append(validate_record(record))
+                except (TypeError, ValueError) as exc:
+                    counts["rows_invalid"] += 1
+                    if len(errors) < MAX_REPORTED_ERRORS:
+                        errors.append(f"line {line}: {exc}")
+            inserted = load_rows(db, app_key_id, rows)
+            counts["rows_read"] += len(records)
+            counts["rows_inserted"] += inserted
+            counts["rows_duplicate"] += len(rows) - inserted
+            update_import(db, import_id, errors=errors or None, **counts)
+    finally:
+        if defer_indexes:
+            index_started = time.monotonic()
+            _create_indexes(bind)
+            ensure_schema(bind)  # records the fingerprint _drop_indexes removed
+            logger.info("Rebuilt event indexes in %.1f s", time.monotonic() - index_started)
+
+    update_import(db, import_id, status=IMPORT_SUCCEEDED, finished_at=datetime.now(timezone.utc))
+    elapsed = time.monotonic() - started
+    logger.info(
+        "Bulk import %s: %d rows read, %d inserted, %d duplicate, %d invalid in %.1f s (%.0f rows/s)",
+        import_id, counts["rows_read"], counts["rows_inserted"], counts["rows_duplicate"],
+        counts["rows_invalid"], elapsed, counts["rows_read"] / elapsed if elapsed else 0,
+    )
+
+
+# =============================================================================
+# Reading and validation
+# =============================================================================
+
+def read_records(path: str, fmt: str, chunk_rows: int) -> Iterator[List[Tuple[int, dict]]]:
+    """Yield chunks of `(line_number, record)`; unparseable lines become `{"_error": ...}`."""
+    if fmt == "parquet":
+        yield from _read_parquet(path, chunk_rows)
+        return
+    with _open_text(path) as f:
+        if fmt == "csv":
+            reader = csv.DictReader(f)
+            numbered = ((reader.line_num, record) for record in reader)
+        else:
+            numbered = ((line_no, _parse_json_line(line)) for line_no, line in enumerate(f, 1) if line.strip())
+        chunk: List[Tuple[int, dict]] = []
+        for item in numbered:
+            chunk.append(item)
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def _read_parquet(path: str, chunk_rows: int) -> Iterator[List[Tuple[int, dict]]]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as exc:  # pragma: no cover - depends on environment
+        raise RuntimeError("Parquet imports require pyarrow (pip install pyarrow)") from exc
+    row = 0
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+        records = batch.to_pylist()
+        yield list(enumerate(records, row + 1))
+        row += len(records)
+
+
+def _open_text(path: str):
+    with open(path, "rb") as f:
+        magic = f.read(2)
+    if magic == b"\x1f\x8b":
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def _parse_json_line(line: str) -> dict:
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return {"_error": "invalid JSON"}
+    return record if isinstance(record, dict) else {"_error": "not a JSON object"}
+
+
+def validate_record(record: dict) -> Row:
+    """Check one record against the `Event` rules; raises ValueError with the reason."""
+    if "_error" in record:
+        raise ValueError(record["_error"])
+    event_name = record.get("event_name")
+    if not isinstance(event_name, str) or not event_name:
+        raise ValueError("event_name must be a non-empty string")
+    timestamp_ms = record.get("timestamp_ms")
+    if isinstance(timestamp_ms, str):
+        timestamp_ms = int(timestamp_ms) if timestamp_ms.lstrip("-").isdigit() else None
+    if not isinstance(timestamp_ms, int) or isinstance(timestamp_ms, bool):
+        raise ValueError("timestamp_ms must be an integer")
+    session_id = record.get("session_id")
+    if not isinstance(session_id, str) or not session_id:
+        raise ValueError("session_id must be a non-empty string")
+    platform = record.get("platform")
+    if not isinstance(platform, str):
+        raise ValueError("platform must be a string")
+
+    properties = record.get("properties")
+    if properties is None or properties == "":
+        properties = {}
+    elif isinstance(properties, str):
+        properties = json.loads(properties)
+    if not isinstance(properties, dict):
+        raise ValueError("properties must be an object")
+    for value in properties.values():
+        if value is not None and not isinstance(value, (str, int, float, bool)):
+            raise ValueError("property values must be strings, numbers, booleans or null")
+
+    event_id = record.get("event_id")
+    if event_id == "" or event_id is None:
+        event_id = None
+    elif not isinstance(event_id, (str, int)):
+        raise ValueError("event_id must be a string")
+    return event_name, timestamp_ms, session_id, platform, properties, str(event_id) if event_id is not None else None
+
+
+# =============================================================================
+# Loading
+# =============================================================================
+
+def load_rows(db: Session, app_key_id: int, rows: List[Row]) -> int:
+    """Insert validated rows, skipping known event_ids. Returns the number inserted."""
+    if not rows:
+        return 0
+    name_ids = get_event_name_ids(db, app_key_id, {row[0] for row in rows}, create=True)
+    session_ids = get_session_key_ids(db, app_key_id, {row[2] for row in rows}, create=True)
+    created_at = datetime.now(timezone.utc)
+    encoded = [
+        (name_ids[name], session_ids[session_id], timestamp_ms, platform, properties, event_id)
+        for name, timestamp_ms, session_id, platform, properties, event_id in rows
+    ]
+    if db.get_bind().dialect.name == "postgresql":
+        inserted = _copy_rows(db, app_key_id, encoded, created_at)
+    else:
+        inserted = _insert_rows(db, app_key_id, encoded, created_at)
+    register_property_keys(db, app_key_id, (row[4] for row in rows))
+    db.commit()
+    return inserted
+
+
+def _insert_rows(db: Session, app_key_id: int, encoded: list, created_at: datetime) -> int:
+    # Driver-level executemany: SQLAlchemy's per-row parameter processing would
+    # cost more than the inserts themselves. Values are stored the way the
+    # column types store them (JSON text, naive UTC timestamp).
+    created = created_at.replace(tzinfo=None).strftime("%Y-%m-%d %H:%M:%S.%f")
+    result = db.connection().exec_driver_sql(
+        "INSERT INTO events "
+        "(app_key_id, event_name_id, session_key_id, timestamp_ms, platform, properties, event_id, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT (app_key_id, event_id) WHERE event_id IS NOT NULL DO NOTHING",
+        [
+            (app_key_id, event_name_id, session_key_id, timestamp_ms, platform,
+             json.dumps(properties, separators=(",", ":")), event_id, created)
+            for event_name_id, session_key_id, timestamp_ms, platform, properties, event_id in encoded
+        ],
+    )
+    return result.rowcount
+
+
+def _copy_rows(db: Session, app_key_id: int, encoded: list, created_at: datetime) -> int:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows(
+        (event_name_id, session_key_id, timestamp_ms, platform, json.dumps(properties, separators=(",", ":")), event_id)
+        for event_name_id, session_key_id, timestamp_ms, platform, properties, event_id in encoded
+    )
+    buffer.seek(0)
+
+    cursor = db.connection().connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS {_STAGING_TABLE} ("
+            "event_name_id integer, session_key_id bigint, timestamp_ms bigint, "
+            "platform text, properties json, event_id text) ON COMMIT DELETE ROWS"
+        )
+        copy_sql = f"COPY {_STAGING_TABLE} FROM STDIN WITH (FORMAT csv)"
+        if hasattr(cursor, "copy_expert"):  # psycopg2
+            cursor.copy_expert(copy_sql, buffer)
+        else:  # psycopg 3
+            with cursor.copy(copy_sql) as copy:
+                copy.write(buffer.getvalue())
+        cursor.execute(
+            "INSERT INTO events "
+            "(app_key_id, event_name_id, session_key_id, timestamp_ms, platform, properties, event_id, created_at) "
+            f"SELECT %s, event_name_id, session_key_id, timestamp_ms, platform, properties, event_id, %s "
+            f"FROM {_STAGING_TABLE} "
+            "ON CONFLICT (app_key_id, event_id) WHERE event_id IS NOT NULL DO NOTHING",
+            (app_key_id, created_at.replace(tzinfo=None)),
+        )
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+def _deferrable_indexes(bind) -> list:
+    # Everything but the dedupe index, which the load itself relies on
+    return [index for index in dialect_indexes(EventDB.__table__, bind) if not index.unique]
+
+
+def _drop_indexes(bind) -> None:
+    # Should this process die before _create_indexes, the next schema setup
+    # finds no fingerprint and recreates the indexes.
+    invalidate_schema(bind)
+    indexes = _deferrable_indexes(bind)
+    for index in indexes:
+        with bind.begin() as conn:
+            conn.execute(DropIndex(index, if_exists=True))
+    logger.info("Dropped %d event indexes for the load", len(indexes))
+
+
+def _create_indexes(bind) -> None:
+    for index in _deferrable_indexes(bind):
+        with bind.begin() as conn:
+            conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk-load historical events for one api_key.")
+    parser.add_argument("path", help="NDJSON, CSV or Parquet file (NDJSON/CSV may be gzipped)")
+    parser.add_argument("--api-key", required=True)
+    parser.add_argument("--format", choices=FORMATS, help="default: from the file name")
+    parser.add_argument(
+        "--defer-indexes",
+        action="store_true",
+        help="drop the secondary events indexes during the load (maintenance only: stop the API and workers first)",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    fmt = args.format or detect_format(args.path)
+    if fmt is None:
+        parser.error("cannot tell the format from the file name; pass --format")
+    if SCHEMA_SETUP == "startup":
+        ensure_schema(engine)
+    db = SessionLocal()
+    try:
+        job = create_import(db, args.api_key, os.path.abspath(args.path), fmt)
+    finally:
+        db.close()
+    run_import(job.id, args.path, fmt, defer_indexes=args.defer_indexes)
+
+    db = SessionLocal()
+    try:
+        job = get_import(db, job.id)
+        print(json.dumps({
+            "id": job.id, "status": job.status, "rows_read": job.rows_read, "rows_inserted": job.rows_inserted,
+            "rows_duplicate": job.rows_duplicate, "rows_invalid": job.rows_invalid, "errors": job.errors,
+            "error": job.error,
+        }, indent=2))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Cold Storage Compactor
+
+Moves events whose timestamp is older than COLD_STORAGE_AFTER_DAYS out of the
+`events` table into per-app, per-day Arrow files (see app/storage/cold.py).
+
+Each tick handles one (app, day) slice, up to COLD_COMPACTION_BATCH_ROWS rows:
+1. Read the slice's rows (ordered by id) from `events`.
+2. Merge them into the day file (written atomically; duplicates by id dropped).
+3. Delete exactly those rows (by id, so concurrently inserted late events stay).
+
+If the process dies between 2 and 3, the next tick re-reads the same rows and
+the merge de-duplicates them, so no event is lost or stored twice.
+
+Run standalone with: python -m app.workers.compactor
+"""
+
+import logging
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import COLD_COMPACTION_BATCH_ROWS, COLD_COMPACTION_INTERVAL_SECONDS
+from app.db.models import EventDB
+from app.storage import cold
+from app.workers.runner import PeriodicWorker
+
+logger = logging.getLogger(__name__)
+
+WORKER_NAME = "compactor"
+
+# Ids per DELETE statement (keeps IN (...) lists bounded).
+_DELETE_CHUNK = 10_000
+
+
+def compact_once(db: Session, batch_rows: int = COLD_COMPACTION_BATCH_ROWS) -> bool:
+    """
+    Compact one (app, day) slice.
+
+    Returns:
+        True if a slice was compacted (more may be pending).
+    """
+    if not cold.cold_enabled():
+        return False
+
+    cutoff_ms = cold.cold_cutoff_ms()
+    oldest = (
+        db.query(EventDB.app_key_id, func.min(EventDB.timestamp_ms))
+        .filter(EventDB.timestamp_ms < cutoff_ms)
+        .group_by(EventDB.app_key_id)
+        .first()
+    )
+    if oldest is None:
+        return False
+
+    app_key_id, oldest_ts = oldest
+    day = cold.day_of(oldest_ts)
+    day_start, day_end = cold.day_bounds_ms(day)
+    day_end = min(day_end, cutoff_ms)
+
+    in_slice = (
+        (EventDB.app_key_id == app_key_id)
+        & (EventDB.timestamp_ms >= day_start)
+        & (EventDB.timestamp_ms < day_end)
+    )
+    rows = (
+        db.query(
+            EventDB.id,
+            EventDB.session_key_id,
+            EventDB.event_name_id,
+            EventDB.timestamp_ms,
+            EventDB.platform,
+            EventDB.properties,
+            EventDB.created_at,
+        )
+        .filter(in_slice)
+        .order_by(EventDB.id)
+        .limit(batch_rows)
+        .all()
+    )
+    if not rows:
+        return False
+
+    total = cold.write_day(app_key_id, day, [row._asdict() for row in rows])
+
+    ids = [row.id for row in rows]
+    for i in range(0, len(ids), _DELETE_CHUNK):
+        db.query(EventDB).filter(EventDB.id.in_(ids[i:i + _DELETE_CHUNK])).delete(synchronize_session=False)
+    db.commit()
+
+    logger.info(
+        "Compacted %d events for app_key_id=%s day=%s (file now %d rows)",
+        len(rows), app_key_id, day, total,
+    )
+    return True
+
+
+def create_worker() -> PeriodicWorker:
+    return PeriodicWorker(WORKER_NAME, compact_once, COLD_COMPACTION_INTERVAL_SECONDS)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    create_worker().run_forever()
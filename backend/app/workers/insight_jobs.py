@@ -0,0 +1,178 @@
+"""
+Insight Job Worker
+
+Runs queued insight generation jobs (see app/storage/insight_jobs.py): takes
+the app's precomputed snapshot (app/workers/snapshot_scheduler.py) or builds
+one, calls the LLM and saves the insight, recording the
+current stage on the job so `GET /analytics/insights/jobs/{job_id}` can report
+progress. A heartbeat thread keeps a long-running job from being re-queued as
+stale; if it is re-queued anyway (the worker stalled), the late result is
+dropped rather than saved next to the new claim's.
+
+Workers run either inside each API process (INSIGHT_JOB_MODE=inprocess, a small
+thread pool that is woken as soon as that process queues a job) or in
+`python -m app.workers` (INSIGHT_JOB_MODE=external). Either way the database is
+the queue, so any number of workers can share it.
+
+Run standalone with: python -m app.workers.insight_jobs
+"""
+
+import logging
+import threading
+from typing import List
+from sqlalchemy.orm import Session
+
+from app.core.config import (
+    INSIGHT_JOB_MAX_ATTEMPTS,
+    INSIGHT_JOB_POLL_SECONDS,
+    INSIGHT_JOB_STALE_SECONDS,
+    INSIGHT_WORKER_THREADS,
+)
+from app.db.database import SessionLocal
+from app.insights.generator import generate_insights
+from app.insights.prompts import build_insight_prompt
+from app.insights.snapshot import build_analytics_snapshot
+from app.storage.insight_jobs import (
+    claim_next_job,
+    complete_job,
+    fail_job,
+    heartbeat_job,
+    requeue_stale_jobs,
+    set_job_stage,
+)
+from app.storage.insights import stage_insight
+from app.storage.snapshots import get_precomputed_snapshot
+from app.workers.runner import PeriodicWorker
+
+logger = logging.getLogger(__name__)
+
+WORKER_NAME = "insight-jobs"
+
+# Heartbeats per INSIGHT_JOB_STALE_SECONDS: a few may be missed before a
+# running job looks stale
+HEARTBEAT_FRACTION = 0.25
+
+# Threads started by start_pool() in this process
+_pool: List[PeriodicWorker] = []
+
+
+def run_next_job(db: Session) -> bool:
+    """
+    Run one queued job to completion.
+
+    Returns:
+        True if a job was run (more may be queued).
+    """
+    job = claim_next_job(db)
+    if job is None:
+        requeue_stale_jobs(db, INSIGHT_JOB_STALE_SECONDS, INSIGHT_JOB_MAX_ATTEMPTS)
+        return False
+
+    # The claim is identified by the attempt number it set; every later write
+    # is conditional on it (see app/storage/insight_jobs.py).
+    job_id, attempt, api_key, sample = job.id, job.attempts, job.api_key, job.sample
+    logger.info("Running insight job %s for api_key=%s (attempt %d)", job_id, api_key, attempt)
+    try:
+        with _Heartbeat(job_id, attempt):
+            if not set_job_stage(db, job_id, attempt, "snapshot"):
+                return _lost(job_id, attempt)
+            # An exact precomputed snapshot beats a sampled one computed now.
+            snapshot = get_precomputed_snapshot(db, api_key)
+            if snapshot is None:
+                snapshot = build_analytics_snapshot(db, api_key, sample=sample)
+
+            if not set_job_stage(db, job_id, attempt, "llm"):
+                return _lost(job_id, attempt)
+            insight = generate_insights(build_insight_prompt(snapshot))
+
+            if not set_job_stage(db, job_id, attempt, "saving"):
+                return _lost(job_id, attempt)
+            saved = stage_insight(db, api_key, insight, snapshot=snapshot)
+            if not complete_job(db, job_id, attempt, saved.id):
+                return _lost(job_id, attempt)
+    except Exception as exc:
+        db.rollback()
+        logger.exception("Insight job %s failed", job_id)
+        fail_job(db, job_id, attempt, str(exc) or type(exc).__name__)
+    return True
+
+
+def _lost(job_id: str, attempt: int) -> bool:
+    logger.warning("Insight job %s was re-queued while attempt %d ran; dropping its result", job_id, attempt)
+    return True
+
+
+class _Heartbeat:
+    """
+    Bump a running job's `updated_at` every HEARTBEAT_FRACTION of
+    INSIGHT_JOB_STALE_SECONDS from a thread with its own session, so a long
+    snapshot build or LLM call is not mistaken for a dead worker. Stops once
+    the claim no longer owns the job.
+    """
+
+    def __init__(self, job_id: str, attempt: int):
+        self.job_id = job_id
+        self.attempt = attempt
+        self.interval_seconds = INSIGHT_JOB_STALE_SECONDS * HEARTBEAT_FRACTION
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"insight-job-heartbeat-{job_id}", daemon=True)
+
+    def __enter__(self) -> "_Heartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            db = SessionLocal()
+            try:
+                if not heartbeat_job(db, self.job_id, self.attempt):
+                    return
+            except Exception:
+                db.rollback()
+                logger.exception("Heartbeat for insight job %s failed", self.job_id)
+            finally:
+                db.close()
+
+
+def create_workers(count: int = INSIGHT_WORKER_THREADS) -> List[PeriodicWorker]:
+    return [
+        PeriodicWorker(f"{WORKER_NAME}-{i}", run_next_job, INSIGHT_JOB_POLL_SECONDS)
+        for i in range(max(1, count))
+    ]
+
+
+def start_pool(count: int = INSIGHT_WORKER_THREADS) -> None:
+    """Start the in-process job threads (idempotent)."""
+    if _pool:
+        return
+    _pool.extend(create_workers(count))
+    for worker in _pool:
+        worker.start()
+
+
+def stop_pool() -> None:
+    for worker in _pool:
+        worker.stop()
+    _pool.clear()
+
+
+def notify_job_queued() -> None:
+    """Wake the in-process pool so a newly queued job starts without waiting for the next poll."""
+    for worker in _pool:
+        worker.wake()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    workers = create_workers()
+    for worker in workers[1:]:
+        worker.start()
+    try:
+        workers[0].run_forever()
+    finally:
+        for worker in workers[1:]:
+            worker.stop()
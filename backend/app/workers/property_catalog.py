@@ -0,0 +1,71 @@
+"""
+Property Catalog Backfill
+
+Ingestion and bulk imports register the property keys of the events they
+write (app/storage/dictionary.py), so the catalog behind
+`GET /analytics/properties` stays current on its own. Events stored before the
+catalog existed were never registered; this worker fills that gap once:
+
+- every live app's catalog is seeded from its PROPERTY_CATALOG_SEED_EVENTS
+  most recent events (hot table, newest first on `ix_events_app_ts`)
+- apps are handled one transaction each, so an interrupted run just repeats
+  the apps it hadn't finished
+- completion is recorded as the worker's watermark; later ticks only read it
+
+Run standalone with: python -m app.workers.property_catalog
+"""
+
+import logging
+from datetime import datetime, timezone
+from sqlalchemy.orm import Session
+
+from app.db.models import AppKeyDB, EventDB
+from app.storage.dictionary import register_property_keys
+from app.storage.worker_state import get_watermark, set_watermark
+from app.workers.runner import PeriodicWorker
+
+logger = logging.getLogger(__name__)
+
+WORKER_NAME = "property-catalog"
+
+# Recent events read per app
+PROPERTY_CATALOG_SEED_EVENTS = 10_000
+
+# Only the first tick after a deploy has work; later ones just check the watermark
+INTERVAL_SECONDS = 3600
+
+
+def seed_once(db: Session) -> bool:
+    """
+    Seed every live app's property catalog, unless that was already done.
+
+    Returns:
+        Always False (the whole backfill runs in one tick).
+    """
+    if get_watermark(db, WORKER_NAME) is not None:
+        return False
+
+    app_key_ids = [row.id for row in db.query(AppKeyDB.id).filter(AppKeyDB.deleted_at.is_(None)).all()]
+    for app_key_id in app_key_ids:
+        recent = (
+            db.query(EventDB.properties)
+            .filter(EventDB.app_key_id == app_key_id)
+            .order_by(EventDB.timestamp_ms.desc())
+            .limit(PROPERTY_CATALOG_SEED_EVENTS)
+        )
+        register_property_keys(db, app_key_id, [props for (props,) in recent])
+        db.commit()
+
+    set_watermark(db, WORKER_NAME, datetime.now(timezone.utc))
+    db.commit()
+    logger.info("Seeded property catalogs of %d apps", len(app_key_ids))
+    return False
+
+
+def create_worker() -> PeriodicWorker:
+    return PeriodicWorker(WORKER_NAME, seed_once, INTERVAL_SECONDS)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    create_worker().run_once()
@@ -0,0 +1,304 @@
+"""
+Event Purger
+
+Keeps `events` (and everything derived from it) bounded:
+
+1. Deleted apps: `delete_app` only tombstones the app's keys
+   (`app_keys.deleted_at`). Once no process can still resolve a key
+   (DELETED_APP_GRACE_SECONDS), this worker removes its events, sessions,
+   dictionary rows and cold files. The tombstoned key row is kept so
+   ingestion keeps rejecting the key.
+2. Retention: events older than the app's `retention_days` (or
+   EVENT_RETENTION_DAYS) are deleted, together with sessions that ended before
+   the cutoff. Cold day files entirely before the cutoff are removed whole,
+   which is the cheap "drop a partition" path. Events received within the
+   dictionary cache TTL are kept a little longer, so a session key an API
+   process still caches is never deleted (app/storage/dictionary.py).
+   Session keys that nothing references any more (no event, hot or cold, and
+   no session), such as those whose events went to cold files that retention
+   dropped, are removed by a pass over each app's keys once every
+   ORPHAN_SCAN_INTERVAL_SECONDS, resumed across ticks.
+3. Cached LLM responses older than LLM_CACHE_TTL_SECONDS are deleted, and so
+   are anomaly-detection counters and anomalies past their retention.
+
+Deletes run in chunks of PURGE_CHUNK_SIZE rows, each in its own short
+transaction, with a PURGE_CHUNK_SLEEP_SECONDS pause in between so ingestion
+never waits behind a long-running delete. A tick stops after
+PURGE_MAX_CHUNKS_PER_TICK chunks and reports that more work is pending.
+
+Run standalone with: python -m app.workers.purger
+"""
+
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+from sqlalchemy import exists, or_
+from sqlalchemy.orm import Session
+
+from app.core.config import (
+    ANOMALY_COUNTER_RETENTION_HOURS,
+    ANOMALY_RETENTION_DAYS,
+    EVENT_RETENTION_DAYS,
+    LLM_CACHE_TTL_SECONDS,
+    PURGE_CHUNK_SIZE,
+    PURGE_CHUNK_SLEEP_SECONDS,
+    PURGE_INTERVAL_SECONDS,
+    PURGE_MAX_CHUNKS_PER_TICK,
+)
+from app.db.models import (
+    AnomalyBaselineDB,
+    AnomalyDB,
+    AppDB,
+    AppKeyDB,
+    EventCounterDB,
+    EventDB,
+    EventNameDB,
+    LLMResponseDB,
+    PropertyKeyDB,
+    SessionDB,
+    SessionKeyDB,
+)
+from app.storage import cold
+from app.storage.dictionary import (
+    APP_KEY_CACHE_TTL_SECONDS,
+    DICTIONARY_CACHE_TTL_SECONDS,
+    clear_dictionary_caches,
+)
+from app.workers.runner import PeriodicWorker
+
+logger = logging.getLogger(__name__)
+
+WORKER_NAME = "purger"
+
+# Deleted apps are purged once no process can still resolve their key
+DELETED_APP_GRACE_SECONDS = 2 * APP_KEY_CACHE_TTL_SECONDS
+
+# A pass over an app's session keys looking for orphans reads every key, so
+# it runs once a day per app
+ORPHAN_SCAN_INTERVAL_SECONDS = 24 * 3600
+
+# app_key_id -> (last session key id checked in the current pass, or 0 between
+# passes; when the last pass ended)
+_orphan_scans: Dict[int, Tuple[int, float]] = {}
+
+
+class _ChunkBudget:
+    """Counts chunks across one tick and paces them."""
+
+    def __init__(self, max_chunks: int):
+        self.remaining = max_chunks
+
+    def spend(self) -> bool:
+        """Account for one chunk; returns False once the tick's budget is used up."""
+        self.remaining -= 1
+        if self.remaining > 0 and PURGE_CHUNK_SLEEP_SECONDS > 0:
+            time.sleep(PURGE_CHUNK_SLEEP_SECONDS)
+        return self.remaining > 0
+
+
+def purge_once(db: Session, max_chunks: int = PURGE_MAX_CHUNKS_PER_TICK) -> bool:
+    """
+    Run one purge pass (deleted apps first, then retention, then caches and
+    anomaly-detection data).
+
+    Returns:
+        True if the chunk budget ran out before everything was purged.
+    """
+    budget = _ChunkBudget(max_chunks)
+
+    # Ingesting processes may use a deleted key's cached ids until the key
+    # itself expires from their caches; purge only after that.
+    # deleted_at is stored without tzinfo (UTC); compare like with like.
+    deleted_before = (datetime.now(timezone.utc) - timedelta(seconds=DELETED_APP_GRACE_SECONDS)).replace(tzinfo=None)
+    deleted_keys = [
+        row.id for row in db.query(AppKeyDB.id).filter(AppKeyDB.deleted_at < deleted_before).all()
+    ]
+    for app_key_id in deleted_keys:
+        if not _purge_deleted_app(db, app_key_id, budget):
+            return True
+    if deleted_keys:
+        clear_dictionary_caches()
+
+    for app_key_id, days in _retention_days_by_key(db).items():
+        if not _purge_expired(db, app_key_id, retention_cutoff_ms(days), budget):
+            return True
+
+    live_keys = [row.id for row in db.query(AppKeyDB.id).filter(AppKeyDB.deleted_at.is_(None)).all()]
+    for app_key_id in live_keys:
+        if not _purge_orphan_session_keys(db, app_key_id, budget):
+            return True
+
+    # created_at is stored without tzinfo (UTC); compare like with like.
+    cache_cutoff = (datetime.now(timezone.utc) - timedelta(seconds=LLM_CACHE_TTL_SECONDS)).replace(tzinfo=None)
+    expired_responses = LLMResponseDB.created_at < cache_cutoff
+    if not _delete_in_chunks(db, LLMResponseDB, LLMResponseDB.prompt_hash, expired_responses, budget):
+        return True
+
+    now = datetime.now(timezone.utc)
+    counter_cutoff_ms = int((now - timedelta(hours=ANOMALY_COUNTER_RETENTION_HOURS)).timestamp() * 1000)
+    if not _delete_in_chunks(db, EventCounterDB, EventCounterDB.id, EventCounterDB.minute_ms < counter_cutoff_ms, budget):
+        return True
+    anomaly_cutoff = (now - timedelta(days=ANOMALY_RETENTION_DAYS)).replace(tzinfo=None)
+    if not _delete_in_chunks(db, AnomalyDB, AnomalyDB.id, AnomalyDB.updated_at < anomaly_cutoff, budget):
+        return True
+    return False
+
+
+def retention_cutoff_ms(days: int, now: Optional[datetime] = None) -> int:
+    """Events with timestamp_ms below this (a UTC day boundary) are past retention."""
+    now = now or datetime.now(timezone.utc)
+    return cold.day_bounds_ms((now - timedelta(days=days)).date())[0]
+
+
+def _retention_days_by_key(db: Session) -> Dict[int, int]:
+    """{app_key_id: retention days} for live keys that have a retention policy."""
+    rows = (
+        db.query(AppKeyDB.id, AppDB.retention_days)
+        .outerjoin(AppDB, or_(AppDB.api_key == AppKeyDB.api_key, AppDB.id == AppKeyDB.app_id))
+        .filter(AppKeyDB.deleted_at.is_(None))
+        .all()
+    )
+    result = {}
+    for app_key_id, days in rows:
+        days = days or EVENT_RETENTION_DAYS
+        if days:
+            result[app_key_id] = days
+    return result
+
+
+def _delete_in_chunks(db: Session, model, id_column, condition, budget: _ChunkBudget) -> bool:
+    """
+    Delete matching rows PURGE_CHUNK_SIZE ids at a time, committing each chunk.
+
+    Returns:
+        True when no matching rows are left, False if the budget ran out first.
+    """
+    while True:
+        ids = [row[0] for row in db.query(id_column).filter(condition).limit(PURGE_CHUNK_SIZE).all()]
+        if not ids:
+            return True
+        db.query(model).filter(id_column.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        if len(ids) < PURGE_CHUNK_SIZE:
+            return True
+        if not budget.spend():
+            return False
+
+
+def _purge_deleted_app(db: Session, app_key_id: int, budget: _ChunkBudget) -> bool:
+    steps = [
+        (EventDB, EventDB.id, EventDB.app_key_id == app_key_id),
+        (SessionDB, SessionDB.session_key_id, SessionDB.app_key_id == app_key_id),
+        (SessionKeyDB, SessionKeyDB.id, SessionKeyDB.app_key_id == app_key_id),
+        (EventCounterDB, EventCounterDB.id, EventCounterDB.app_key_id == app_key_id),
+        (AnomalyBaselineDB, AnomalyBaselineDB.event_name_id, AnomalyBaselineDB.app_key_id == app_key_id),
+        (PropertyKeyDB, PropertyKeyDB.id, PropertyKeyDB.app_key_id == app_key_id),
+        (EventNameDB, EventNameDB.id, EventNameDB.app_key_id == app_key_id),
+    ]
+    for model, id_column, condition in steps:
+        if not _delete_in_chunks(db, model, id_column, condition, budget):
+            return False
+
+    cold.delete_app(app_key_id)
+    _orphan_scans.pop(app_key_id, None)
+    logger.debug("Purged deleted app_key_id=%s", app_key_id)
+    return True
+
+
+def _purge_expired(db: Session, app_key_id: int, cutoff_ms: int, budget: _ChunkBudget) -> bool:
+    for day in cold.list_days(app_key_id, end_ms=cutoff_ms):
+        if cold.day_bounds_ms(day)[1] <= cutoff_ms:
+            cold.delete_day(app_key_id, day)
+            logger.info("Dropped cold file app_key_id=%s day=%s", app_key_id, day)
+
+    # Late events (old timestamp_ms, received recently) wait until their
+    # session key has expired from every process's cache: while one of them
+    # is left, the session key below is not deleted under a cached id.
+    received_before = (
+        datetime.now(timezone.utc) - timedelta(seconds=DICTIONARY_CACHE_TTL_SECONDS)
+    ).replace(tzinfo=None)
+    expired_events = (
+        (EventDB.app_key_id == app_key_id)
+        & (EventDB.timestamp_ms < cutoff_ms)
+        & (EventDB.created_at < received_before)
+    )
+    if not _delete_in_chunks(db, EventDB, EventDB.id, expired_events, budget):
+        return False
+
+    # Session keys go with their session, unless a (late) event still uses them.
+    expired_sessions = (
+        (SessionDB.app_key_id == app_key_id)
+        & (SessionDB.last_ts_ms < cutoff_ms)
+        & ~exists().where(EventDB.session_key_id == SessionDB.session_key_id)
+    )
+    while True:
+        ids = [row[0] for row in db.query(SessionDB.session_key_id).filter(expired_sessions).limit(PURGE_CHUNK_SIZE).all()]
+        if not ids:
+            return True
+        db.query(SessionDB).filter(SessionDB.session_key_id.in_(ids)).delete(synchronize_session=False)
+        db.query(SessionKeyDB).filter(SessionKeyDB.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        if len(ids) < PURGE_CHUNK_SIZE:
+            return True
+        if not budget.spend():
+            return False
+
+
+def _purge_orphan_session_keys(db: Session, app_key_id: int, budget: _ChunkBudget) -> bool:
+    """
+    Continue the app's pass over its session keys, deleting those no event or
+    session references. Keys younger than the dictionary cache TTL are left
+    alone: a process that just created one may not have stored its event yet.
+
+    Returns:
+        True when the pass is finished (or not due), False if the budget ran out first.
+    """
+    after_id, finished_at = _orphan_scans.get(app_key_id, (0, 0.0))
+    if after_id == 0 and time.time() - finished_at < ORPHAN_SCAN_INTERVAL_SECONDS:
+        return True
+
+    # created_at is stored without tzinfo (UTC); compare like with like.
+    created_before = (
+        datetime.now(timezone.utc) - timedelta(seconds=DICTIONARY_CACHE_TTL_SECONDS)
+    ).replace(tzinfo=None)
+    unreferenced = (
+        or_(SessionKeyDB.created_at.is_(None), SessionKeyDB.created_at < created_before)
+        & ~exists().where((EventDB.app_key_id == app_key_id) & (EventDB.session_key_id == SessionKeyDB.id))
+        & ~exists().where(SessionDB.session_key_id == SessionKeyDB.id)
+    )
+    while True:
+        ids = [
+            row[0] for row in db.query(SessionKeyDB.id)
+            .filter(SessionKeyDB.app_key_id == app_key_id, SessionKeyDB.id > after_id)
+            .order_by(SessionKeyDB.id)
+            .limit(PURGE_CHUNK_SIZE)
+            .all()
+        ]
+        if ids:
+            orphans = {row[0] for row in db.query(SessionKeyDB.id).filter(SessionKeyDB.id.in_(ids), unreferenced).all()}
+            if orphans:
+                orphans -= cold.sessions_with_events(app_key_id, orphans)
+            if orphans:
+                # Re-checked in the DELETE, for events stored since the query above
+                db.query(SessionKeyDB).filter(SessionKeyDB.id.in_(orphans), unreferenced).delete(
+                    synchronize_session=False
+                )
+                logger.debug("Purged %d orphan session keys of app_key_id=%s", len(orphans), app_key_id)
+            db.commit()
+            after_id = ids[-1]
+        if len(ids) < PURGE_CHUNK_SIZE:
+            _orphan_scans[app_key_id] = (0, time.time())
+            return True
+        _orphan_scans[app_key_id] = (after_id, finished_at)
+        if not budget.spend():
+            return False
+
+
+def create_worker() -> PeriodicWorker:
+    return PeriodicWorker(WORKER_NAME, purge_once, PURGE_INTERVAL_SECONDS)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    create_worker().run_forever()
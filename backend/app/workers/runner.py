@@ -0,0 +1,72 @@
+"""
+Periodic Worker Runner
+
+Minimal loop for background jobs (sessionizer, insight jobs, ...). Each tick gets its own
+SQLAlchemy session; a failing tick is logged and retried on the next interval
+so one bad batch never kills the worker.
+"""
+
+import logging
+import threading
+from typing import Callable
+from sqlalchemy.orm import Session
+
+from app.db.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicWorker:
+    """
+    Run `tick(db)` every `interval_seconds`, either in a daemon thread (`start`)
+    or in the foreground (`run_forever`, used by `python -m app.workers`).
+
+    `tick` may return True to signal that more work is pending; the worker then
+    runs again immediately instead of sleeping (useful when catching up).
+    `wake()` cuts the current sleep short (e.g. when new work was just queued).
+    """
+
+    def __init__(self, name: str, tick: Callable[[Session], bool], interval_seconds: float):
+        self.name = name
+        self.tick = tick
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def run_once(self) -> bool:
+        """Run a single tick; returns True if more work is pending."""
+        db = SessionLocal()
+        try:
+            return bool(self.tick(db))
+        except Exception:
+            db.rollback()
+            logger.exception("Worker %s tick failed", self.name)
+            return False
+        finally:
+            db.close()
+
+    def run_forever(self) -> None:
+        logger.info("Worker %s started (interval=%ss)", self.name, self.interval_seconds)
+        while not self._stop.is_set():
+            more = self.run_once()
+            if not more:
+                self._wake.wait(self.interval_seconds)
+                self._wake.clear()
+        logger.info("Worker %s stopped", self.name)
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run_forever, name=f"worker-{self.name}", daemon=True)
+        self._thread.start()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def stop(self, timeout: float | None = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -0,0 +1,185 @@
+"""
+Background Sessionizer
+
+Keeps the `sessions` table up to date from new `events` rows, so analytics can
+read one pre-aggregated row per session instead of re-sorting raw events.
+
+Each tick:
+1. Reads the next page of events with created_at >= the stored high-water mark
+   (and older than SESSIONIZER_LAG_SECONDS, so in-flight inserts aren't skipped).
+2. Collects the sessions (session_key_id) those events touch.
+3. Rebuilds each touched session from *all* of its events and replaces its row.
+4. Advances the high-water mark in the same transaction.
+
+Sessions that started before the cold-storage cutoff also pull their compacted
+events back from the cold files, so a late event never truncates a session.
+
+Rebuilding whole sessions makes a tick idempotent: re-processing events at the
+watermark boundary (or after a crash) rewrites the same rows.
+
+Run standalone with: python -m app.workers.sessionizer
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Set
+from sqlalchemy.orm import Session
+
+from app.core.config import (
+    SESSIONIZER_BATCH_SIZE,
+    SESSIONIZER_INTERVAL_SECONDS,
+    SESSIONIZER_LAG_SECONDS,
+)
+from app.db.models import EventDB, SessionDB
+from app.storage import cold
+from app.storage.dictionary import get_event_name_map
+from app.storage.worker_state import get_watermark, set_watermark
+from app.workers.runner import PeriodicWorker
+
+logger = logging.getLogger(__name__)
+
+WORKER_NAME = "sessionizer"
+
+# Sessions are rebuilt in groups of this many keys (keeps IN (...) lists bounded).
+_REBUILD_GROUP_SIZE = 500
+
+
+def sessionize_once(db: Session, batch_size: int = SESSIONIZER_BATCH_SIZE) -> bool:
+    """
+    Process one page of new events.
+
+    Returns:
+        True if the page was full (more events are likely pending).
+    """
+    watermark = get_watermark(db, WORKER_NAME)
+    upper = _naive_utc(datetime.now(timezone.utc) - timedelta(seconds=SESSIONIZER_LAG_SECONDS))
+
+    q = db.query(EventDB.created_at, EventDB.session_key_id).filter(
+        EventDB.created_at < upper
+    )
+    if watermark is not None:
+        q = q.filter(EventDB.created_at >= watermark)
+    rows = q.order_by(EventDB.created_at).limit(batch_size).all()
+    if not rows:
+        return False
+
+    new_watermark = rows[-1][0]
+    if watermark is not None and new_watermark <= watermark:
+        # A full page shares the watermark timestamp (e.g. a bulk insert); take every
+        # row at that instant so the mark can move past it on the next tick.
+        rows = (
+            db.query(EventDB.created_at, EventDB.session_key_id)
+            .filter(EventDB.created_at == watermark)
+            .all()
+        )
+        new_watermark = watermark + timedelta(microseconds=1)
+
+    touched: Set[int] = {session_key_id for (_c, session_key_id) in rows}
+    keys = sorted(touched)
+    for i in range(0, len(keys), _REBUILD_GROUP_SIZE):
+        rebuild_sessions(db, keys[i:i + _REBUILD_GROUP_SIZE])
+
+    set_watermark(db, WORKER_NAME, new_watermark)
+    db.commit()
+
+    logger.info("Sessionized %d events into %d sessions", len(rows), len(keys))
+    return len(rows) >= batch_size
+
+
+def rebuild_sessions(db: Session, session_key_ids: List[int]) -> None:
+    """Recompute the session rows for the given session_key_ids (no commit)."""
+    if not session_key_ids:
+        return
+
+    events = (
+        db.query(
+            EventDB.session_key_id,
+            EventDB.app_key_id,
+            EventDB.event_name_id,
+            EventDB.timestamp_ms,
+            EventDB.platform,
+        )
+        .filter(EventDB.session_key_id.in_(session_key_ids))
+        .order_by(EventDB.session_key_id, EventDB.timestamp_ms)
+        .all()
+    )
+
+    grouped: Dict[int, list] = {}
+    app_keys: Dict[int, int] = {}
+    for (session_key_id, app_key_id, event_name_id, ts_ms, platform) in events:
+        grouped.setdefault(session_key_id, []).append((event_name_id, ts_ms, platform))
+        app_keys[session_key_id] = app_key_id
+
+    if cold.cold_enabled() and grouped:
+        _merge_cold_events(db, grouped, app_keys)
+
+    error_codes = {code for code, name in get_event_name_map(db).items() if "error" in name.lower()}
+
+    db.query(SessionDB).filter(
+        SessionDB.session_key_id.in_(session_key_ids)
+    ).delete(synchronize_session=False)
+
+    for session_key_id, session_events in grouped.items():
+        db.add(build_session_row(session_key_id, app_keys[session_key_id], session_events, error_codes))
+
+
+def _merge_cold_events(db: Session, grouped: Dict[int, list], app_keys: Dict[int, int]) -> None:
+    """Add compacted events to sessions whose existing row starts before the cold cutoff."""
+    cutoff_ms = cold.cold_cutoff_ms()
+    old_sessions = (
+        db.query(SessionDB.session_key_id, SessionDB.first_ts_ms)
+        .filter(SessionDB.session_key_id.in_(list(grouped)))
+        .filter(SessionDB.first_ts_ms < cutoff_ms)
+        .all()
+    )
+
+    by_app: Dict[int, list] = {}
+    for (session_key_id, first_ts_ms) in old_sessions:
+        by_app.setdefault(app_keys[session_key_id], []).append((session_key_id, first_ts_ms))
+
+    for app_key_id, sessions in by_app.items():
+        start_ms = min(first_ts_ms for (_k, first_ts_ms) in sessions)
+        rows = cold.read_session_rows(app_key_id, [k for (k, _f) in sessions], start_ms)
+        for (session_key_id, _id, event_name_id, ts_ms, platform) in rows:
+            grouped[session_key_id].append((event_name_id, ts_ms, platform))
+
+    for session_key_id, _first in old_sessions:
+        grouped[session_key_id].sort(key=lambda e: e[1])
+
+
+def build_session_row(
+    session_key_id: int,
+    app_key_id: int,
+    events: list,
+    error_codes: Set[int],
+) -> SessionDB:
+    """Build a SessionDB row from a session's (event_name_id, timestamp_ms, platform) list in time order."""
+    first_ts = events[0][1]
+    last_ts = events[-1][1]
+    platform = next((p for (_c, _t, p) in events if p), None)
+
+    return SessionDB(
+        session_key_id=session_key_id,
+        app_key_id=app_key_id,
+        first_ts_ms=first_ts,
+        last_ts_ms=last_ts,
+        event_count=len(events),
+        platform=platform,
+        event_name_ids=[code for (code, _t, _p) in events],
+        event_offsets_ms=[ts - first_ts for (_c, ts, _p) in events],
+        has_error=any(code in error_codes for (code, _t, _p) in events),
+    )
+
+
+def _naive_utc(dt: datetime) -> datetime:
+    # created_at is stored without tzinfo (UTC); compare like with like.
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def create_worker() -> PeriodicWorker:
+    return PeriodicWorker(WORKER_NAME, sessionize_once, SESSIONIZER_INTERVAL_SECONDS)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    create_worker().run_forever()
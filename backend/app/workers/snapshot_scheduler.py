@@ -0,0 +1,154 @@
+"""
+Snapshot Scheduler
+
+Precomputes the analytics snapshot of every active app, so insight generation
+(and `/insights/compare` when the latest insight has no snapshot) reads a
+stored snapshot instead of running several full scans while the user waits.
+
+- Active apps are those that ingested events within SNAPSHOT_SCHEDULE_ACTIVE_DAYS
+  (`app_keys.last_ingested_at`, the ingestion watermark). Each gets a row in
+  `precomputed_snapshots`, first due at a random point within
+  SNAPSHOT_SCHEDULE_JITTER_SECONDS so a fleet of new apps doesn't start at once.
+- When an app is due and its watermark hasn't moved since the last computation,
+  nothing is recomputed; only the next run is pushed back.
+- Otherwise the snapshot is rebuilt and saved in the snapshot store. The next
+  run is SNAPSHOT_SCHEDULE_INTERVAL_SECONDS plus a random jitter later, which
+  keeps apps from synchronizing.
+- A tick computes at most SNAPSHOT_SCHEDULE_CONCURRENCY snapshots, in parallel
+  threads. Only `python -m app.workers` runs the scheduler, so that is also the
+  global limit.
+
+Run standalone with: python -m app.workers.snapshot_scheduler
+"""
+
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.orm import Session
+
+from app.core.config import (
+    SNAPSHOT_SCHEDULE_ACTIVE_DAYS,
+    SNAPSHOT_SCHEDULE_CONCURRENCY,
+    SNAPSHOT_SCHEDULE_INTERVAL_SECONDS,
+    SNAPSHOT_SCHEDULE_JITTER_SECONDS,
+    SNAPSHOT_SCHEDULE_POLL_SECONDS,
+)
+from app.db.database import SessionLocal
+from app.db.models import AppKeyDB, PrecomputedSnapshotDB
+from app.db.upsert import insert_ignore_conflicts
+from app.insights.snapshot import build_analytics_snapshot
+from app.storage.snapshots import precomputed_is_fresh, save_snapshot
+from app.workers.runner import PeriodicWorker
+
+logger = logging.getLogger(__name__)
+
+WORKER_NAME = "snapshot-scheduler"
+
+
+def schedule_once(db: Session) -> bool:
+    """
+    Register newly active apps and run the snapshots that are due.
+
+    Returns:
+        True if more apps were due than this tick handled.
+    """
+    now = _utcnow()
+    _register_active_apps(db, now)
+
+    due = (
+        db.query(PrecomputedSnapshotDB, AppKeyDB.last_ingested_at)
+        .join(AppKeyDB, AppKeyDB.api_key == PrecomputedSnapshotDB.api_key)
+        .filter(PrecomputedSnapshotDB.next_run_at <= now, AppKeyDB.deleted_at.is_(None))
+        .order_by(PrecomputedSnapshotDB.next_run_at)
+        .limit(max(1, SNAPSHOT_SCHEDULE_CONCURRENCY))
+        .all()
+    )
+    if not due:
+        return False
+
+    to_compute = []
+    for row, last_ingested_at in due:
+        if precomputed_is_fresh(row.computed_at, last_ingested_at):
+            row.next_run_at = _next_run(now)
+        else:
+            to_compute.append(row.api_key)
+    db.commit()
+
+    if to_compute:
+        with ThreadPoolExecutor(max_workers=len(to_compute), thread_name_prefix=WORKER_NAME) as pool:
+            list(pool.map(compute_snapshot, to_compute))
+    return len(due) >= max(1, SNAPSHOT_SCHEDULE_CONCURRENCY)
+
+
+def compute_snapshot(api_key: str) -> None:
+    """Rebuild and store one app's snapshot (own session; safe to run in a thread)."""
+    db = SessionLocal()
+    started_at = _utcnow()
+    started = time.monotonic()
+    try:
+        snapshot_hash = save_snapshot(db, api_key, build_analytics_snapshot(db, api_key))
+        duration_ms = int((time.monotonic() - started) * 1000)
+        # Matches no row if the snapshot was invalidated meanwhile; the app is
+        # then registered again on the next tick.
+        db.query(PrecomputedSnapshotDB).filter(PrecomputedSnapshotDB.api_key == api_key).update(
+            {
+                PrecomputedSnapshotDB.snapshot_hash: snapshot_hash,
+                PrecomputedSnapshotDB.computed_at: started_at,
+                PrecomputedSnapshotDB.duration_ms: duration_ms,
+                PrecomputedSnapshotDB.next_run_at: _next_run(_utcnow()),
+            },
+            synchronize_session=False,
+        )
+        db.commit()
+        logger.info("Precomputed snapshot for api_key=%s in %d ms", api_key, duration_ms)
+    except Exception:
+        db.rollback()
+        logger.exception("Snapshot precomputation failed for api_key=%s", api_key)
+        db.query(PrecomputedSnapshotDB).filter(PrecomputedSnapshotDB.api_key == api_key).update(
+            {PrecomputedSnapshotDB.next_run_at: _next_run(_utcnow())}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _register_active_apps(db: Session, now: datetime) -> None:
+    active_since = now - timedelta(days=SNAPSHOT_SCHEDULE_ACTIVE_DAYS)
+    new_keys = [
+        api_key
+        for (api_key,) in db.query(AppKeyDB.api_key)
+        .outerjoin(PrecomputedSnapshotDB, PrecomputedSnapshotDB.api_key == AppKeyDB.api_key)
+        .filter(
+            AppKeyDB.deleted_at.is_(None),
+            AppKeyDB.last_ingested_at >= active_since,
+            PrecomputedSnapshotDB.api_key.is_(None),
+        )
+        .all()
+    ]
+    if not new_keys:
+        return
+    rows = [
+        {"api_key": api_key, "next_run_at": now + timedelta(seconds=random.uniform(0, SNAPSHOT_SCHEDULE_JITTER_SECONDS))}
+        for api_key in new_keys
+    ]
+    insert_ignore_conflicts(db, PrecomputedSnapshotDB, rows, ["api_key"])
+    db.commit()
+
+
+def _next_run(now: datetime) -> datetime:
+    return now + timedelta(seconds=SNAPSHOT_SCHEDULE_INTERVAL_SECONDS + random.uniform(0, SNAPSHOT_SCHEDULE_JITTER_SECONDS))
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def create_worker() -> PeriodicWorker:
+    return PeriodicWorker(WORKER_NAME, schedule_once, SNAPSHOT_SCHEDULE_POLL_SECONDS)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    create_worker().run_forever()
@@ -0,0 +1,213 @@
+"""
+Analytics Benchmark
+
+Times the analytics engines and endpoints against synthetic datasets
+(benchmarks/synthetic.py) of increasing size:
+
+- engines: run_funnel_for_steps, calculate_dropoff, calculate_time_to_complete,
+  analyze_paths, build_analytics_snapshot
+- endpoints (in-process, through the FastAPI app): event-counts, event-volume,
+  funnel, session-stats, anomalies
+
+Every measurement targets the dataset's largest app. Each target runs
+`--repeat` times; the report keeps the first (cold) run and the min/median/max.
+
+The report is JSON (`--json` / `--output`) with the commit, database and scan
+source, so runs can be compared across commits with `--compare old.json`.
+
+Run from backend/:
+
+    python -m benchmarks.analytics [--scales 10000,100000,1000000] [--repeat 3]
+        [--database-url postgresql://localhost/bench] [--source events|sessions]
+        [--output results.json] [--compare baseline.json]
+
+Without --database-url, a SQLite file in the temp directory is used (and kept,
+so later runs reuse the generated data).
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks.synthetic import FUNNEL_STEPS, api_keys_for
+
+DEFAULT_DATABASE_URL = "sqlite:///" + os.path.join(tempfile.gettempdir(), "uba_benchmark.db")
+
+
+def _stats(samples_ms):
+    ordered = sorted(samples_ms)
+    return {
+        "runs": len(ordered),
+        "first_ms": round(samples_ms[0], 2),
+        "min_ms": round(ordered[0], 2),
+        "median_ms": round(statistics.median(ordered), 2),
+        "max_ms": round(ordered[-1], 2),
+    }
+
+
+def _time(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return _stats(samples)
+
+
+def _check(response):
+    if response.status_code != 200:
+        raise RuntimeError(f"{response.request.url} returned {response.status_code}: {response.text[:200]}")
+    return response
+
+
+def run_scale(db, client, events: int, apps: int, seed: int, repeat: int) -> dict:
+    from app.analytics.dropoff import calculate_dropoff
+    from app.analytics.funnel import run_funnel_for_steps
+    from app.analytics.path_analysis import analyze_paths
+    from app.analytics.time_analysis import calculate_time_to_complete
+    from app.insights.snapshot import build_analytics_snapshot
+    from benchmarks.synthetic import generate
+
+    generated = generate(db, events, apps=apps, seed=seed)
+    api_key = api_keys_for(events, apps, seed)[0]
+
+    engines = {
+        "run_funnel_for_steps": lambda: run_funnel_for_steps(FUNNEL_STEPS, db, api_key=api_key),
+        "calculate_dropoff": lambda: calculate_dropoff(FUNNEL_STEPS, db, api_key=api_key),
+        "calculate_time_to_complete": lambda: calculate_time_to_complete(
+            FUNNEL_STEPS[0], FUNNEL_STEPS[-1], db, api_key=api_key
+        ),
+        "analyze_paths": lambda: analyze_paths(db, max_depth=5, api_key=api_key),
+        "build_analytics_snapshot": lambda: build_analytics_snapshot(db, api_key),
+    }
+    endpoints = {
+        "GET /analytics/event-counts": lambda: _check(client.get("/analytics/event-counts", params={"api_key": api_key})),
+        "GET /analytics/event-volume": lambda: _check(
+            client.get("/analytics/event-volume", params={"api_key": api_key, "days": 30})
+        ),
+        "POST /analytics/funnel": lambda: _check(
+            client.post("/analytics/funnel", json={"api_key": api_key, "steps": FUNNEL_STEPS})
+        ),
+        "GET /analytics/session-stats": lambda: _check(client.get("/analytics/session-stats", params={"api_key": api_key})),
+        "GET /analytics/anomalies": lambda: _check(client.get("/analytics/anomalies", params={"api_key": api_key})),
+    }
+
+    results = {}
+    for name, fn in {**engines, **endpoints}.items():
+        results[name] = _time(fn, repeat)
+        db.rollback()  # end the read transaction between targets
+    return {
+        "events": events,
+        "api_key": api_key,
+        "generated": generated,
+        "results": results,
+    }
+
+
+def run(scales, database_url: str, source: str, repeat: int, apps: int, seed: int) -> dict:
+    # Configuration is read at import time, so it must be in place first.
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["ANALYTICS_SOURCE"] = source
+    os.environ["RATE_LIMIT_ANALYTICS_PER_SECOND"] = "0"
+
+    from fastapi.testclient import TestClient
+
+    from app.db.database import SessionLocal, engine
+    from app.db.schema import ensure_schema
+    from app.main import app
+
+    ensure_schema(engine)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "database": engine.dialect.name,
+            "source": source,
+            "repeat": repeat,
+            "apps": apps,
+            "seed": seed,
+        },
+        "scales": [],
+    }
+    # Not entered as a context manager: the lifespan (insight job threads) isn't needed.
+    client = TestClient(app)
+    db = SessionLocal()
+    try:
+        for events in scales:
+            report["scales"].append(run_scale(db, client, events, apps, seed, repeat))
+    finally:
+        db.close()
+    return report
+
+
+def compare(baseline: dict, report: dict) -> list:
+    """Rows of (events, target, baseline median, current median, ratio) for targets in both reports."""
+    previous = {
+        (scale["events"], name): stats["median_ms"]
+        for scale in baseline.get("scales", [])
+        for name, stats in scale["results"].items()
+    }
+    rows = []
+    for scale in report["scales"]:
+        for name, stats in scale["results"].items():
+            before = previous.get((scale["events"], name))
+            if before is not None:
+                ratio = round(stats["median_ms"] / before, 2) if before else None
+                rows.append((scale["events"], name, before, stats["median_ms"], ratio))
+    return rows
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="10000,100000", help="comma-separated event counts")
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    parser.add_argument("--source", choices=["events", "sessions"], default=os.getenv("ANALYTICS_SOURCE", "events"))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--apps", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--compare", help="JSON report of an earlier run to compare medians against")
+    args = parser.parse_args()
+
+    scales = [int(s) for s in args.scales.split(",") if s.strip()]
+    report = run(scales, args.database_url, args.source, max(1, args.repeat), args.apps, args.seed)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{'events':>11} {'target':<30} {'first_ms':>10} {'median_ms':>10} {'max_ms':>10}")
+        for scale in report["scales"]:
+            for name, stats in scale["results"].items():
+                print(f"{scale['events']:>11} {name:<30} {stats['first_ms']:>10} {stats['median_ms']:>10} {stats['max_ms']:>10}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            rows = compare(json.load(f), report)
+        print(f"\n{'events':>11} {'target':<30} {'before_ms':>10} {'after_ms':>10} {'ratio':>7}")
+        for events, name, before, after, ratio in rows:
+            print(f"{events:>11} {name:<30} {before:>10} {after:>10} {ratio if ratio is not None else '-':>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Auth Overhead Benchmark
+
+Measures the per-request cost of `verify_supabase_token` (app/core/auth.py)
+for an ES256 token like the ones Supabase issues, offline:
+
+- verify: signature check with the JWKS key already cached (first request of
+  a token)
+- cached: the same token again (served from the verified-token cache)
+- key_miss: the signing key has to be fetched first (new kid / cold start);
+  the JWKS download is simulated with --jwks-latency-ms
+
+Run from backend/:
+
+    python -m benchmarks.auth_overhead [--iterations 2000] [--jwks-latency-ms 80] [--json]
+"""
+
+import argparse
+import json
+import statistics
+import time
+import uuid
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from app.core import auth
+
+
+def _percentiles(samples_us):
+    ordered = sorted(samples_us)
+    return {
+        "mean_us": round(statistics.fmean(ordered), 1),
+        "p50_us": round(ordered[len(ordered) // 2], 1),
+        "p99_us": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 1),
+    }
+
+
+def _time(fn, iterations, before=None):
+    samples = []
+    for _ in range(iterations):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return _percentiles(samples)
+
+
+def run(iterations: int, jwks_latency_ms: float) -> dict:
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    keys = {"bench": private_key.public_key()}
+
+    def fetch():
+        time.sleep(jwks_latency_ms / 1000)
+        return keys
+
+    auth.SUPABASE_URL = auth.SUPABASE_URL or "https://bench.invalid"
+    auth._jwks_cache = auth._JWKSCache(fetch)
+    token = jwt.encode(
+        {"sub": str(uuid.uuid4()), "aud": "authenticated", "exp": int(time.time()) + 3600},
+        private_key,
+        algorithm="ES256",
+        headers={"kid": "bench"},
+    )
+    verify = lambda: auth.verify_supabase_token(token)  # noqa: E731
+    verify()  # warm the key cache
+
+    def cold_keys():
+        auth._verified_tokens.clear()
+        auth._jwks_cache = auth._JWKSCache(fetch)
+
+    results = {
+        "verify": _time(verify, iterations, before=auth._verified_tokens.clear),
+        "cached": _time(verify, iterations),
+        "key_miss": _time(verify, max(1, min(iterations, 50)), before=cold_keys),
+    }
+    return {"iterations": iterations, "jwks_latency_ms": jwks_latency_ms, "results": results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--jwks-latency-ms", type=float, default=80)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    report = run(args.iterations, args.jwks_latency_ms)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{'scenario':<10} {'mean_us':>10} {'p50_us':>10} {'p99_us':>10}")
+    for name, stats in report["results"].items():
+        print(f"{name:<10} {stats['mean_us']:>10} {stats['p50_us']:>10} {stats['p99_us']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Bulk Import Benchmark
+
+Measures historical-backfill throughput (app/workers/bulk_import.py):
+
+- writes a synthetic file of --events events (benchmarks/synthetic.py
+  sessions, each event with an event_id) as NDJSON, CSV or Parquet
+- imports it into a fresh app of DATABASE_URL and reports events/s
+- imports it again: every event is a duplicate, which measures the
+  event_id dedupe path (an interrupted import being re-run)
+
+Compare `--defer-indexes` (secondary indexes rebuilt once at the end) with the
+default; on SQLite JSON parsing in Python dominates, on Postgres the COPY path
+is what matters.
+
+Run from backend/:
+
+    python -m benchmarks.bulk_import --events 1000000 [--format ndjson|csv|parquet] [--gzip] [--defer-indexes] [--json]
+"""
+
+import argparse
+import csv
+import gzip
+import json
+import os
+import tempfile
+import time
+import uuid
+
+from benchmarks.synthetic import SessionGenerator, default_end_ms
+
+EXTENSIONS = {"ndjson": "ndjson", "csv": "csv", "parquet": "parquet"}
+
+
+def write_file(path: str, fmt: str, events: int, compress: bool, seed: int = 42) -> int:
+    """Write `events` synthetic events to `path`; returns the number written."""
+    generator = SessionGenerator(f"bulk_import_{seed}", default_end_ms(), days=90)
+    records = []
+    while len(records) < events:
+        session_id, platform, session_events = generator.session()
+        for event_name, timestamp_ms in session_events[: events - len(records)]:
+            records.append({
+                "event_id": str(uuid.UUID(int=generator.rng.getrandbits(128), version=4)),
+                "event_name": event_name,
+                "timestamp_ms": timestamp_ms,
+                "session_id": session_id,
+                "platform": platform,
+                "properties": {"source": "backfill"},
+            })
+
+    if fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        for record in records:
+            record["properties"] = json.dumps(record["properties"])
+        pq.write_table(pa.Table.from_pylist(records), path)
+        return len(records)
+
+    opener = gzip.open if compress else open
+    with opener(path, "wt", encoding="utf-8", newline="") as handle:
+        if fmt == "csv":
+            writer = csv.writer(handle)
+            writer.writerow(["event_id", "event_name", "timestamp_ms", "session_id", "platform", "properties"])
+            writer.writerows(
+                (r["event_id"], r["event_name"], r["timestamp_ms"], r["session_id"], r["platform"], json.dumps(r["properties"]))
+                for r in records
+            )
+        else:
+            handle.writelines(json.dumps(r, separators=(",", ":")) + "\n" for r in records)
+    return len(records)
+
+
+def timed_import(api_key: str, path: str, fmt: str, defer_indexes: bool) -> dict:
+    from app.db.database import SessionLocal
+    from app.storage.imports import create_import, get_import
+    from app.workers.bulk_import import run_import
+
+    db = SessionLocal()
+    try:
+        job_id = create_import(db, api_key, path, fmt).id
+    finally:
+        db.close()
+    started = time.perf_counter()
+    run_import(job_id, path, fmt, defer_indexes=defer_indexes)
+    seconds = time.perf_counter() - started
+
+    db = SessionLocal()
+    try:
+        job = get_import(db, job_id)
+        return {
+            "status": job.status,
+            "seconds": round(seconds, 2),
+            "rows_inserted": job.rows_inserted,
+            "rows_duplicate": job.rows_duplicate,
+            "events_per_second": round(job.rows_read / seconds) if seconds else None,
+        }
+    finally:
+        db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--format", choices=sorted(EXTENSIONS), default="ndjson")
+    parser.add_argument("--gzip", action="store_true", help="gzip the NDJSON/CSV file")
+    parser.add_argument("--defer-indexes", action="store_true")
+    parser.add_argument("--database-url", help="defaults to DATABASE_URL")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    from app.db.database import engine
+    from app.db.schema import ensure_schema
+
+    ensure_schema(engine)
+    suffix = "." + EXTENSIONS[args.format] + (".gz" if args.gzip and args.format != "parquet" else "")
+    handle, path = tempfile.mkstemp(prefix="bulk-import-bench-", suffix=suffix)
+    os.close(handle)
+    try:
+        written = write_file(path, args.format, args.events, args.gzip)
+        api_key = f"bulk_import_bench_{uuid.uuid4().hex[:8]}"
+        report = {
+            "events": written,
+            "format": args.format,
+            "gzip": args.gzip and args.format != "parquet",
+            "file_mb": round(os.path.getsize(path) / 1e6, 1),
+            "database": engine.dialect.name,
+            "defer_indexes": args.defer_indexes,
+            "load": timed_import(api_key, path, args.format, args.defer_indexes),
+            "rerun": timed_import(api_key, path, args.format, False),
+        }
+    finally:
+        os.remove(path)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{written} events, {report['format']}{' (gzip)' if report['gzip'] else ''}, "
+          f"{report['file_mb']} MB, {report['database']}, defer_indexes={args.defer_indexes}")
+    print(f"{'pass':<8} {'seconds':>8} {'inserted':>10} {'duplicate':>10} {'events/s':>10}")
+    for name in ("load", "rerun"):
+        r = report[name]
+        print(f"{name:<8} {r['seconds']:>8} {r['rows_inserted']:>10} {r['rows_duplicate']:>10} {r['events_per_second']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Cold-Start Benchmark
+
+Measures how quickly a new API worker becomes useful, as when workers are
+scaled up or recycled:
+
+- import_ms: `import app.main` in a fresh interpreter
+- ready_ms: from spawning `uvicorn app.main:app` to its first HTTP response
+  (module import, lifespan: schema check, job threads)
+- first_request_ms: latency of the first real request afterwards
+  (`GET /analytics/event-counts`, which touches the database)
+
+Each run uses a fresh process against DATABASE_URL (or --database-url).
+Compare `--schema-setup startup` (fingerprint check at boot) with `migrate`
+(no schema work; run `python -m app.db.migrate` first).
+
+Run from backend/:
+
+    python -m benchmarks.cold_start [--runs 5] [--schema-setup startup|migrate] [--json]
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _summary(samples):
+    ordered = sorted(samples)
+    return {
+        "median_ms": round(statistics.median(ordered), 1),
+        "min_ms": round(ordered[0], 1),
+        "max_ms": round(ordered[-1], 1),
+    }
+
+
+def measure_import(env: dict) -> float:
+    code = "import time; t = time.perf_counter(); import app.main; print((time.perf_counter() - t) * 1000)"
+    out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def measure_server(env: dict, timeout: float = 60) -> tuple:
+    """(ready_ms, first_request_ms) for one uvicorn process."""
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=base, timeout=10) as client:
+            while True:
+                if proc.poll() is not None:
+                    raise RuntimeError("uvicorn exited during startup (run it by hand to see why)")
+                if time.perf_counter() - started > timeout:
+                    raise RuntimeError(f"server not ready after {timeout}s")
+                try:
+                    client.get("/__cold_start_probe")  # any response means it is serving
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.005)
+            ready_ms = (time.perf_counter() - started) * 1000
+
+            request_started = time.perf_counter()
+            client.get("/analytics/event-counts", params={"api_key": "cold_start_probe"})
+            first_request_ms = (time.perf_counter() - request_started) * 1000
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    return ready_ms, first_request_ms
+
+
+def run(runs: int, schema_setup: str) -> dict:
+    env = {**os.environ, "SCHEMA_SETUP": schema_setup, "RATE_LIMIT_ANALYTICS_PER_SECOND": "0"}
+    imports, ready, first = [], [], []
+    for _ in range(runs):
+        imports.append(measure_import(env))
+        r, f = measure_server(env)
+        ready.append(r)
+        first.append(f)
+    return {
+        "runs": runs,
+        "schema_setup": schema_setup,
+        "database": (os.environ.get("DATABASE_URL") or "sqlite:///./analytics.db").split(":", 1)[0],
+        "import": _summary(imports),
+        "ready": _summary(ready),
+        "first_request": _summary(first),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--schema-setup", choices=["startup", "migrate"], default="startup")
+    parser.add_argument("--database-url", help="defaults to DATABASE_URL")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    report = run(max(1, args.runs), args.schema_setup)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{args.runs} cold starts, SCHEMA_SETUP={args.schema_setup}, {report['database']}")
+    print(f"{'phase':<15} {'median_ms':>10} {'min_ms':>10} {'max_ms':>10}")
+    for phase in ("import", "ready", "first_request"):
+        stats = report[phase]
+        print(f"{phase:<15} {stats['median_ms']:>10} {stats['min_ms']:>10} {stats['max_ms']:>10}")
+
+
+if __name__ == "__main__":
+    main()
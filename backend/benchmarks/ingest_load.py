@@ -0,0 +1,245 @@
+"""
+Ingestion Load Test
+
+Simulates N concurrent SDK clients posting `EventBatch` payloads to
+`POST /events`, either in-process (the FastAPI app over an ASGI transport,
+against DATABASE_URL) or against a running server (`--url`).
+
+Scenarios:
+- steady: every client sends batches back-to-back (closed loop)
+- retries: like steady, but a fraction of batches (--duplicate-rate) is sent
+  a second time unchanged, as an SDK does after a timed-out request
+- burst: clients idle, then all send --wave-batches batches at once every
+  --wave-interval seconds (traffic spikes after an app release or reconnect)
+
+Reports throughput (requests/s, events/s), latency percentiles, error rate by
+status, and rows/s actually written to `events` (counted in the database, so
+for --url it must point at the server's database via --database-url/DATABASE_URL).
+
+Run from backend/:
+
+    python -m benchmarks.ingest_load [--clients 20] [--batch-size 50] [--duration 15]
+        [--scenario steady|retries|burst] [--gzip] [--url http://localhost:8000] [--json]
+
+In-process runs disable the ingest rate limit; a real server applies its own.
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import random
+import time
+import uuid
+from collections import Counter
+
+from benchmarks.synthetic import ERROR_EVENTS, FUNNEL_STEPS, TAIL_EVENTS
+
+EVENT_NAMES = FUNNEL_STEPS + TAIL_EVENTS[:20] + ERROR_EVENTS[:1]
+
+
+def _percentile(ordered, q):
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))], 2)
+
+
+class Client:
+    """One simulated device: a session id, an api_key and a seeded RNG."""
+
+    def __init__(self, http, api_key: str, batch_size: int, compress: bool, seed: int, stats: dict):
+        self.http = http
+        self.api_key = api_key
+        self.batch_size = batch_size
+        self.compress = compress
+        self.rng = random.Random(seed)
+        self.session_id = str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+        self.stats = stats
+
+    def payload(self) -> bytes:
+        now_ms = int(time.time() * 1000)
+        if self.rng.random() < 0.05:
+            self.session_id = str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+        batch = {
+            "api_key": self.api_key,
+            "sent_at_ms": now_ms,
+            "events": [
+                {
+                    "event_name": self.rng.choice(EVENT_NAMES),
+                    "timestamp_ms": now_ms - (self.batch_size - i) * 250,
+                    "session_id": self.session_id,
+                    "platform": "android",
+                    "properties": {"screen": f"screen_{self.rng.randrange(20)}", "seq": i},
+                }
+                for i in range(self.batch_size)
+            ],
+        }
+        body = json.dumps(batch, separators=(",", ":")).encode()
+        return gzip.compress(body, compresslevel=6) if self.compress else body
+
+    async def send(self, body: bytes) -> None:
+        headers = {"Content-Type": "application/json"}
+        if self.compress:
+            headers["Content-Encoding"] = "gzip"
+        start = time.perf_counter()
+        try:
+            response = await self.http.post("/events", content=body, headers=headers)
+            status = response.status_code
+        except Exception as exc:  # connection errors, timeouts
+            status = type(exc).__name__
+        self.stats["latencies_ms"].append((time.perf_counter() - start) * 1000)
+        self.stats["statuses"][status] += 1
+        self.stats["bytes"] += len(body)
+        if status == 200:
+            self.stats["events_accepted"] += self.batch_size
+
+
+async def _steady(client: Client, deadline: float, duplicate_rate: float) -> None:
+    while time.monotonic() < deadline:
+        body = client.payload()
+        await client.send(body)
+        if duplicate_rate and client.rng.random() < duplicate_rate:
+            client.stats["duplicates_sent"] += 1
+            await client.send(body)
+
+
+async def _burst(client: Client, deadline: float, wave_interval: float, wave_batches: int) -> None:
+    next_wave = time.monotonic()
+    while next_wave < deadline:
+        await asyncio.sleep(max(0.0, next_wave - time.monotonic()))
+        for _ in range(wave_batches):
+            await client.send(client.payload())
+        next_wave += wave_interval
+
+
+async def _run_clients(http, args, api_keys, stats) -> float:
+    clients = [
+        Client(http, api_keys[i % len(api_keys)], args.batch_size, args.gzip, args.seed + i, stats)
+        for i in range(args.clients)
+    ]
+    started = time.monotonic()
+    deadline = started + args.duration
+    if args.scenario == "burst":
+        tasks = [_burst(c, deadline, args.wave_interval, args.wave_batches) for c in clients]
+    else:
+        duplicate_rate = args.duplicate_rate if args.scenario == "retries" else 0.0
+        tasks = [_steady(c, deadline, duplicate_rate) for c in clients]
+    await asyncio.gather(*tasks)
+    return time.monotonic() - started
+
+
+def _count_rows(api_keys) -> int:
+    from sqlalchemy import func
+
+    from app.db.database import SessionLocal
+    from app.db.models import AppKeyDB, EventDB
+
+    db = SessionLocal()
+    try:
+        return (
+            db.query(func.count(EventDB.id))
+            .join(AppKeyDB, AppKeyDB.id == EventDB.app_key_id)
+            .filter(AppKeyDB.api_key.in_(api_keys))
+            .scalar()
+        )
+    finally:
+        db.close()
+
+
+def run(args) -> dict:
+    import httpx
+
+    if args.url is None:
+        # Configuration is read at import time, so it must be in place first.
+        os.environ["RATE_LIMIT_INGEST_EVENTS_PER_SECOND"] = "0"
+        from app.db.database import engine
+        from app.db.schema import ensure_schema
+        from app.main import app
+
+        ensure_schema(engine)
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://ingest-load"
+    else:
+        transport, base_url = None, args.url
+
+    run_id = uuid.uuid4().hex[:8]
+    api_keys = [f"load_{run_id}_{n}" for n in range(args.apps)]
+    stats = {"latencies_ms": [], "statuses": Counter(), "bytes": 0, "events_accepted": 0, "duplicates_sent": 0}
+
+    async def main():
+        limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+        async with httpx.AsyncClient(transport=transport, base_url=base_url, limits=limits, timeout=args.timeout) as http:
+            return await _run_clients(http, args, api_keys, stats)
+
+    elapsed = asyncio.run(main())
+    rows = _count_rows(api_keys)
+
+    latencies = sorted(stats["latencies_ms"])
+    requests = len(latencies)
+    errors = sum(count for status, count in stats["statuses"].items() if status != 200)
+    return {
+        "config": {
+            "target": args.url or "in-process",
+            "scenario": args.scenario,
+            "clients": args.clients,
+            "batch_size": args.batch_size,
+            "gzip": args.gzip,
+            "duration_s": args.duration,
+        },
+        "elapsed_s": round(elapsed, 2),
+        "requests": requests,
+        "requests_per_s": round(requests / elapsed, 1),
+        "events_per_s": round(stats["events_accepted"] / elapsed, 1),
+        "request_bytes_avg": round(stats["bytes"] / requests) if requests else None,
+        "latency_ms": {
+            "p50": _percentile(latencies, 0.50),
+            "p95": _percentile(latencies, 0.95),
+            "p99": _percentile(latencies, 0.99),
+            "max": round(latencies[-1], 2) if latencies else None,
+        },
+        "error_rate": round(errors / requests, 4) if requests else None,
+        "statuses": {str(status): count for status, count in sorted(stats["statuses"].items(), key=str)},
+        "duplicates_sent": stats["duplicates_sent"],
+        "db_rows": rows,
+        "db_rows_per_s": round(rows / elapsed, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=15, help="seconds")
+    parser.add_argument("--scenario", choices=["steady", "retries", "burst"], default="steady")
+    parser.add_argument("--duplicate-rate", type=float, default=0.2, help="retries: share of batches sent twice")
+    parser.add_argument("--wave-interval", type=float, default=5, help="burst: seconds between waves")
+    parser.add_argument("--wave-batches", type=int, default=5, help="burst: batches per client per wave")
+    parser.add_argument("--gzip", action="store_true", help="send gzip-compressed bodies")
+    parser.add_argument("--apps", type=int, default=1, help="distinct api_keys the clients are spread over")
+    parser.add_argument("--url", help="base URL of a running server (default: in-process)")
+    parser.add_argument("--database-url", help="database to count written rows in (defaults to DATABASE_URL)")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    latency = report["latency_ms"]
+    print(f"target={report['config']['target']} scenario={args.scenario} clients={args.clients} "
+          f"batch={args.batch_size} gzip={args.gzip}")
+    print(f"requests:   {report['requests']} in {report['elapsed_s']} s ({report['requests_per_s']} req/s)")
+    print(f"events:     {report['events_per_s']} events/s accepted, {report['db_rows_per_s']} rows/s written")
+    print(f"latency:    p50 {latency['p50']} ms, p95 {latency['p95']} ms, p99 {latency['p99']} ms, max {latency['max']} ms")
+    print(f"errors:     {report['error_rate']} ({report['statuses']})")
+    if args.scenario == "retries":
+        print(f"duplicates: {report['duplicates_sent']} batches re-sent")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""
+Synthetic Event Generator
+
+Writes a deterministic, realistic-looking dataset for benchmarks and load
+tests: a few apps (sizes skewed, the first one largest), each with sessions
+that walk a shopping funnel with per-step abandonment, interleaved with a long
+tail of screen/tap events (Zipf-distributed, so a handful of names dominate)
+and occasional error events that often end the session.
+
+The same seed, size and end date always produce the same rows. Events go
+straight into the dictionary-encoded tables in chunks (bypassing the API,
+rate limits and ingestion counters); the `sessions` rollup is written
+alongside, as the sessionizer would have. Each app also gets a saved funnel
+definition, so insight snapshots have something to compute.
+
+Apps are keyed `<prefix>_<seed>_<events>_<n>`: several sizes can share one
+database, and an existing dataset is reused instead of written twice.
+
+Run from backend/ (writes to DATABASE_URL):
+
+    python -m benchmarks.synthetic --events 1000000 [--apps 3] [--seed 42] [--days 30]
+"""
+
+import argparse
+import bisect
+import itertools
+import json
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+FUNNEL_NAME = "purchase"
+FUNNEL_STEPS = ["app_open", "home_view", "product_view", "add_to_cart", "checkout_start", "purchase_complete"]
+# Probability of moving on from each step to the next
+STEP_CONTINUE = [0.92, 0.74, 0.46, 0.62, 0.71]
+
+ERROR_EVENTS = ["network_error", "payment_error", "signup_error", "app_crash_error"]
+ERROR_RATE = 0.03           # per step
+ERROR_ABANDON_RATE = 0.6    # sessions ending right after an error
+
+TAIL_EVENTS = [f"{kind}_{i}" for i in range(100) for kind in ("screen_view", "tap")]
+TAIL_ZIPF_S = 1.2
+TAIL_EVENTS_PER_STEP = 1.5  # mean
+
+PLATFORMS = ["android", "ios", "web"]
+PLATFORM_WEIGHTS = [0.68, 0.27, 0.05]
+
+# Relative traffic per UTC hour (quiet night, evening peak)
+HOURLY_WEIGHTS = [2, 1, 1, 1, 1, 2, 4, 6, 7, 7, 7, 8, 8, 7, 7, 7, 8, 9, 10, 10, 9, 7, 5, 3]
+
+MEAN_GAP_MS = 8_000
+
+# Events per write transaction
+CHUNK_EVENTS = 20_000
+
+Session = Tuple[str, str, List[Tuple[str, int]]]  # (session_id, platform, [(event_name, timestamp_ms)])
+
+
+def api_keys_for(events: int, apps: int = 3, seed: int = 42, prefix: str = "bench") -> List[str]:
+    return [f"{prefix}_{seed}_{events}_{n}" for n in range(apps)]
+
+
+def app_shares(events: int, apps: int) -> List[int]:
+    """Events per app: proportional to 1/(n+1), summing to `events`."""
+    weights = [1 / (n + 1) for n in range(apps)]
+    shares = [int(events * w / sum(weights)) for w in weights]
+    shares[0] += events - sum(shares)
+    return shares
+
+
+class SessionGenerator:
+    """Deterministic stream of synthetic sessions for one app."""
+
+    def __init__(self, seed: str, end_ms: int, days: int):
+        self.rng = random.Random(seed)
+        self.end_ms = end_ms
+        self.days = days
+        self._tail_cumulative = list(itertools.accumulate(1 / (rank + 1) ** TAIL_ZIPF_S for rank in range(len(TAIL_EVENTS))))
+        self._hour_cumulative = list(itertools.accumulate(HOURLY_WEIGHTS))
+
+    def session(self) -> Session:
+        rng = self.rng
+        session_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        platform = rng.choices(PLATFORMS, PLATFORM_WEIGHTS)[0]
+
+        day = rng.randrange(self.days)
+        hour = bisect.bisect_right(self._hour_cumulative, rng.random() * self._hour_cumulative[-1])
+        ts = self.end_ms - (day + 1) * 86_400_000 + hour * 3_600_000 + rng.randrange(3_600_000)
+
+        events: List[Tuple[str, int]] = []
+        for step_index, step in enumerate(FUNNEL_STEPS):
+            events.append((step, ts))
+            ts += self._gap()
+            for _ in range(self._tail_count()):
+                events.append((self._tail_event(), ts))
+                ts += self._gap()
+            if rng.random() < ERROR_RATE:
+                events.append((rng.choice(ERROR_EVENTS), ts))
+                ts += self._gap()
+                if rng.random() < ERROR_ABANDON_RATE:
+                    break
+            if step_index == len(STEP_CONTINUE) or rng.random() >= STEP_CONTINUE[step_index]:
+                break
+        return session_id, platform, events
+
+    def _gap(self) -> int:
+        return 200 + int(self.rng.expovariate(1 / MEAN_GAP_MS))
+
+    def _tail_count(self) -> int:
+        # Geometric with mean TAIL_EVENTS_PER_STEP
+        count = 0
+        while self.rng.random() < TAIL_EVENTS_PER_STEP / (1 + TAIL_EVENTS_PER_STEP):
+            count += 1
+        return count
+
+    def _tail_event(self) -> str:
+        return TAIL_EVENTS[bisect.bisect_right(self._tail_cumulative, self.rng.random() * self._tail_cumulative[-1])]
+
+
+def generate(
+    db,
+    events: int,
+    *,
+    apps: int = 3,
+    seed: int = 42,
+    days: int = 30,
+    end_ms: Optional[int] = None,
+    prefix: str = "bench",
+    sessionize: bool = True,
+) -> dict:
+    """
+    Write `events` synthetic events split over `apps` apps.
+
+    Args:
+        db: SQLAlchemy session.
+        end_ms: Events fall within the `days` days before this; defaults to
+            the start of today (UTC), so reruns on the same day match.
+        sessionize: Also write the `sessions` rollup.
+
+    Returns:
+        {"api_keys", "events", "sessions", "reused", "seconds"}; `reused` is
+        True when the dataset already existed (nothing was written).
+    """
+    from app.db.models import FunnelDefinitionDB
+    from app.storage.dictionary import get_app_key_id
+    from app.storage.funnel_definitions import save_funnel_definition
+
+    started = time.monotonic()
+    end_ms = end_ms if end_ms is not None else default_end_ms()
+    api_keys = api_keys_for(events, apps, seed, prefix)
+    # The last key is written last, so its presence means the dataset is complete.
+    if get_app_key_id(db, api_keys[-1]) is not None:
+        return {"api_keys": api_keys, "events": events, "sessions": None, "reused": True, "seconds": 0.0}
+
+    sessions_written = 0
+    for api_key, share in zip(api_keys, app_shares(events, apps)):
+        generator = SessionGenerator(f"{seed}:{api_key}", end_ms, days)
+        sessions_written += _write_app(db, api_key, generator, share, sessionize)
+        save_funnel_definition(db, FunnelDefinitionDB(api_key=api_key, name=FUNNEL_NAME, steps=FUNNEL_STEPS))
+
+    return {
+        "api_keys": api_keys,
+        "events": events,
+        "sessions": sessions_written,
+        "reused": False,
+        "seconds": round(time.monotonic() - started, 2),
+    }
+
+
+def _write_app(db, api_key: str, generator: SessionGenerator, target: int, sessionize: bool) -> int:
+    from app.storage.dictionary import get_app_key_id, get_event_name_ids
+
+    app_key_id = get_app_key_id(db, api_key, create=True)
+    name_ids = get_event_name_ids(db, app_key_id, FUNNEL_STEPS + TAIL_EVENTS + ERROR_EVENTS, create=True)
+    error_codes = {name_ids[name] for name in ERROR_EVENTS}
+
+    written = sessions = 0
+    chunk: List[Session] = []
+    chunk_events = 0
+    while written < target:
+        session_id, platform, events = generator.session()
+        events = events[: target - written]
+        chunk.append((session_id, platform, events))
+        chunk_events += len(events)
+        written += len(events)
+        if chunk_events >= CHUNK_EVENTS or written >= target:
+            _write_chunk(db, app_key_id, name_ids, error_codes, chunk, sessionize)
+            sessions += len(chunk)
+            chunk, chunk_events = [], 0
+    return sessions
+
+
+def _write_chunk(
+    db,
+    app_key_id: int,
+    name_ids: Dict[str, int],
+    error_codes: set,
+    chunk: List[Session],
+    sessionize: bool,
+) -> None:
+    from sqlalchemy import insert
+
+    from app.db.models import EventDB, SessionDB
+    from app.storage.dictionary import get_session_key_ids
+    from app.workers.sessionizer import build_session_row
+
+    session_ids = get_session_key_ids(db, app_key_id, [session_id for session_id, _p, _e in chunk], create=True)
+    created_at = datetime.now(timezone.utc)
+    db.execute(
+        insert(EventDB),
+        [
+            {
+                "app_key_id": app_key_id,
+                "event_name_id": name_ids[name],
+                "session_key_id": session_ids[session_id],
+                "timestamp_ms": ts,
+                "platform": platform,
+                "properties": None,
+                "created_at": created_at,
+            }
+            for session_id, platform, events in chunk
+            for name, ts in events
+        ],
+    )
+    if sessionize:
+        rows = []
+        for session_id, platform, events in chunk:
+            row = build_session_row(
+                session_ids[session_id], app_key_id, [(name_ids[name], ts, platform) for name, ts in events], error_codes
+            )
+            rows.append({column: getattr(row, column) for column in _SESSION_COLUMNS})
+        db.execute(insert(SessionDB), rows)
+    db.commit()
+
+
+_SESSION_COLUMNS = (
+    "session_key_id", "app_key_id", "first_ts_ms", "last_ts_ms", "event_count",
+    "platform", "event_name_ids", "event_offsets_ms", "has_error",
+)
+
+
+def default_end_ms() -> int:
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return int((today + timedelta(days=1)).timestamp() * 1000)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, required=True, help="total events to write (e.g. 10000 .. 100000000)")
+    parser.add_argument("--apps", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--prefix", default="bench", help="api_key prefix")
+    parser.add_argument("--database-url", help="defaults to DATABASE_URL")
+    parser.add_argument("--no-sessions", action="store_true", help="skip the sessions rollup")
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    from app.db.database import SessionLocal, engine
+    from app.db.schema import ensure_schema
+
+    ensure_schema(engine)
+    db = SessionLocal()
+    try:
+        result = generate(
+            db, args.events, apps=args.apps, seed=args.seed, days=args.days,
+            prefix=args.prefix, sessionize=not args.no_sessions,
+        )
+    finally:
+        db.close()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Shared test setup: every test session runs against its own SQLite file.
+
+DATABASE_URL (and any other settings) must be in the environment before the
+first `app` import, since app/db/database.py and app/core/config.py read them
+at import time.
+"""
+
+import os
+import tempfile
+
+_DB_DIR = tempfile.mkdtemp(prefix="analytics-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_DB_DIR}/analytics.db"
+os.environ.pop("ANALYTICS_DATABASE_URL", None)
+os.environ["LLM_PROVIDER"] = "mock"
+
+import pytest  # noqa: E402
+
+from app.db.database import SessionLocal, engine  # noqa: E402
+from app.db.schema import ensure_schema  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    ensure_schema(engine)
+    yield
+    engine.dispose()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
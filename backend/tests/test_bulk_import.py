@@ -0,0 +1,80 @@
+import json
+import uuid
+
+from sqlalchemy import text
+
+from app.db.database import SessionLocal, engine
+from app.db.models import IMPORT_FAILED, IMPORT_SUCCEEDED
+from app.db.schema import ensure_schema
+from app.storage.imports import create_import, get_import
+from app.workers import bulk_import
+
+
+def _event_indexes() -> set:
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'events'"))
+        return {name for (name,) in rows}
+
+
+def _write_events(path, count: int) -> None:
+    session_id = str(uuid.uuid4())
+    with open(path, "w") as f:
+        for i in range(count):
+            f.write(json.dumps({
+                "event_name": "screen_view", "timestamp_ms": 1_700_000_000_000 + i,
+                "session_id": session_id, "platform": "android", "event_id": f"e{i}",
+            }) + "\n")
+
+
+def _import(path, **kwargs):
+    db = SessionLocal()
+    try:
+        job = create_import(db, f"key-{uuid.uuid4()}", str(path), "ndjson")
+        bulk_import.run_import(job.id, str(path), "ndjson", **kwargs)
+        db.expire_all()
+        return get_import(db, job.id)
+    finally:
+        db.close()
+
+
+def test_deferred_indexes_are_rebuilt(tmp_path):
+    indexes = _event_indexes()
+    path = tmp_path / "events.ndjson"
+    _write_events(path, 10)
+
+    job = _import(path, defer_indexes=True)
+
+    assert job.status == IMPORT_SUCCEEDED
+    assert job.rows_inserted == 10
+    assert _event_indexes() == indexes
+    assert not ensure_schema(engine)  # fingerprint recorded again
+
+
+def test_deferred_indexes_are_rebuilt_when_the_load_fails(tmp_path, monkeypatch):
+    indexes = _event_indexes()
+    path = tmp_path / "events.ndjson"
+    _write_events(path, 10)
+    read_records = bulk_import.read_records
+
+    def failing_read(path, fmt, chunk_rows):
+        yield next(read_records(path, fmt, chunk_rows))
+        raise OSError("disk went away")
+
+    monkeypatch.setattr(bulk_import, "read_records", failing_read)
+
+    job = _import(path, defer_indexes=True)
+
+    assert job.status == IMPORT_FAILED
+    assert "disk went away" in job.error
+    assert _event_indexes() == indexes
+
+
+def test_schema_setup_recreates_indexes_after_a_crashed_load():
+    indexes = _event_indexes()
+
+    # The import process dies between dropping and rebuilding.
+    bulk_import._drop_indexes(engine)
+    assert _event_indexes() < indexes
+
+    assert ensure_schema(engine)
+    assert _event_indexes() == indexes
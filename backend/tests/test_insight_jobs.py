@@ -0,0 +1,250 @@
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app.db.database import SessionLocal
+from app.db.models import (
+    INSIGHT_JOB_FAILED,
+    INSIGHT_JOB_QUEUED,
+    INSIGHT_JOB_RUNNING,
+    INSIGHT_JOB_SUCCEEDED,
+    InsightDB,
+    InsightJobDB,
+)
+from app.insights.models import InsightResponse
+from app.storage.insight_jobs import (
+    claim_next_job,
+    complete_job,
+    enqueue_insight_job,
+    fail_job,
+    get_insight_job,
+    heartbeat_job,
+    requeue_stale_jobs,
+    set_job_stage,
+)
+from app.storage.insights import stage_insight
+from app.workers import insight_jobs as worker
+
+INSIGHT = InsightResponse(summary="summary", insights=["insight"], recommendations=["recommendation"])
+SNAPSHOT = {"total_events": 1}
+
+
+@pytest.fixture(autouse=True)
+def empty_queue(db):
+    # claim_next_job takes the oldest queued job of any app: start every test empty.
+    db.query(InsightJobDB).delete()
+    db.commit()
+
+
+def _api_key() -> str:
+    return f"key-{uuid.uuid4()}"
+
+
+def _make_stale(db, job_id: str) -> None:
+    db.query(InsightJobDB).filter(InsightJobDB.id == job_id).update(
+        {InsightJobDB.updated_at: datetime.now(timezone.utc) - timedelta(hours=1)},
+        synchronize_session=False,
+    )
+    db.commit()
+
+
+def _insights(db, api_key: str):
+    return db.query(InsightDB).filter(InsightDB.api_key == api_key).all()
+
+
+# =============================================================================
+# Queue
+# =============================================================================
+
+def test_enqueue_joins_in_flight_job(db):
+    api_key = _api_key()
+    first = enqueue_insight_job(db, api_key)
+    assert enqueue_insight_job(db, api_key).id == first.id
+
+    claimed = claim_next_job(db)
+    assert claimed.id == first.id
+    assert enqueue_insight_job(db, api_key).id == first.id
+
+    assert complete_job(db, first.id, claimed.attempts, stage_insight(db, api_key, INSIGHT).id)
+    assert enqueue_insight_job(db, api_key).id != first.id
+
+
+def test_in_flight_index_rejects_a_second_job(db):
+    api_key = _api_key()
+    enqueue_insight_job(db, api_key)
+
+    # What a concurrent request that missed the first job would insert.
+    db.add(InsightJobDB(api_key=api_key, status=INSIGHT_JOB_QUEUED))
+    with pytest.raises(IntegrityError):
+        db.commit()
+
+
+def test_only_one_worker_claims_a_job():
+    setup = SessionLocal()
+    try:
+        job = enqueue_insight_job(setup, _api_key())
+    finally:
+        setup.close()
+
+    start = threading.Barrier(8)
+    claims = []
+
+    def claim():
+        session = SessionLocal()
+        try:
+            start.wait()
+            claimed = claim_next_job(session)
+            claims.append(claimed.id if claimed is not None else None)
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=claim) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert len(claims) == 8
+    assert [claimed for claimed in claims if claimed is not None] == [job.id]
+
+
+# =============================================================================
+# Stale jobs and lost claims
+# =============================================================================
+
+def test_requeue_stale_job_and_reclaim(db):
+    job = enqueue_insight_job(db, _api_key())
+    first = claim_next_job(db).attempts
+
+    # A fresh running job is left alone.
+    assert requeue_stale_jobs(db, stale_after_seconds=60, max_attempts=3) == 0
+
+    _make_stale(db, job.id)
+    assert requeue_stale_jobs(db, stale_after_seconds=60, max_attempts=3) == 1
+    db.expire_all()
+    assert get_insight_job(db, job.id).status == INSIGHT_JOB_QUEUED
+
+    second = claim_next_job(db).attempts
+    assert second == first + 1
+
+    # The first claim no longer owns the job; the second one does.
+    assert not heartbeat_job(db, job.id, first)
+    assert not set_job_stage(db, job.id, first, "llm")
+    assert not fail_job(db, job.id, first, "late failure")
+    assert heartbeat_job(db, job.id, second)
+    assert set_job_stage(db, job.id, second, "llm")
+    db.expire_all()
+    assert get_insight_job(db, job.id).status == INSIGHT_JOB_RUNNING
+
+
+def test_stale_job_fails_after_max_attempts(db):
+    job = enqueue_insight_job(db, _api_key())
+    for _ in range(2):
+        claim_next_job(db)
+        _make_stale(db, job.id)
+        requeue_stale_jobs(db, stale_after_seconds=60, max_attempts=2)
+
+    db.expire_all()
+    failed = get_insight_job(db, job.id)
+    assert failed.status == INSIGHT_JOB_FAILED
+    assert failed.attempts == 2
+    assert failed.error == "worker stopped responding"
+
+
+def test_lost_claim_drops_staged_insight(db):
+    api_key = _api_key()
+    job = enqueue_insight_job(db, api_key)
+    first = claim_next_job(db).attempts
+    _make_stale(db, job.id)
+    requeue_stale_jobs(db, stale_after_seconds=60, max_attempts=3)
+    claim_next_job(db)
+
+    staged = stage_insight(db, api_key, INSIGHT)
+    assert not complete_job(db, job.id, first, staged.id)
+
+    assert _insights(db, api_key) == []
+    db.expire_all()
+    assert get_insight_job(db, job.id).status == INSIGHT_JOB_RUNNING
+
+
+# =============================================================================
+# Worker
+# =============================================================================
+
+@pytest.fixture
+def offline_worker(monkeypatch):
+    """Run the worker on a fixed snapshot and insight (no analytics, no LLM)."""
+    monkeypatch.setattr(worker, "get_precomputed_snapshot", lambda db, api_key: SNAPSHOT)
+    monkeypatch.setattr(worker, "build_insight_prompt", lambda snapshot: "prompt")
+    monkeypatch.setattr(worker, "generate_insights", lambda prompt: INSIGHT)
+
+
+def test_worker_completes_job(db, offline_worker):
+    api_key = _api_key()
+    job = enqueue_insight_job(db, api_key)
+
+    assert worker.run_next_job(db)
+
+    db.expire_all()
+    done = get_insight_job(db, job.id)
+    assert done.status == INSIGHT_JOB_SUCCEEDED
+    assert [insight.id for insight in _insights(db, api_key)] == [done.insight_id]
+
+
+def test_worker_drops_result_of_lost_claim(db, monkeypatch, offline_worker):
+    api_key = _api_key()
+    job = enqueue_insight_job(db, api_key)
+
+    def generate_after_requeue(prompt):
+        # The job looks stale to another worker, which re-queues and claims it.
+        other = SessionLocal()
+        try:
+            _make_stale(other, job.id)
+            requeue_stale_jobs(other, stale_after_seconds=60, max_attempts=3)
+            claim_next_job(other)
+        finally:
+            other.close()
+        return INSIGHT
+
+    monkeypatch.setattr(worker, "generate_insights", generate_after_requeue)
+
+    assert worker.run_next_job(db)
+
+    assert _insights(db, api_key) == []
+    db.expire_all()
+    reclaimed = get_insight_job(db, job.id)
+    assert reclaimed.status == INSIGHT_JOB_RUNNING
+    assert reclaimed.attempts == 2
+
+
+def test_heartbeat_keeps_slow_job_running(db, monkeypatch, offline_worker):
+    stale_after = 0.4
+    monkeypatch.setattr(worker, "INSIGHT_JOB_STALE_SECONDS", stale_after)
+    api_key = _api_key()
+    job = enqueue_insight_job(db, api_key)
+    requeued = []
+
+    def slow_generate(prompt):
+        # Outlive the stale threshold several times over while another worker checks.
+        other = SessionLocal()
+        try:
+            for _ in range(4):
+                time.sleep(stale_after / 2)
+                requeued.append(requeue_stale_jobs(other, stale_after_seconds=stale_after, max_attempts=3))
+        finally:
+            other.close()
+        return INSIGHT
+
+    monkeypatch.setattr(worker, "generate_insights", slow_generate)
+
+    assert worker.run_next_job(db)
+
+    assert requeued == [0, 0, 0, 0]
+    db.expire_all()
+    done = get_insight_job(db, job.id)
+    assert done.status == INSIGHT_JOB_SUCCEEDED
+    assert done.attempts == 1
@@ -0,0 +1,81 @@
+import asyncio
+import json
+import threading
+import uuid
+
+import pytest
+
+from app.insights.llm import KIND_DIFF, LLMClient, LLMError, MockProvider
+
+
+class CountingProvider(MockProvider):
+    """Mock provider that counts calls and can be held open until released."""
+
+    def __init__(self, latency_ms: float = 0):
+        super().__init__(latency_ms)
+        self.calls = 0
+        self.started = threading.Event()
+
+    async def complete(self, system: str, prompt: str, kind: str) -> str:
+        self.calls += 1
+        self.started.set()
+        return await super().complete(system, prompt, kind)
+
+
+def _prompt() -> str:
+    # Responses are cached in the database; a fresh prompt always reaches the provider.
+    return f"prompt {uuid.uuid4()}"
+
+
+def test_complete_returns_mock_response():
+    provider = CountingProvider()
+    client = LLMClient(provider=provider)
+    prompt = _prompt()
+
+    response = json.loads(client.complete("system", prompt, KIND_DIFF))
+
+    assert response["priority"] == "low"
+    assert provider.calls == 1
+
+    # The second call is answered from the cache.
+    assert json.loads(client.complete("system", prompt, KIND_DIFF)) == response
+    assert provider.calls == 1
+
+
+def test_concurrent_identical_prompts_share_one_request():
+    provider = CountingProvider(latency_ms=200)
+    client = LLMClient(provider=provider)
+    prompt = _prompt()
+    results = []
+
+    def call():
+        results.append(client.complete("system", prompt))
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert len(results) == 4
+    assert len(set(results)) == 1
+    assert json.loads(results[0])["insights"] == []
+    assert provider.calls == 1
+
+
+def test_cancelled_owner_fails_waiters():
+    provider = CountingProvider(latency_ms=5000)
+    client = LLMClient(provider=provider)
+    loop = client._get_loop()
+    prompt = _prompt()
+
+    owner = asyncio.run_coroutine_threadsafe(client._request("key", "system", prompt, KIND_DIFF), loop)
+    assert provider.started.wait(timeout=5)
+    waiter = asyncio.run_coroutine_threadsafe(client._request("key", "system", prompt, KIND_DIFF), loop)
+
+    owner.cancel()
+
+    with pytest.raises(LLMError, match="cancelled"):
+        waiter.result(timeout=5)
+    assert provider.calls == 1
+    assert client._in_flight == {}
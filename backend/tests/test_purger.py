@@ -0,0 +1,89 @@
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from app.db.models import EventDB, SessionDB, SessionKeyDB
+from app.storage import cold
+from app.storage.dictionary import get_app_key_id, get_event_name_ids, get_session_key_ids
+from app.workers import purger
+
+DAY = date(2026, 1, 5)
+TS_MS = cold.day_bounds_ms(DAY)[0] + 1000
+
+
+@pytest.fixture(autouse=True)
+def fresh_scans(monkeypatch, tmp_path):
+    monkeypatch.setattr(purger, "_orphan_scans", {})
+    monkeypatch.setattr(cold, "COLD_STORAGE_DIR", str(tmp_path / "cold"))
+
+
+def _app_with_keys(db, *names):
+    app_key_id = get_app_key_id(db, f"key-{uuid.uuid4()}", create=True)
+    keys = get_session_key_ids(db, app_key_id, names, create=True)
+    db.commit()
+    return app_key_id, keys
+
+
+def _age(db, *session_key_ids, created_at=None):
+    created_at = created_at or datetime.now(timezone.utc) - timedelta(days=2)
+    db.query(SessionKeyDB).filter(SessionKeyDB.id.in_(session_key_ids)).update(
+        {SessionKeyDB.created_at: created_at}, synchronize_session=False
+    )
+    db.commit()
+
+
+def _remaining(db, app_key_id):
+    return {row.session_id for row in db.query(SessionKeyDB).filter(SessionKeyDB.app_key_id == app_key_id)}
+
+
+def test_only_unreferenced_old_keys_are_purged(db):
+    app_key_id, keys = _app_with_keys(db, "hot", "session", "cold", "orphan", "new")
+    name_id = get_event_name_ids(db, app_key_id, ["screen_view"], create=True)["screen_view"]
+    db.add(EventDB(app_key_id=app_key_id, event_name_id=name_id, session_key_id=keys["hot"], timestamp_ms=TS_MS))
+    db.add(SessionDB(
+        session_key_id=keys["session"], app_key_id=app_key_id, first_ts_ms=TS_MS, last_ts_ms=TS_MS,
+        event_count=1, event_name_ids=[name_id], event_offsets_ms=[0],
+    ))
+    db.commit()
+    cold.write_day(app_key_id, DAY, [
+        {"id": 1, "session_key_id": keys["cold"], "event_name_id": name_id, "timestamp_ms": TS_MS},
+    ])
+    _age(db, keys["hot"], keys["session"], keys["cold"], keys["orphan"])
+    _age(db, keys["new"], created_at=datetime.now(timezone.utc))
+
+    assert purger._purge_orphan_session_keys(db, app_key_id, purger._ChunkBudget(10))
+
+    assert _remaining(db, app_key_id) == {"hot", "session", "cold", "new"}
+
+
+def test_keys_created_before_the_column_count_as_old(db):
+    app_key_id, keys = _app_with_keys(db, "legacy")
+    db.query(SessionKeyDB).filter(SessionKeyDB.id == keys["legacy"]).update(
+        {SessionKeyDB.created_at: None}, synchronize_session=False
+    )
+    db.commit()
+
+    assert purger._purge_orphan_session_keys(db, app_key_id, purger._ChunkBudget(10))
+
+    assert _remaining(db, app_key_id) == set()
+
+
+def test_pass_resumes_across_ticks_and_runs_once_per_interval(db, monkeypatch):
+    monkeypatch.setattr(purger, "PURGE_CHUNK_SIZE", 2)
+    monkeypatch.setattr(purger, "PURGE_CHUNK_SLEEP_SECONDS", 0)
+    app_key_id, keys = _app_with_keys(db, *(f"s{i}" for i in range(5)))
+    _age(db, *keys.values())
+
+    # One chunk per tick: the first tick stops after two keys.
+    assert not purger._purge_orphan_session_keys(db, app_key_id, purger._ChunkBudget(1))
+    assert len(_remaining(db, app_key_id)) == 3
+
+    assert purger._purge_orphan_session_keys(db, app_key_id, purger._ChunkBudget(10))
+    assert _remaining(db, app_key_id) == set()
+
+    # A new orphan waits for the next pass.
+    _, late = get_session_key_ids(db, app_key_id, ["late"], create=True).popitem()
+    _age(db, late)
+    assert purger._purge_orphan_session_keys(db, app_key_id, purger._ChunkBudget(10))
+    assert _remaining(db, app_key_id) == {"late"}
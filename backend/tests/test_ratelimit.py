@@ -0,0 +1,45 @@
+import threading
+
+import pytest
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.core import ratelimit
+from app.core.ratelimit import SECONDS_PER_DAY, Budget, _MemoryStore
+
+
+def test_daily_quota_rejects_until_refilled(monkeypatch):
+    quota = Budget.quota("test-daily", 1000, SECONDS_PER_DAY, "events")
+    monkeypatch.setattr(ratelimit, "_store", _MemoryStore())
+
+    ratelimit.check_rate_limit(quota, "key", cost=600)
+    ratelimit.check_rate_limit(quota, "other-key", cost=600)
+    with pytest.raises(HTTPException) as rejected:
+        ratelimit.check_rate_limit(quota, "key", cost=600)
+
+    assert rejected.value.status_code == 429
+    assert "1000 events/day" in rejected.value.detail
+    # 200 more events take a fifth of a day to refill
+    retry_after = int(rejected.value.headers["Retry-After"])
+    assert SECONDS_PER_DAY / 5 - 1 <= retry_after <= SECONDS_PER_DAY / 5 + 1
+
+
+def test_analytics_dependency_charges_off_the_event_loop(monkeypatch):
+    charged = []
+
+    def check_rate_limit(budget, api_key, cost=1):
+        charged.append((api_key, cost, threading.current_thread()))
+
+    monkeypatch.setattr(ratelimit, "check_rate_limit", check_rate_limit)
+    app = FastAPI()
+
+    @app.get("/x", dependencies=[Depends(ratelimit.analytics_rate_limit(5))])
+    async def endpoint():
+        return {"loop_thread": threading.current_thread().name}
+
+    response = TestClient(app).get("/x", params={"api_key": "key"})
+
+    assert response.status_code == 200
+    [(api_key, cost, thread)] = charged
+    assert (api_key, cost) == ("key", 5)
+    assert thread.name != response.json()["loop_thread"]
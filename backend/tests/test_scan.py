@@ -0,0 +1,48 @@
+import logging
+import uuid
+
+from app.analytics import scan
+from app.storage.dictionary import get_app_key_id, get_event_name_ids
+
+
+def _app(db) -> int:
+    app_key_id = get_app_key_id(db, f"key-{uuid.uuid4()}", create=True)
+    db.commit()
+    return app_key_id
+
+
+def test_name_decoder_reloads_names_registered_during_a_scan(db):
+    app_key_id = _app(db)
+    home = get_event_name_ids(db, app_key_id, ["home_view"], create=True)["home_view"]
+    db.commit()
+    decode = scan._NameDecoder(db, app_key_id)
+
+    # Registered by ingestion after the scan started.
+    checkout = get_event_name_ids(db, app_key_id, ["checkout"], create=True)["checkout"]
+    db.commit()
+
+    assert decode[home] == "home_view"
+    assert decode[checkout] == "checkout"
+
+
+def test_name_decoder_logs_unknown_codes_once(db, caplog, monkeypatch):
+    app_key_id = _app(db)
+    decode = scan._NameDecoder(db, app_key_id)
+    reloads = []
+    get_event_name_map = scan.get_event_name_map
+
+    def counting_get_event_name_map(db, app_key_id=None):
+        reloads.append(app_key_id)
+        return get_event_name_map(db, app_key_id)
+
+    monkeypatch.setattr(scan, "get_event_name_map", counting_get_event_name_map)
+
+    with caplog.at_level(logging.ERROR, logger=scan.__name__):
+        first = decode[987654]
+        second = decode[987654]
+
+    assert first == second == "<unknown event 987654>"
+    assert reloads == [app_key_id]
+    assert [record.getMessage() for record in caplog.records] == [
+        f"Unknown event_name_id 987654 for app_key_id={app_key_id}"
+    ]
@@ -0,0 +1,60 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.exc import OperationalError
+
+from app.db.schema import LEGACY_EVENTS_TABLE, _retire_legacy_tables
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    path = tmp_path / "legacy.db"
+    bind = create_engine(f"sqlite:///{path}")
+    with bind.begin() as conn:
+        conn.execute(text("CREATE TABLE events (id INTEGER PRIMARY KEY, api_key TEXT, event_name TEXT)"))
+    yield path, bind
+    bind.dispose()
+
+
+def _fail_renames(bind, before_failing=None):
+    @event.listens_for(bind, "before_cursor_execute")
+    def fail(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("ALTER TABLE events RENAME"):
+            if before_failing is not None:
+                before_failing()
+            raise sqlite3.OperationalError("database is locked")
+
+
+def test_renames_legacy_events(legacy_db):
+    _path, bind = legacy_db
+
+    _retire_legacy_tables(bind)
+
+    assert LEGACY_EVENTS_TABLE in inspect(bind).get_table_names()
+
+
+def test_failed_rename_is_raised(legacy_db):
+    _path, bind = legacy_db
+    _fail_renames(bind)
+
+    with pytest.raises(OperationalError):
+        _retire_legacy_tables(bind)
+
+
+def test_rename_done_by_another_process_is_accepted(legacy_db):
+    path, bind = legacy_db
+
+    def other_process_renames():
+        other = sqlite3.connect(path)
+        other.execute(f"ALTER TABLE events RENAME TO {LEGACY_EVENTS_TABLE}")
+        other.commit()
+        other.close()
+
+    _fail_renames(bind, before_failing=other_process_renames)
+
+    _retire_legacy_tables(bind)
+
+    tables = inspect(bind).get_table_names()
+    assert LEGACY_EVENTS_TABLE in tables
+    assert "events" not in tables
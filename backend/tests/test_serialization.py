@@ -0,0 +1,61 @@
+import json
+
+from app.insights.serialization import (
+    compact_history,
+    estimate_tokens,
+    serialize_diff,
+    serialize_history,
+    serialize_snapshot,
+)
+
+
+def test_oversized_diff_is_trimmed_to_valid_json():
+    diff = {
+        "metrics_changed": {f"metric_{i}": {"previous": i, "latest": i + 0.123456} for i in range(300)},
+        "note": "x" * 3000,
+    }
+
+    text = serialize_diff(diff, budget=200)
+
+    assert estimate_tokens(text) <= 200
+    trimmed = json.loads(text)
+    assert "note" not in trimmed  # the largest entry goes first
+    assert set(trimmed["metrics_changed"]) < set(diff["metrics_changed"])
+    assert len(diff["metrics_changed"]) == 300  # the input is left alone
+
+
+def test_snapshot_within_budget_is_unchanged():
+    snapshot = {"api_key": "key", "conversion_rate": 0.123456, "paths": {"a → b": 3}, "funnels": {}}
+
+    assert json.loads(serialize_snapshot(snapshot)) == {"conversion_rate": 0.1235, "paths": {"a → b": 3}, "funnels": {}}
+
+
+def test_oversized_snapshot_fields_are_trimmed_to_valid_json():
+    snapshot = {
+        "paths": {},
+        "funnels": {},
+        "errors": [f"error {i}: " + "y" * 80 for i in range(200)],
+    }
+
+    text = serialize_snapshot(snapshot, budget=300)
+
+    assert estimate_tokens(text) <= 300
+    assert len(json.loads(text)["errors"]) < 200
+
+
+def test_history_keeps_headline_metrics_and_fits():
+    history = [
+        {
+            "created_at": f"2026-01-{day:02d}",
+            "summary": "summary " * 50,
+            "insights": ["insight " * 20] * 10,
+            "recommendations": ["recommendation " * 20] * 10,
+            "analytics_snapshot": {"conversion_rate": 0.5, "paths": {"a": 1}},
+        }
+        for day in range(1, 29)
+    ]
+
+    assert compact_history(history)[0]["metrics"] == {"conversion_rate": 0.5}
+    text = serialize_history(history, budget=400)
+    assert estimate_tokens(text) <= 400
+    assert isinstance(json.loads(text), list)
@@ -53,6 +53,18 @@ export interface Insight {
   created_at: string;
 }
 
+/** A queued/running insight generation job */
+export interface InsightJob {
+  job_id: string;
+  api_key: string;
+  status: "queued" | "running" | "succeeded" | "failed";
+  stage: string | null;
+  error: string | null;
+  created_at: string;
+  updated_at: string | null;
+  insight: Insight | null;
+}
+
 /** Result of trend analysis across historical insights */
 export interface InsightTrends {
   summary: string;
@@ -84,6 +96,21 @@ export interface InsightComparison {
   compared_at: string;
 }
 
+/** Event-count anomaly found by the backend's anomaly detector */
+export interface Anomaly {
+  id: number;
+  event_name: string;
+  is_error: boolean;
+  severity: "warning" | "critical";
+  start_ms: number;
+  end_ms: number;
+  observed: number;
+  expected: number;
+  score: number;
+  created_at: string;
+  updated_at: string;
+}
+
 /** App model for TypeScript */
 export interface App {
   id: string;
@@ -214,6 +241,17 @@ class ApiClient {
     return response.json();
   }
 
+  /** Get detected anomalies (only those new or updated after `since`, if given) */
+  async getAnomalies(since?: string): Promise<Anomaly[]> {
+    this.requireApiKey();
+    const params = new URLSearchParams({ api_key: this.apiKey });
+    if (since) params.set("since", since);
+
+    const response = await fetch(`${API_BASE_URL}/analytics/anomalies?${params}`);
+    if (!response.ok) throw new Error("Failed to fetch anomalies");
+    return response.json();
+  }
+
   /** Get all funnel definitions for this API key */
   async getFunnelDefinitions(): Promise<FunnelDefinition[]> {
     this.requireApiKey();
@@ -264,7 +302,7 @@ class ApiClient {
     return response.json();
   }
 
-  /** Generate a new LLM insight */
+  /** Generate a new LLM insight (queues a job, then polls until it finishes) */
   async generateInsight(): Promise<Insight> {
     this.requireApiKey();
     const response = await fetch(`${API_BASE_URL}/analytics/insights`, {
@@ -273,6 +311,24 @@ class ApiClient {
       body: JSON.stringify({ api_key: this.apiKey }),
     });
     if (!response.ok) throw new Error("Failed to generate insight");
+    let job: InsightJob = await response.json();
+
+    const deadline = Date.now() + 5 * 60 * 1000;
+    while (job.status === "queued" || job.status === "running") {
+      if (Date.now() > deadline) throw new Error("Insight generation timed out");
+      await new Promise((resolve) => setTimeout(resolve, 1500));
+      job = await this.getInsightJob(job.job_id);
+    }
+    if (job.status === "failed" || !job.insight) {
+      throw new Error(job.error || "Failed to generate insight");
+    }
+    return job.insight;
+  }
+
+  /** Get the status (and result, once done) of an insight job */
+  async getInsightJob(jobId: string): Promise<InsightJob> {
+    const response = await fetch(`${API_BASE_URL}/analytics/insights/jobs/${jobId}`);
+    if (!response.ok) throw new Error("Failed to fetch insight job");
     return response.json();
   }
 